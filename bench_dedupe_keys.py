@@ -0,0 +1,83 @@
+# 去重鍵記憶體比較 bench_dedupe_keys.py
+# 用法：python bench_dedupe_keys.py [--channels 10] [--messages 1000] [--dup-ratio 0.2]
+# 模擬一次去重掃描（channels × messages 則訊息），以 tracemalloc 量測記憶體峰值：
+# - legacy：舊版寫法，seen 集合保存每則訊息的完整內容字串
+# - digest：新版寫法，seen 只保存 16 bytes BLAKE2b 摘要 -> message_id
+# 訊息內容為模擬的 PTT 推送（短）與長貼文（長）混合，每則都是新字串（模擬從 API 解碼）。
+import os
+import time
+import random
+import argparse
+import tracemalloc
+
+# main_combined 在匯入時會檢查 Token；基準測試不連 Discord，給佔位值即可
+os.environ.setdefault("TOKEN_ASA_BOT", "bench")
+os.environ.setdefault("TOKEN_ASA_BOX", "bench")
+
+import main_combined as mc
+
+def make_contents(n: int, dup_ratio: float, rng: random.Random) -> list[tuple[int, str]]:
+    # 產生 (message_id, content)；約 dup_ratio 比例為先前內容的重複
+    out: list[tuple[int, str]] = []
+    for i in range(n):
+        if out and rng.random() < dup_ratio:
+            content = out[rng.randrange(len(out))][1]
+        elif rng.random() < 0.7:
+            content = f"2026/10/17\n[情報-其他] 測試標題 {i} {rng.random()}\nhttps://www.ptt.cc/bbs/NBA/M.{1760000000 + i}.A.{i % 4096:03X}.html"
+        else:
+            content = "長貼文" * rng.randint(100, 600) + str(rng.random())
+        out.append((1000 + i, content))
+    return out
+
+def sweep_legacy(channels: list[list[tuple[int, str]]]) -> int:
+    kept = 0
+    for rows in channels:
+        seen = set()
+        for _, content in rows:
+            key = content.encode("utf-8").decode("utf-8").strip()  # 新字串，模擬每則訊息解碼出的內容
+            if key not in seen:
+                seen.add(key)
+                kept += 1
+    return kept
+
+def sweep_digest(channels: list[list[tuple[int, str]]]) -> int:
+    kept = 0
+    for rows in channels:
+        seen: dict[bytes, int] = {}
+        for message_id, content in rows:
+            key = mc.dedupe_content_key(content.encode("utf-8").decode("utf-8"))
+            if key not in seen:
+                seen[key] = message_id
+                kept += 1
+    return kept
+
+def measure(name: str, fn, channels) -> int:
+    # 回傳記憶體峰值（bytes）；輸入資料在量測前已建立，不計入峰值
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    kept = fn(channels)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:<8} peak={peak / 1024:>10.1f} KiB  kept={kept}  ({elapsed:.3f}s)")
+    return peak
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare dedupe key memory: full content vs digest")
+    ap.add_argument("--channels", type=int, default=10)
+    ap.add_argument("--messages", type=int, default=mc.DUPLICATE_SCAN_LIMIT)
+    ap.add_argument("--dup-ratio", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    channels = [make_contents(args.messages, args.dup_ratio, rng) for _ in range(args.channels)]
+    print(f"channels={args.channels} messages={args.messages} dup_ratio={args.dup_ratio} key_version={mc.DEDUPE_KEY_VERSION}")
+
+    before = measure("legacy", sweep_legacy, channels)
+    after = measure("digest", sweep_digest, channels)
+    print(f"peak reduction = {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# PTT 索引頁解析效能比較 bench_ptt_parse.py
+# 用法：python bench_ptt_parse.py [存下來的索引頁.html ...] [--rounds 200]
+#       不指定檔案時使用 tests/fixtures/ptt/ 下的索引頁（含已刪文、置底分隔線與翻頁列）
+# 比較三種解析方式每秒可處理的頁數：
+# - legacy：舊版寫法（html.parser 解析兩次：parse_entries + find_prev_page_url，逐列 select_one）
+# - bs4   ：單次 BeautifulSoup 解析（parse_index_page_bs4）
+# - fast  ：專用掃描器（parse_index_page_fast，預設後端）
+# 並檢查 fast 與 bs4 的輸出是否一致。
+import os
+import sys
+import time
+import argparse
+import datetime
+from pathlib import Path
+from urllib.parse import urljoin
+
+# main_combined 在匯入時會檢查 Token；基準測試不連 Discord，給佔位值即可
+os.environ.setdefault("TOKEN_ASA_BOT", "bench")
+os.environ.setdefault("TOKEN_ASA_BOX", "bench")
+
+from bs4 import BeautifulSoup
+import main_combined as mc
+
+FIXTURES = Path(__file__).resolve().parent / "tests" / "fixtures" / "ptt"
+
+def legacy_parse_entries(html: str, today: datetime.date):
+    # 舊版 parse_entries（保留作為比較基準）
+    soup = BeautifulSoup(html, "html.parser")
+    rlist = soup.select("div.r-list-container div.r-ent")
+    results = []
+    for ent in rlist:
+        title_div = ent.select_one("div.title")
+        date_div = ent.select_one("div.meta > div.date")
+        if not title_div or not date_div:
+            continue
+        a = title_div.find("a")
+        if not a:
+            continue
+        title_text = a.get_text(strip=True)
+        prefix, remaining_title = mc.extract_bracket_prefix(title_text)
+        href = a.get("href")
+        full_url = urljoin(mc.BASE_URL, href) if href else None
+        date_text = date_div.get_text(strip=True)
+        full_date = mc.ptt_date_to_full_date(date_text, today)
+        results.append({
+            "title": title_text,
+            "title_no_prefix": remaining_title,
+            "prefix": prefix,
+            "ptt_mmdd": date_text,
+            "full_date": full_date,
+            "url": full_url
+        })
+    return results
+
+def legacy_find_prev_page_url(html: str):
+    # 舊版 find_prev_page_url（保留作為比較基準）
+    soup = BeautifulSoup(html, "html.parser")
+    paging = soup.select_one("div.btn-group-paging")
+    if not paging:
+        return None
+    for a in paging.select("a.btn.wide[href]"):
+        text = a.get_text(strip=True)
+        href = a["href"]
+        if "上頁" in text and "index" in href and href.endswith(".html"):
+            return urljoin(mc.BASE_URL, href)
+    return None
+
+def legacy(html: str, today: datetime.date):
+    return legacy_parse_entries(html, today), legacy_find_prev_page_url(html)
+
+def run(name: str, fn, pages: list[str], rounds: int, today: datetime.date) -> float:
+    # 回傳每秒處理頁數
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            fn(html, today)
+    elapsed = time.perf_counter() - t0
+    pps = rounds * len(pages) / elapsed if elapsed > 0 else float("inf")
+    print(f"{name:<8} {pps:>10.1f} pages/s  ({elapsed:.3f}s for {rounds * len(pages)} pages)")
+    return pps
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark PTT index page parsers")
+    ap.add_argument("files", nargs="*", help="saved PTT index HTML files (default: tests/fixtures/ptt/*.html)")
+    ap.add_argument("--rounds", type=int, default=200)
+    args = ap.parse_args()
+    if not args.files:
+        args.files = sorted(str(p) for p in FIXTURES.glob("*.html"))
+
+    pages = []
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+    today = datetime.date.today()
+
+    # 正確性：fast 與 bs4 必須輸出相同的條目與上頁連結
+    for path, html in zip(args.files, pages):
+        fast = mc.parse_index_page_fast(html, today, mc.BASE_URL)
+        slow = mc.parse_index_page_bs4(html, today, mc.BASE_URL)
+        if fast != slow:
+            print(f"[MISMATCH] {path}")
+            sys.exit(1)
+    print(f"pages={len(pages)} rounds={args.rounds} bs4_features={mc.BS4_FEATURES}")
+
+    base = run("legacy", legacy, pages, args.rounds, today)
+    run("bs4", lambda h, t: mc.parse_index_page_bs4(h, t, mc.BASE_URL), pages, args.rounds, today)
+    fast = run("fast", lambda h, t: mc.parse_index_page_fast(h, t, mc.BASE_URL), pages, args.rounds, today)
+    print(f"speedup fast/legacy = {fast / base:.1f}x")
+
+if __name__ == "__main__":
+    main()
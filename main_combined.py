@@ -8,8 +8,11 @@ import re
 import time
 import asyncio
 import aiohttp
+from aiohttp import web
 import datetime
 import contextlib
+from collections import OrderedDict, deque
+import contextvars
 import discord
 import requests
 from bs4 import BeautifulSoup
@@ -17,7 +20,19 @@ from urllib.parse import urlparse, urljoin
 from dotenv import load_dotenv
 from pathlib import Path
 import threading
+import queue
+import gzip
+import shutil
+import atexit
 import json
+import math
+import sqlite3
+import heapq
+import itertools
+import hashlib
+import tracemalloc
+import random
+import html as html_lib
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
@@ -36,42 +51,291 @@ ENV_PATH = BASE_DIR / ".env"  # .env 檔路徑（可自訂位置）
 load_dotenv(dotenv_path=str(ENV_PATH), override=False)
 
 # --- 共用：日誌 ---
-LOG_DIR = BASE_DIR / "log"  # 日誌目錄（每日分檔）
+# 所有日誌（PTT、去重、YT、未分流文章）寫入同一個 JSONL 事件串流（LOG_DIR/LOG_FILE），一行一個 JSON 物件：
+# - 固定欄位：ts（ISO 8601，本地時區）、level、event、source；選用：msg（原始文字）、error
+# - 其他欄位：呼叫端明確傳入，或從文字中的 key=value 取出（例如 channel、scanned、deleted、count；
+#   「elapsed=1.2s」轉為 elapsed_ms）
+# - 依大小（LOG_ROTATE_MB）與日期輪替：舊段改名為 events.YYYY-MM-DD.N.jsonl，背景 gzip，超過 LOG_RETENTION_DAYS 天刪除
+LOG_DIR = BASE_DIR / "log"  # 日誌目錄
 os.makedirs(LOG_DIR, exist_ok=True)  # 若不存在則建立目錄
 
-def get_daily_log_file() -> Path:
-    # 依日期分檔：ptt_asabox_YYYY-MM-DD.log（便於輪替與檢索）
-    date_str = datetime.date.today().strftime("%Y-%m-%d")
-    return LOG_DIR / f"ptt_asabox_{date_str}.log"
+LOG_FILE = LOG_DIR / os.getenv("LOG_FILE", "events.jsonl")                # 目前寫入中的事件串流
+LOG_ROTATE_MB = float(os.getenv("LOG_ROTATE_MB", "20"))                  # 單一段超過幾 MB 就輪替（0 = 只依日期）
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "14"))          # 輪替後的舊段保留天數（0 = 不刪）
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "true").lower() == "true"       # 輪替後的舊段是否 gzip
+
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "200"))                # 背景寫入：累積幾行寫一次
+LOG_FLUSH_INTERVAL_SEC = float(os.getenv("LOG_FLUSH_INTERVAL_SEC", "1"))  # 背景寫入：最多延遲幾秒就寫出
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))                # 背景寫入佇列上限（滿了丟棄並計數，不阻塞呼叫端）
+
+# 日誌等級：低於 LOG_LEVEL 的紀錄在組字串、解析欄位之前就略過（大量的逐筆紀錄如 [RAW] 為 DEBUG）
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "WARNING": 30, "ERROR": 40}
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVEL_NO = LOG_LEVELS.get(LOG_LEVEL, LOG_LEVELS["INFO"])
+
+def log_enabled(level: str) -> bool:
+    # 熱路徑可先用此判斷，整段省略組訊息的成本
+    return LOG_LEVELS.get(level, LOG_LEVELS["INFO"]) >= LOG_LEVEL_NO
+
+class BackgroundLogWriter:
+    # 背景日誌寫入：呼叫端（事件迴圈或 to_thread 執行緒）只把 (檔案路徑, 紀錄) 放進佇列，不碰磁碟
+    # - 紀錄為 dict（在寫入執行緒轉為 JSON 行）或已帶換行的字串
+    # - 單一寫入執行緒保持檔案開啟，累積 batch_size 行或 flush_sec 秒就一次寫出並 flush
+    # - 換日或超過 rotate_bytes 時輪替：關檔、改名為 <stem>.<日期>.<N><suffix>，另開執行緒 gzip 並套用保留天數
+    #   （日期為該段開始寫入的日期；上次結束時沒壓縮完的舊段在第一次寫入時補做）
+    # - 程式結束時（atexit）寫完佇列中剩下的內容再關檔；關閉後的呼叫改為直接寫檔
+    MAX_OPEN_FILES = 16
+
+    def __init__(self, batch_size: int = LOG_BATCH_SIZE, flush_sec: float = LOG_FLUSH_INTERVAL_SEC,
+                 max_queue: int = LOG_QUEUE_MAX, rotate_bytes: int = int(LOG_ROTATE_MB * 1024 * 1024),
+                 retention_days: int = LOG_RETENTION_DAYS, compress: bool = LOG_COMPRESS):
+        self.batch_size = max(1, batch_size)
+        self.flush_sec = max(0.0, flush_sec)
+        self.rotate_bytes = max(0, rotate_bytes)
+        self.retention_days = max(0, retention_days)
+        self.compress = compress
+        self.queue: queue.Queue = queue.Queue(maxsize=max(0, max_queue))
+        self.files: dict[str, list] = {}  # 路徑 -> [檔案物件, 開始寫入的日期, 目前大小]
+        self.seen_paths: set[str] = set()
+        self.written = 0
+        self.dropped = 0
+        self.rotated = 0
+        self.closed = False
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._housekeep_lock = threading.Lock()
+
+    def write(self, path, record):
+        if self.closed:
+            with contextlib.suppress(Exception), open(path, "a", encoding="utf-8") as f:
+                f.write(self._line(record))
+            return
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((str(path), record))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float | None = 5.0) -> bool:
+        # 等到目前佇列中的內容都寫出（回傳是否在 timeout 內完成）
+        if self._thread is None or self.closed:
+            return True
+        done = threading.Event()
+        self.queue.put((None, done))
+        return done.wait(timeout)
+
+    def close(self, timeout: float | None = 5.0):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            thread = self._thread
+        if thread is not None:
+            self.queue.put(None)
+            thread.join(timeout)
+
+    def describe(self) -> str:
+        return f"written={self.written} queued={self.queue.qsize()} dropped={self.dropped} rotated={self.rotated}"
+
+    def stats(self) -> dict:
+        return {"written": self.written, "queued": self.queue.qsize(), "dropped": self.dropped, "rotated": self.rotated}
+
+    @staticmethod
+    def _line(record) -> str:
+        if isinstance(record, str):
+            return record
+        return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None and not self.closed:
+                    self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        pending: dict[str, list[str]] = {}
+        count = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            waiter = None
+            if item:
+                path, payload = item
+                if path is None:
+                    waiter = payload
+                else:
+                    pending.setdefault(path, []).append(self._line(payload))
+                    count += 1
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_sec
+            if waiter is not None or not item or count >= self.batch_size:
+                self._flush(pending)
+                pending, count, deadline = {}, 0, None
+            if waiter is not None:
+                waiter.set()
+        self._flush(pending)
+        self._close_files()
+
+    def _flush(self, pending: dict[str, list[str]]):
+        today = datetime.date.today()
+        for path, lines in pending.items():
+            data = "".join(lines)
+            size = len(data.encode("utf-8"))  # 以位元組計（中文一字 3 bytes，不能用字元數）
+            try:
+                entry = self.files.get(path) or self._open(path)
+                if entry[1] != today or (self.rotate_bytes and entry[2] and entry[2] + size > self.rotate_bytes):
+                    self._rotate(path)
+                    entry = self._open(path)
+                entry[0].write(data)
+                entry[0].flush()
+                entry[2] += size
+                self.written += len(lines)
+            except Exception as e:
+                print(f"[LOG] write failed: {e} path={path}")
+                with contextlib.suppress(Exception):
+                    self.files.pop(path)[0].close()
+        while len(self.files) > self.MAX_OPEN_FILES:
+            with contextlib.suppress(Exception):
+                self.files.pop(next(iter(self.files)))[0].close()
+
+    def _open(self, path: str) -> list:
+        # 開檔（沿用既有內容）；既有檔的開始日期以修改時間估計，前一天留下的檔案會在寫入前輪替
+        if path not in self.seen_paths:
+            self.seen_paths.add(path)
+            threading.Thread(target=self._housekeep, args=(path, None), daemon=True).start()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        day = datetime.date.today()
+        size = 0
+        if os.path.exists(path):
+            st = os.stat(path)
+            size = st.st_size
+            if size:
+                day = datetime.date.fromtimestamp(st.st_mtime)
+        entry = [open(path, "a", encoding="utf-8"), day, size]
+        self.files[path] = entry
+        return entry
+
+    def _rotate(self, path: str):
+        # 關檔並改名為 <stem>.<開始日期>.<N><suffix>，交給背景執行緒壓縮與清理
+        entry = self.files.pop(path, None)
+        day = entry[1] if entry else datetime.date.today()
+        if entry:
+            with contextlib.suppress(Exception):
+                entry[0].close()
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        p = Path(path)
+        n = 1
+        while True:
+            segment = p.with_name(f"{p.stem}.{day.isoformat()}.{n}{p.suffix}")
+            if not segment.exists() and not Path(f"{segment}.gz").exists():
+                break
+            n += 1
+        os.replace(path, segment)
+        self.rotated += 1
+        threading.Thread(target=self._housekeep, args=(path, segment), daemon=True).start()
+
+    def _housekeep(self, path: str, segment: Path | None):
+        # 背景：gzip 舊段（segment 為 None 時壓縮所有尚未壓縮的舊段），再刪除超過保留天數的舊段
+        p = Path(path)
+        pattern = re.compile(re.escape(p.stem) + r"\.(\d{4}-\d{2}-\d{2})\.\d+" + re.escape(p.suffix) + r"(\.gz)?$")
+        with self._housekeep_lock:
+            try:
+                segments = [segment] if segment else [
+                    f for f in p.parent.iterdir() if pattern.match(f.name) and f.suffix != ".gz"
+                ]
+                if self.compress:
+                    for seg in segments:
+                        if not seg.exists():
+                            continue
+                        gz = Path(f"{seg}.gz")
+                        tmp = Path(f"{gz}.tmp")
+                        with open(seg, "rb") as src, gzip.open(tmp, "wb") as dst:
+                            shutil.copyfileobj(src, dst)
+                        os.replace(tmp, gz)
+                        os.remove(seg)
+                if self.retention_days:
+                    cutoff = datetime.date.today() - datetime.timedelta(days=self.retention_days)
+                    for f in p.parent.iterdir():
+                        m = pattern.match(f.name)
+                        if m and datetime.date.fromisoformat(m.group(1)) < cutoff:
+                            os.remove(f)
+            except Exception as e:
+                print(f"[LOG] housekeeping failed: {e} path={path}")
+
+    def _close_files(self):
+        for entry in self.files.values():
+            with contextlib.suppress(Exception):
+                entry[0].close()
+        self.files.clear()
+
+LOG_WRITER = BackgroundLogWriter()  # 所有日誌檔寫入共用
+atexit.register(LOG_WRITER.close)
 
 def _ts(ts: float | None = None) -> str:
     # 將 UNIX timestamp 轉為人類可讀的時間字串（本地時區）
     ts = ts or time.time()
     return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
 
-def write_ptt_log(start_time: float, status: str, error_message: str | None = None):
-    # PTT/一般運行日誌：記錄事件時間、狀態、錯誤訊息（若有）
-    ts_iso = datetime.datetime.fromtimestamp(start_time).strftime("%Y-%m-%d %H:%M:%S")
-    line = f"{ts_iso}\t{status}"
-    if error_message:
-        # 將多行錯誤訊息壓成一行，便於檔案查閱與處理
-        msg = " ".join(str(error_message).splitlines())
-        line += f"\t{msg}"
-    line += "\n"
-    log_file = get_daily_log_file()
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(line)  # 追加寫入每日日誌
-
-def write_dedupe_log(event: str, source: str, detail: str | None = None, ts: float | None = None):
-    # 去重日誌：記錄去重事件、來源標籤、細節（如刪除數量或訊息 ID）
-    tstr = _ts(ts)
-    line = f"{tstr}\t{event}\t{source}"
-    if detail:
-        line += f"\t{detail}"
-    line += "\n"
-    log_file = get_daily_log_file()
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(line)
+def log_record(event: str, source: str, *, ts: float | None = None, level: str = "INFO",
+               msg=None, error=None, path=None, **fields):
+    # 寫一筆結構化事件（背景寫入）；值為 None 的欄位省略
+    # 欄位由呼叫端以關鍵字參數明確給定（型別固定）；Discord ID 一律傳字串（超過 2^53，JSON 數字會失真）
+    # 等級不足時直接返回；msg 可傳入無參數函式，只在實際寫入時才組字串
+    if not log_enabled(level):
+        return
+    if callable(msg):
+        msg = msg()
+    record = {
+        "ts": datetime.datetime.fromtimestamp(ts or time.time()).astimezone().isoformat(timespec="milliseconds"),
+        "level": level,
+        "event": event,
+        "source": source,
+    }
+    if msg:
+        record["msg"] = " ".join(str(msg).splitlines())
+    if error:
+        record["error"] = " ".join(str(error).splitlines())
+    for key, value in fields.items():
+        if value is not None and key not in record:
+            record[key] = value
+    LOG_WRITER.write(path or LOG_FILE, record)
+
+def _split_status(status: str) -> tuple[str, str | None]:
+    # 運行日誌的狀態文字 -> (event, msg)：「[TAG] 其餘」或「[TAG][SUB] 其餘」取 TAG（SUB 以 . 連接），
+    # 沒有空白的單字（例如 PTT_CURSOR_SAVE_FAILED）本身就是 event
+    m = re.match(r"\[([^\]]+)\](?:\[([^\]]+)\])?\s*(.*)$", status, re.S)
+    if m:
+        event = m.group(1) + (f".{m.group(2)}" if m.group(2) else "")
+        return event, m.group(3) or None
+    if status and not any(ch.isspace() for ch in status):
+        return status, None
+    return "log", status
+
+def write_ptt_log(start_time: float, status, error_message: str | None = None, *, level: str | None = None, **fields):
+    # PTT/一般運行日誌：事件時間、狀態（轉為 event + msg）、錯誤訊息（若有，預設 level=ERROR）與結構化欄位
+    # 等級不足時在解析狀態文字前就返回；status 可傳入無參數函式（只在需要寫入時才組字串）
+    level = level or ("ERROR" if error_message else "INFO")
+    if not log_enabled(level):
+        return
+    event, msg = _split_status(status() if callable(status) else status)
+    log_record(event, "AsaBox", ts=start_time, level=level, msg=msg, error=error_message, **fields)
+
+def write_dedupe_log(event: str, source: str, detail: str | None = None, ts: float | None = None, *,
+                     level: str | None = None, **fields):
+    # 去重日誌：記錄去重事件、來源標籤、說明文字（可省略）與結構化欄位（頻道、訊息 ID、刪除數量等）
+    # 失敗類事件（*_error / *_forbidden）預設為 ERROR
+    level = level or ("ERROR" if event.endswith(("_error", "_forbidden")) else "INFO")
+    if not log_enabled(level):
+        return
+    log_record(event, source, ts=ts, level=level, msg=detail, **fields)
 
 # --- 共用：環境變數 / Token / 頻道 ---
 # 兩個 Token（必填），
@@ -212,80 +476,917 @@ def to_fxtwitter_clean(url: str) -> str | None:
     return None  # 無法解析時回傳 None
 
 # --- 共用：通用日誌（YT 用薄包） ---
-# 全域簡單去重快取，
-# 記憶最近一次寫入的 key 與時間，避免短時間重覆處理
-_LOG_DEDUPE_CACHE = {}
-_LOG_LOCK = threading.Lock()  # 保護快取併發存取（在多執行緒/非同步情境下安全）
-
-def _ensure_dir(path: str):
-    # 確保目錄存在：不存在則建立，若建立失敗（例如權限問題）則忽略例外以免中斷
-    try:
-        os.makedirs(path, exist_ok=True)
-    except Exception:
-        pass  # 實務上可加上 log_event 提醒
+LOG_SUPPRESS_MAX = int(os.getenv("LOG_SUPPRESS_MAX", "1024"))  # 去重快取最多記幾個 key
+
+class LogSuppressor:
+    # log_event 的去重快取：同一 dedupe_key 在 TTL 內只寫一次，期間略過的次數於下次寫入時以 suppressed=N 附上
+    # - 依最近寫入排序（OrderedDict）；每次寫入時清掉最舊且已過期的項目，並以 max_size 截斷，不會隨 key 數無限成長
+    # - 以 lock 保護（log_event 可能在 to_thread 執行緒呼叫）
+    def __init__(self, max_size: int = LOG_SUPPRESS_MAX):
+        self.max_size = max(1, max_size)
+        self.entries: OrderedDict[str, list] = OrderedDict()  # key -> [到期時間, 期間略過次數]
+        self.suppressed_total = 0
+        self.lock = threading.Lock()
+
+    def check(self, key: str, ttl_sec: float, now: float | None = None) -> int | None:
+        # 本次應略過時回傳 None；否則記下本次並回傳上次寫入後被略過的次數
+        now = now or time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and now < entry[0]:
+                entry[1] += 1
+                self.suppressed_total += 1
+                return None
+            skipped = entry[1] if entry else 0
+            self.entries[key] = [now + ttl_sec, 0]
+            self.entries.move_to_end(key)
+            while len(self.entries) > 1:
+                oldest = next(iter(self.entries.values()))
+                if len(self.entries) <= self.max_size and oldest[0] > now:
+                    break
+                self.entries.popitem(last=False)
+            return skipped
+
+    def describe(self) -> str:
+        return f"suppress_keys={len(self.entries)} suppressed={self.suppressed_total}"
+
+    def stats(self) -> dict:
+        return {"keys": len(self.entries), "suppressed": self.suppressed_total}
+
+LOG_SUPPRESSOR = LogSuppressor(LOG_SUPPRESS_MAX)
 
 def _now_ts_str():
     # 以本地時區回傳現在時間字串（YYYY-MM-DD HH:MM:SS）
     return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-def _default_log_path():
-    # 回傳預設 YouTube 監控日誌檔路徑：logs/yt/YYYY-MM-DD.log
-    base = os.path.join(os.getcwd(), "logs", "yt")
-    _ensure_dir(base)  # 確保目錄存在
-    fname = datetime.datetime.now().strftime("%Y-%m-%d") + ".log"
-    return os.path.join(base, fname)
-
 def log_event(tag: str, source: str, message: str, *,
               level: str = "INFO",
               file_path: str | None = None,
               dedupe_key: str | None = None,
               dedupe_ttl_sec: int = 30,
-              also_print: bool = True):
+              also_print: bool = True,
+              **fields):
     """
     通用事件記錄（含去重與 console 輸出）：
     - tag: 事件類型（例如 YT_MONITOR_START, YT_NO_NEW, YT_HTTP_ERROR）
     - source: 來源系統（例如 "YouTube"、"PTT"、"AsaBox"）
     - message: 文字內容（建議包含可變資訊：id/url/秒數等）
-    - level: 日誌等級（INFO/WARN/ERROR）
-    - file_path: 指定寫入檔案路徑；不指定則使用預設 logs/yt/YYYY-MM-DD.log
-    - dedupe_key: 去重鍵；同鍵在 TTL 期間僅寫一次（避免洗版）
+    - level: 日誌等級（DEBUG/INFO/WARN/ERROR；低於 LOG_LEVEL 時直接略過，不寫檔也不印出）
+    - file_path: 指定寫入檔案路徑；不指定則寫入共用的 JSONL 事件串流（LOG_FILE）
+    - dedupe_key: 去重鍵；同鍵在 TTL 期間僅寫一次（避免洗版），之後寫入時附上略過次數 suppressed
     - dedupe_ttl_sec: 去重 TTL 秒數（預設 30 秒）
     - also_print: 同步印到 console（True 時印出）
+    - fields: 結構化欄位（例如 count=3、video_id="..."），原樣寫入事件
     """
-    ts = _now_ts_str()  # 生成時間戳字串
-    line = f"{ts}\t{level}\t{tag}\t{source}\t{message}"  # 組合一行日誌
+    # 等級不足：在去重判斷與組字串之前就略過
+    if not log_enabled(level):
+        return
 
-    # 去重判斷（使用全域 _LOG_DEDUPE_CACHE 與 _LOG_LOCK 保護）
+    # 去重判斷（LOG_SUPPRESSOR：TTL + 數量上限）
+    skipped = 0
     if dedupe_key:
-        with _LOG_LOCK:
-            last_when = _LOG_DEDUPE_CACHE.get(dedupe_key)  # 上次紀錄時間
-            now_epoch = time.time()
-            if last_when and (now_epoch - last_when) < dedupe_ttl_sec:
-                return  # TTL 內重覆：直接略過不寫
-            _LOG_DEDUPE_CACHE[dedupe_key] = now_epoch  # 更新最近寫入時間
-
-    # 寫檔到指定或預設路徑
-    path = file_path or _default_log_path()
-    try:
-        _ensure_dir(os.path.dirname(path))  # 確保目錄存在
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(line + "\n")  # 追加寫入一行
-    except Exception as e:
-        # 檔案寫入失敗：可印出警告，避免吞掉錯誤
-        if also_print:
-            print(f"[LOG] write failed: {e} path={path}")
+        skipped = LOG_SUPPRESSOR.check(dedupe_key, dedupe_ttl_sec)
+        if skipped is None:
+            return  # TTL 內重覆：直接略過不寫
+
+    # 結構化事件（背景寫入）：event=tag
+    log_record(tag, source, level=level, msg=message, path=file_path, suppressed=skipped or None, **fields)
 
     # console 輸出（便於即時觀察）
     if also_print:
-        print(f"[LOG] {line}")
+        print(f"[LOG] {_now_ts_str()}\t{level}\t{tag}\t{source}\t{message}")
 
 def yt_log(tag: str, message: str, *, level: str = "INFO",
-           dedupe_key: str | None = None, dedupe_ttl_sec: int = 30):
+           dedupe_key: str | None = None, dedupe_ttl_sec: int = 30, **fields):
     # YouTube 專用薄包：固定 source="YouTube"，傳入其他參數到 log_event
     log_event(tag=tag, source="YouTube", message=message,
-              level=level, dedupe_key=dedupe_key, dedupe_ttl_sec=dedupe_ttl_sec)
+              level=level, dedupe_key=dedupe_key, dedupe_ttl_sec=dedupe_ttl_sec, **fields)
     
+# --- 共用：監控指標（Prometheus 文字格式；設定 METRICS_PORT 後由本機 HTTP 端點 /metrics 提供） ---
+# 指標一律在記憶體中累計（成本為一次 dict 更新），是否開端點只影響能不能被抓取
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))         # 0 = 不開啟端點
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")      # 預設只聽本機
+
+def _metric_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _metric_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    # 一個指標家族（名稱 + 說明 + 標籤名稱），各標籤值組合分開累計；以 lock 保護（YT 可能在執行緒中更新）
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values: dict[tuple, object] = {}
+        self.lock = threading.Lock()
+
+    def _labels(self, key: tuple, extra: tuple = ()) -> str:
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_metric_label(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> list[str]:
+        with self.lock:
+            items = list(self.values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{self._labels(key)} {_metric_value(v)}" for key, v in items)
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount: float = 1.0):
+        key = tuple(str(v) for v in label_values)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, *label_values, value: float):
+        key = tuple(str(v) for v in label_values)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram(Metric):
+    # 每組標籤保存 [各 bucket 計數..., 總和, 筆數]；輸出時轉為累積計數
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *label_values, value: float):
+        key = tuple(str(v) for v in label_values)
+        with self.lock:
+            st = self.values.get(key)
+            if st is None:
+                st = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    st[i] += 1
+                    break
+            st[-2] += value
+            st[-1] += 1
+
+    def render(self) -> list[str]:
+        with self.lock:
+            items = [(key, list(st)) for key, st in self.values.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, st in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, st):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{self._labels(key, (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._labels(key, (('le', '+Inf'),))} {st[-1]}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_metric_value(st[-2])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {st[-1]}")
+        return lines
+
+class MetricsRegistry:
+    # 指標註冊表；collectors 在每次輸出前執行（用來更新佇列深度、輪詢間隔等即時 gauge）
+    def __init__(self):
+        self.metrics: list[Metric] = []
+        self.collectors: list = []
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: tuple = ()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = Histogram.DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def on_collect(self, fn):
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self.collectors:
+            with contextlib.suppress(Exception):
+                fn()
+        return "\n".join(line for m in self.metrics for line in m.render()) + "\n"
+
+METRICS = MetricsRegistry()
+
+# PTT
+PTT_PAGE_FETCHES = METRICS.counter("ptt_page_fetches_total", "PTT index page requests by result (ok, not_modified, error)", ("board", "result"))
+PTT_PAGE_FETCH_SECONDS = METRICS.histogram("ptt_page_fetch_seconds", "PTT index page request latency", ("board",))
+PTT_ENTRIES_PARSED = METRICS.counter("ptt_entries_parsed_total", "Entries read from PTT index pages (origin=fetched: parsed from a 200 page, origin=cached: reused from the page cache on 304)", ("board", "origin"))
+PTT_ARTICLES_ROUTED = METRICS.counter("ptt_articles_routed_total", "Today's target-prefix articles by category and channel (category=unrouted when no route matches)", ("board", "category", "channel"))
+PTT_ARTICLES_SENT = METRICS.counter("ptt_articles_sent_total", "PTT articles delivered to Discord", ("board", "category", "channel"))
+PTT_ROUND_SECONDS = METRICS.histogram("ptt_round_seconds", "Duration of one crawl and push round", ("board",))
+PTT_ROUND_LAST_SECONDS = METRICS.gauge("ptt_round_last_seconds", "Duration of the most recent round", ("board",))
+PTT_POLL_INTERVAL_SECONDS = METRICS.gauge("ptt_poll_interval_seconds", "Current polling interval; alert when ptt_round_last_seconds approaches it", ("board",))
+
+# Discord（兩個 Bot 的發送佇列）
+DISCORD_REQUESTS = METRICS.counter("discord_requests_total", "Discord API actions from the send queue by label and result (ok, error)", ("bot", "label", "result"))
+DISCORD_REQUEST_SECONDS = METRICS.histogram("discord_request_seconds", "Discord API action latency, excluding queue wait", ("bot", "label"), (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+DISCORD_RATE_LIMITED = METRICS.counter("discord_rate_limited_total", "HTTP 429 responses by scope (channel, global)", ("bot", "scope"))
+DISCORD_QUEUE_WAIT_SECONDS = METRICS.histogram("discord_queue_wait_seconds", "Time from submit to completion in the send queue", ("bot", "priority"))
+DISCORD_QUEUE_DEPTH = METRICS.gauge("discord_queue_depth", "Actions waiting in the send queue", ("bot",))
+
+# 去重
+DEDUPE_SCANNED = METRICS.counter("dedupe_scanned_total", "Messages read by dedupe sweeps", ("channel",))
+DEDUPE_DELETED = METRICS.counter("dedupe_deleted_total", "Duplicate messages deleted by mode (full, incremental, realtime)", ("channel", "mode"))
+DEDUPE_SWEEP_SECONDS = METRICS.histogram("dedupe_sweep_seconds", "Per-channel dedupe sweep duration", ("channel",))
+
+# YouTube
+YT_API_CALLS = METRICS.counter("youtube_api_calls_total", "YouTube Data API calls by method and result (ok, quota_exceeded, error)", ("method", "result"))
+YT_API_SECONDS = METRICS.histogram("youtube_api_seconds", "YouTube Data API call latency", ("method",))
+YT_QUOTA_SLEEPS = METRICS.counter("youtube_quota_sleeps_total", "Pauses after quotaExceeded")
+YT_QUOTA_SLEEP_SECONDS = METRICS.counter("youtube_quota_sleep_seconds_total", "Seconds scheduled to pause after quotaExceeded")
+
+METRICS.gauge("process_start_time_seconds", "Process start time (unix seconds)").set(value=time.time())
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> web.AppRunner:
+    # 以 aiohttp 開本機端點 GET /metrics（與兩個 Bot 共用事件迴圈）
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=METRICS.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"[METRICS] listening on http://{host}:{port}/metrics")
+    write_ptt_log(time.time(), "[METRICS] listening", None, host=host, port=port)
+    return runner
+
+# --- 共用：階段計時（AsaBox 每輪各階段耗時，保留最近 PERF_HISTORY 輪，供 !perf 查詢） ---
+# 一輪 = 一個看板的抓取與推送（NBA、TB 各自一輪）或一次自動去重；
+# 以 contextvars 把本輪的計時器帶進子任務，perf_span 不在任何一輪內時不計時（成本只有一次查詢）
+PERF_HISTORY = int(os.getenv("PERF_HISTORY", "50"))  # 保留最近幾輪
+
+_CURRENT_ROUND: contextvars.ContextVar = contextvars.ContextVar("perf_round", default=None)
+
+class RoundSpans:
+    # 單輪的各階段累計耗時（秒）；階段並行時（多個分類同時推送、抓取與推送重疊）加總可能大於總耗時
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self.total = 0.0
+        self.stages: dict[str, float] = {}
+
+    def add(self, stage: str, elapsed: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+
+    def describe(self) -> str:
+        # 例："NBA 2026-10-17 12:00:01 total=8.1s fetch=5.2s parse=12ms route=1ms probe=420ms send=2.3s"
+        stages = " ".join(f"{k}={_fmt_secs(v)}" for k, v in self.stages.items())
+        return f"{self.name} {_ts(self.started_at)} total={_fmt_secs(self.total)} {stages}".rstrip()
+
+@contextlib.contextmanager
+def perf_span(stage: str):
+    # 累計一段程式碼（可含 await）的耗時到目前這一輪的 stage
+    spans = _CURRENT_ROUND.get()
+    if spans is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.add(stage, time.perf_counter() - started)
+
+def _fmt_secs(value: float) -> str:
+    # 1 秒以下以毫秒顯示（解析、分類等階段通常只有數毫秒）
+    return f"{value * 1000:.0f}ms" if value < 1 else f"{value:.1f}s"
+
+def _percentile(values: list[float], p: float) -> float:
+    # 最近排名法（nearest-rank）
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+
+class PerfRecorder:
+    # 以環狀緩衝保存最近 size 輪的 RoundSpans
+    def __init__(self, size: int = PERF_HISTORY):
+        self.rounds: deque[RoundSpans] = deque(maxlen=max(1, size))
+
+    @contextlib.contextmanager
+    def round(self, name: str):
+        spans = RoundSpans(name)
+        token = _CURRENT_ROUND.set(spans)
+        started = time.perf_counter()
+        try:
+            yield spans
+        finally:
+            spans.total = time.perf_counter() - started
+            _CURRENT_ROUND.reset(token)
+            self.rounds.append(spans)
+
+    def report(self) -> str:
+        # !perf 用：每種輪次的總耗時與各階段 p50/p95，以及最近最慢一輪的分段
+        rounds = list(self.rounds)
+        if not rounds:
+            return "尚無計時資料"
+        by_name: dict[str, list[RoundSpans]] = {}
+        for r in rounds:
+            by_name.setdefault(r.name, []).append(r)
+        lines = [f"最近 {len(rounds)} 輪（階段為累計耗時，並行時加總可能大於 total）"]
+        for name, group in by_name.items():
+            totals = [r.total for r in group]
+            parts = [f"{name} n={len(group)} total p50={_fmt_secs(_percentile(totals, 0.5))} p95={_fmt_secs(_percentile(totals, 0.95))}"]
+            for stage in dict.fromkeys(s for r in group for s in r.stages):
+                values = [r.stages.get(stage, 0.0) for r in group]
+                parts.append(f"{stage} p50={_fmt_secs(_percentile(values, 0.5))} p95={_fmt_secs(_percentile(values, 0.95))}")
+            lines.append(" | ".join(parts))
+        lines.append("最慢: " + max(rounds, key=lambda r: r.total).describe())
+        return "\n".join(lines)
+
+PERF = PerfRecorder(PERF_HISTORY)
+
+# --- 共用：Discord 發送佇列（兩個 Bot 各一個） ---
+# 所有 Discord 寫入（發訊息、回覆、刪訊息）都經由佇列：
+# - 每個頻道一個 worker 與一個優先佇列：單一頻道被限速時不會卡住其他頻道
+# - 每頻道 + 全域 token bucket 主動控速；仍收到 429 時依回應標頭（Retry-After / X-RateLimit-*）暫停該頻道或全域
+# - 優先權數字越小越先送：管理動作 > 傷病/合約情報 > 一般推送/回覆 > 批次去重刪除
+DISCORD_CHANNEL_RATE = int(os.getenv("DISCORD_CHANNEL_RATE", "5"))               # 每頻道每 DISCORD_CHANNEL_PER_SEC 秒最多幾次寫入
+DISCORD_CHANNEL_PER_SEC = float(os.getenv("DISCORD_CHANNEL_PER_SEC", "5"))
+DISCORD_GLOBAL_RATE = int(os.getenv("DISCORD_GLOBAL_RATE", "40"))                # 每個 Bot 每秒最多幾次寫入（Discord 全域上限 50）
+DISCORD_SEND_RETRIES = int(os.getenv("DISCORD_SEND_RETRIES", "3"))               # 收到 429 時最多重試幾次
+
+SEND_PRIORITY_MODERATION = 0  # 媒體限定刪文與提示
+SEND_PRIORITY_URGENT = 1      # 傷病、合約/交易情報
+SEND_PRIORITY_NORMAL = 2      # 一般推送、指令回覆、連結清理
+SEND_PRIORITY_BULK = 3        # 批次去重刪除
+
+class TokenBucket:
+    # 簡單 token bucket：capacity 個權杖，每 per 秒補滿；block_for() 用於收到 429 後強制暫停
+    def __init__(self, rate: int, per: float):
+        self.capacity = max(1, rate)
+        self.fill_rate = self.capacity / max(0.001, per)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        # 距離可取得一個權杖還要幾秒（0 表示現在就可以）
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.fill_rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block_for(self, seconds: float):
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = now
+
+def _retry_after_from(e: discord.HTTPException) -> tuple[float, bool]:
+    # 從 429 回應讀出 (需等待秒數, 是否為全域限速)；標頭缺漏時保守等 1 秒
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    retry_after = getattr(e, "retry_after", None)
+    for name in ("Retry-After", "X-RateLimit-Reset-After"):
+        if retry_after is None and headers.get(name):
+            with contextlib.suppress(ValueError):
+                retry_after = float(headers[name])
+    is_global = str(headers.get("X-RateLimit-Global", "")).lower() == "true" or headers.get("X-RateLimit-Scope") == "global"
+    return (retry_after if retry_after is not None else 1.0), is_global
+
+class DiscordSendQueue:
+    # 單一 Bot 的出站佇列；submit() 立即回傳 Future，run() 等到該動作實際執行完成
+    def __init__(self, name: str, channel_rate: int = DISCORD_CHANNEL_RATE, channel_per: float = DISCORD_CHANNEL_PER_SEC,
+                 global_rate: int = DISCORD_GLOBAL_RATE, retries: int = DISCORD_SEND_RETRIES):
+        self.name = name
+        self.channel_rate = channel_rate
+        self.channel_per = channel_per
+        self.retries = retries
+        self.global_bucket = TokenBucket(global_rate, 1.0)
+        self._buckets: dict[int, TokenBucket] = {}
+        self._queues: dict[int, asyncio.PriorityQueue] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+        self._seq = itertools.count()
+        # 統計：完成數、429 次數、各優先權的排隊等待時間（總和/最大值/筆數）
+        self.completed = 0
+        self.rate_limited = 0
+        self.wait_stats: dict[int, list[float]] = {}
+        METRICS.on_collect(lambda: DISCORD_QUEUE_DEPTH.set(self.name, value=self.depth()))
+
+    def submit(self, channel_id: int, action, priority: int = SEND_PRIORITY_NORMAL, label: str = "") -> asyncio.Future:
+        # action：無參數、回傳 coroutine 的函式（例如 lambda: channel.send(text)），重試時會再呼叫一次
+        fut = asyncio.get_running_loop().create_future()
+        q = self._queues.setdefault(channel_id, asyncio.PriorityQueue())
+        q.put_nowait((priority, next(self._seq), time.monotonic(), action, label, fut))
+        worker = self._workers.get(channel_id)
+        if worker is None or worker.done():
+            self._workers[channel_id] = asyncio.create_task(self._worker(channel_id))
+        return fut
+
+    async def run(self, channel_id: int, action, priority: int = SEND_PRIORITY_NORMAL, label: str = ""):
+        return await self.submit(channel_id, action, priority, label)
+
+    async def _acquire(self, bucket: TokenBucket):
+        # 同時取得頻道與全域權杖（檢查與扣除之間沒有 await，不會被其他 worker 插隊）
+        while True:
+            now = time.monotonic()
+            wait = max(bucket.delay(now), self.global_bucket.delay(now))
+            if wait <= 0:
+                bucket.take(now)
+                self.global_bucket.take(now)
+                return
+            await asyncio.sleep(wait)
+
+    async def _worker(self, channel_id: int):
+        q = self._queues[channel_id]
+        bucket = self._buckets.setdefault(channel_id, TokenBucket(self.channel_rate, self.channel_per))
+        while not q.empty():
+            priority, _, queued_at, action, label, fut = q.get_nowait()
+            if fut.cancelled():
+                continue
+            attempt = 0
+            while True:
+                await self._acquire(bucket)
+                started = time.monotonic()
+                try:
+                    result = await action()
+                except discord.HTTPException as e:
+                    DISCORD_REQUEST_SECONDS.observe(self.name, label, value=time.monotonic() - started)
+                    if e.status == 429:
+                        retry_after, is_global = _retry_after_from(e)
+                        DISCORD_RATE_LIMITED.inc(self.name, "global" if is_global else "channel")
+                        if attempt < self.retries:
+                            attempt += 1
+                            self.rate_limited += 1
+                            (self.global_bucket if is_global else bucket).block_for(retry_after)
+                            write_ptt_log(time.time(), f"[SENDQ-{self.name}] rate limited", None, level="WARN",
+                                          channel=str(channel_id), label=label, retry_after_ms=round(retry_after * 1000), is_global=is_global)
+                            continue
+                    DISCORD_REQUESTS.inc(self.name, label, "error")
+                    if not fut.done():
+                        fut.set_exception(e)
+                except Exception as e:
+                    DISCORD_REQUESTS.inc(self.name, label, "error")
+                    if not fut.done():
+                        fut.set_exception(e)
+                else:
+                    DISCORD_REQUEST_SECONDS.observe(self.name, label, value=time.monotonic() - started)
+                    DISCORD_REQUESTS.inc(self.name, label, "ok")
+                    if not fut.done():
+                        fut.set_result(result)
+                break
+            self.completed += 1
+            waited = time.monotonic() - queued_at
+            DISCORD_QUEUE_WAIT_SECONDS.observe(self.name, priority, value=waited)
+            st = self.wait_stats.setdefault(priority, [0.0, 0.0, 0])
+            st[0] += waited; st[1] = max(st[1], waited); st[2] += 1
+        # 佇列清空：worker 結束（下次 submit 會再建立）
+        self._workers.pop(channel_id, None)
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues.values())
+
+    def describe(self) -> str:
+        # 例："depth=3 done=120 429=0 wait[p1 avg=0.2s max=1.1s p3 avg=4.0s max=9.5s]"
+        waits = " ".join(
+            f"p{p} avg={st[0] / st[2]:.1f}s max={st[1]:.1f}s" for p, st in sorted(self.wait_stats.items()) if st[2]
+        )
+        return f"depth={self.depth()} done={self.completed} 429={self.rate_limited} wait[{waits}]"
+
+    def stats(self) -> dict:
+        # 日誌用：與 describe() 相同內容的結構化版本（等待時間依優先權分開）
+        return {
+            "depth": self.depth(),
+            "done": self.completed,
+            "rate_limited": self.rate_limited,
+            "wait": [
+                {"priority": p, "avg_ms": round(st[0] / st[2] * 1000), "max_ms": round(st[1] * 1000), "count": st[2]}
+                for p, st in sorted(self.wait_stats.items()) if st[2]
+            ],
+        }
+
 # --- 共用：刪除重複訊息工具（兩個 Bot 共用） ---
+# 增量去重：每個頻道在 SQLite 保存「內容雜湊 -> 最早一則訊息 ID」與「已掃描到的最新訊息 ID」檢查點，
+# 之後的掃描只讀檢查點之後的新訊息；full=True（或 !dedupe full）時重新掃描最近 limit 則並重建索引
+DEDUPE_DB = BASE_DIR / (os.getenv("DEDUPE_DB", "asabox.sqlite3"))  # 去重索引（可與已推送紀錄共用同一檔）
+DEDUPE_INCREMENTAL = os.getenv("DEDUPE_INCREMENTAL", "true").lower() == "true"  # false 時每次都完整掃描
+DEDUPE_CONCURRENCY = int(os.getenv("DEDUPE_CONCURRENCY", "4"))  # 同時掃描的頻道數上限
+
+DEDUPE_TRACE_MEMORY = os.getenv("DEDUPE_TRACE_MEMORY", "false").lower() == "true"  # 以 tracemalloc 記錄每次掃描的記憶體峰值
+
+# 即時去重：新訊息進來時與該頻道最近的訊息比對，完全相同者立即刪除；週期掃描只負責補漏（離線期間、刪除失敗等）
+DEDUPE_REALTIME = os.getenv("DEDUPE_REALTIME", "true").lower() == "true"
+DEDUPE_WINDOW_SIZE = int(os.getenv("DEDUPE_WINDOW_SIZE", str(DUPLICATE_SCAN_LIMIT)))  # 每頻道記住的最近內容數
+
+# 兩個 Bot 的去重掃描共用協調器：同一頻道同時只掃一次，剛掃完 DEDUPE_FRESH_SEC 秒內的請求直接沿用上次結果
+DEDUPE_FRESH_SEC = float(os.getenv("DEDUPE_FRESH_SEC", "120"))
+
+# 自動去重（啟動時、週期掃描、即時去重）涵蓋的頻道
+AUTO_DEDUPE_CHANNELS = [
+    CHANNEL_SHARING_GIRL, CHANNEL_SHARING_BOY, CHANNEL_INJURIED,
+    CHANNEL_GAME_BOX, CHANNEL_CONTRACT, CHANNEL_INTELLIGENCE_NEWS,
+    CHANNEL_BRAVES, CHANNEL_PILOTS, CHANNEL_TSG, CHANNEL_YKE_ARK
+]
+REALTIME_DEDUPE_CHANNELS = {int(c) for c in AUTO_DEDUPE_CHANNELS if str(c or "").strip().isdigit()} - {0}
+
+# 去重鍵版本：正規化規則或雜湊方式改變時加 1；索引中版本不符的頻道會自動完整重掃並重建
+# v1：前後去空白、換行統一為 \n，UTF-8 後取 16 bytes BLAKE2b（person 參數帶版本）
+DEDUPE_KEY_VERSION = 1
+
+def normalize_dedupe_content(content: str | None) -> str:
+    return (content or "").strip().replace("\r\n", "\n")
+
+def dedupe_content_key(content: str) -> bytes:
+    # 去重鍵：正規化內容的固定長度摘要（16 bytes），長訊息也不必整段留在記憶體或資料庫
+    return hashlib.blake2b(
+        normalize_dedupe_content(content).encode("utf-8"),
+        digest_size=16,
+        person=f"asabox-dedupe-v{DEDUPE_KEY_VERSION}".encode("ascii")[:16],
+    ).digest()
+
+class DedupeIndex:
+    # 各頻道的持久化去重索引：
+    # - dedupe_keys：(channel_id, content_key) -> 最早出現的 message_id（保留者）
+    # - dedupe_checkpoints：channel_id -> 已掃描到的最新 message_id
+    # 每個頻道最多保留 limit 筆（依 message_id 由新到舊），與完整掃描「最近 limit 則」的範圍一致
+    def __init__(self, path: Path):
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS dedupe_keys ("
+                " channel_id INTEGER NOT NULL,"
+                " content_key BLOB NOT NULL,"
+                " message_id INTEGER NOT NULL,"
+                " PRIMARY KEY (channel_id, content_key)"
+                ") WITHOUT ROWID"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_dedupe_keys_message ON dedupe_keys(channel_id, message_id)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS dedupe_checkpoints ("
+                " channel_id INTEGER PRIMARY KEY, last_message_id INTEGER NOT NULL, updated_at REAL NOT NULL,"
+                " key_version INTEGER NOT NULL DEFAULT 0)"
+            )
+            cols = {row[1] for row in self.conn.execute("PRAGMA table_info(dedupe_checkpoints)")}
+            if "key_version" not in cols:
+                self.conn.execute("ALTER TABLE dedupe_checkpoints ADD COLUMN key_version INTEGER NOT NULL DEFAULT 0")
+
+    def checkpoint(self, channel_id: int) -> int | None:
+        # 去重鍵版本不符（舊規則建立的索引）時視為沒有檢查點，呼叫端會完整重掃並重建
+        row = self.conn.execute(
+            "SELECT last_message_id, key_version FROM dedupe_checkpoints WHERE channel_id=?", (channel_id,)
+        ).fetchone()
+        if not row or row[1] != DEDUPE_KEY_VERSION:
+            return None
+        return row[0]
+
+    def load(self, channel_id: int) -> dict[bytes, int]:
+        rows = self.conn.execute("SELECT content_key, message_id FROM dedupe_keys WHERE channel_id=?", (channel_id,))
+        return {bytes(k): mid for k, mid in rows}
+
+    def save(self, channel_id: int, keys: dict[bytes, int], last_message_id: int | None, limit: int, *, replace: bool):
+        # 寫回本次掃描結果；replace=True（完整掃描）時先清掉該頻道舊索引
+        with self.conn:
+            if replace:
+                self.conn.execute("DELETE FROM dedupe_keys WHERE channel_id=?", (channel_id,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO dedupe_keys (channel_id, content_key, message_id) VALUES (?, ?, ?)",
+                [(channel_id, k, mid) for k, mid in keys.items()],
+            )
+            self.conn.execute(
+                "DELETE FROM dedupe_keys WHERE channel_id=? AND message_id NOT IN ("
+                " SELECT message_id FROM dedupe_keys WHERE channel_id=? ORDER BY message_id DESC LIMIT ?)",
+                (channel_id, channel_id, max(1, limit)),
+            )
+            if last_message_id is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO dedupe_checkpoints (channel_id, last_message_id, updated_at, key_version)"
+                    " VALUES (?, ?, ?, ?)",
+                    (channel_id, last_message_id, time.time(), DEDUPE_KEY_VERSION),
+                )
+
+    def forget_message(self, channel_id: int, message_id: int):
+        # 保留者被刪除時移除其索引（之後相同內容的新訊息不再被當成重複）
+        with self.conn:
+            self.conn.execute("DELETE FROM dedupe_keys WHERE channel_id=? AND message_id=?", (channel_id, message_id))
+
+def message_dedupe_key(msg) -> bytes | None:
+    # 訊息的去重鍵；只處理「一般訊息」且有文字內容者，其他（系統訊息、只有附件或嵌入）回傳 None
+    if msg.type != discord.MessageType.default:
+        return None
+    content = normalize_dedupe_content(msg.content)
+    return dedupe_content_key(content) if content else None
+
+class DedupeWindow:
+    # 即時去重用的滾動視窗：每個頻道最近 size 個不同內容的「去重鍵 -> 保留者 message_id」
+    # - 依保留者出現先後淘汰最舊的（OrderedDict），記憶體上限約 頻道數 × size × (16 bytes 鍵 + ID)
+    # - 頻道第一次用到時由持久化索引（DedupeIndex）載入，重啟後仍認得之前的內容
+    # - 保留者被刪除時 forget，之後相同內容的新訊息不再被當成重複
+    # - 由索引載入的保留者可能已在離線期間被刪除：記為未確認，第一次據以刪除前由呼叫端確認仍存在
+    def __init__(self, size: int = DEDUPE_WINDOW_SIZE):
+        self.size = max(1, size)
+        self.keys: dict[int, OrderedDict[bytes, int]] = {}
+        self.ids: dict[int, dict[int, bytes]] = {}
+        self.unverified: dict[int, set[int]] = {}
+
+    def _channel(self, channel_id: int) -> OrderedDict[bytes, int]:
+        keys = self.keys.get(channel_id)
+        if keys is None:
+            index = dedupe_index()
+            loaded = index.load(channel_id) if index.checkpoint(channel_id) is not None else {}
+            newest = sorted(loaded.items(), key=lambda kv: kv[1])[-self.size:]
+            keys = self.keys[channel_id] = OrderedDict(newest)
+            self.ids[channel_id] = {mid: k for k, mid in newest}
+            self.unverified[channel_id] = {mid for _, mid in newest}
+        return keys
+
+    def is_verified(self, channel_id: int, message_id: int) -> bool:
+        # 保留者是否已確認存在（本次執行期間收到過，或已由 fetch 確認）
+        return message_id not in self.unverified.get(channel_id, ())
+
+    def mark_verified(self, channel_id: int, message_id: int):
+        self.unverified.get(channel_id, set()).discard(message_id)
+
+    def check(self, channel_id: int, message_id: int, key: bytes) -> int | None:
+        # 內容在視窗內已有較早的訊息時回傳該保留者 ID（本則為重複）；否則記下本則並回傳 None
+        keys = self._channel(channel_id)
+        ids = self.ids[channel_id]
+        keeper = keys.get(key)
+        if keeper is not None and keeper < message_id:
+            return keeper
+        if keeper is not None:
+            ids.pop(keeper, None)
+        keys[key] = message_id
+        keys.move_to_end(key)
+        ids[message_id] = key
+        while len(keys) > self.size:
+            _, old_id = keys.popitem(last=False)
+            ids.pop(old_id, None)
+            self.unverified[channel_id].discard(old_id)
+        return None
+
+    def forget(self, channel_id: int, message_id: int):
+        self.unverified.get(channel_id, set()).discard(message_id)
+        key = self.ids.get(channel_id, {}).pop(message_id, None)
+        if key is not None and self.keys[channel_id].get(key) == message_id:
+            del self.keys[channel_id][key]
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self.keys.values())
+
+class DedupeCoordinator:
+    # 跨 Bot 的頻道去重協調（兩個 Bot 跑在同一個事件迴圈，共用一個實例）：
+    # - 單一飛行：同一頻道同時只跑一個掃描；掃描期間的其他請求直接加入，取得同一個結果
+    # - 新鮮度：fresh_sec 秒內剛掃完的頻道直接回傳上次結果，不再讀歷史
+    #   （完整掃描請求只沿用完整掃描的結果；進行中的是增量掃描時，等它結束後再自己掃一次）
+    # - 掃描以 shield 保護：發起者被取消（例如工作逾時）時，已加入的請求仍會拿到結果
+    # - sem：所有掃描共用的併發上限（DEDUPE_CONCURRENCY）
+    def __init__(self, fresh_sec: float = DEDUPE_FRESH_SEC, concurrency: int = DEDUPE_CONCURRENCY):
+        self.fresh_sec = fresh_sec
+        self.sem = asyncio.Semaphore(max(1, concurrency))
+        self.inflight: dict[int, tuple[asyncio.Task, bool, float]] = {}
+        self.last: dict[int, tuple[float, bool, tuple[int, int]]] = {}
+
+    async def run(self, channel_id: int, full: bool, sweep, source: str) -> tuple[tuple[int, int], str, float]:
+        # 回傳 ((scanned, deleted), 狀態, 秒數)；狀態為 swept（本次掃描）/ joined（加入進行中的掃描）/ fresh（沿用上次結果）
+        # 秒數：joined 為該次掃描已開始多久、fresh 為上次掃描完成多久；swept 為 0
+        while True:
+            last = self.last.get(channel_id)
+            if last and time.time() - last[0] < self.fresh_sec and (last[1] or not full):
+                age = time.time() - last[0]
+                write_dedupe_log(
+                    "dedupe_channel_fresh", source,
+                    channel=str(channel_id), age_ms=round(age * 1000), scanned=last[2][0], deleted=last[2][1],
+                )
+                return last[2], "fresh", age
+            current = self.inflight.get(channel_id)
+            if current is None:
+                break
+            task, task_full, task_started = current
+            if task_full or not full:
+                age = time.time() - task_started
+                write_dedupe_log("dedupe_channel_joined", source, channel=str(channel_id), full=task_full, age_ms=round(age * 1000))
+                return await asyncio.shield(task), "joined", age
+            with contextlib.suppress(Exception):
+                await asyncio.shield(task)
+
+        task = asyncio.ensure_future(sweep())
+        self.inflight[channel_id] = (task, full, time.time())
+
+        def finished(t: asyncio.Task):
+            if self.inflight.get(channel_id, (None,))[0] is t:
+                del self.inflight[channel_id]
+            if not t.cancelled() and t.exception() is None:
+                self.last[channel_id] = (time.time(), full, t.result())
+
+        task.add_done_callback(finished)
+        return await asyncio.shield(task), "swept", 0.0
+
+class DedupeSummary:
+    # delete_duplicate_messages 的結果：scanned/deleted 只算本次實際掃描的頻道；
+    # 加入進行中的掃描或沿用剛完成結果的頻道另記於 shared（(頻道, 狀態, 秒數, 該次刪除數)），其刪除不是本次所做
+    def __init__(self):
+        self.scanned = 0
+        self.deleted = 0
+        self.shared: list[tuple[int, str, float, int]] = []
+
+    def describe(self) -> str:
+        # !dedupe 回覆用，例："去重完成，本次刪除重複訊息共 3 則。\n頻道 <#123>：沿用 42 秒前的掃描結果（該次刪除 5 則）"
+        lines = [f"去重完成，本次刪除重複訊息共 {self.deleted} 則。"]
+        for channel_id, state, age, deleted in self.shared:
+            if state == "fresh":
+                lines.append(f"頻道 <#{channel_id}>：沿用 {age:.0f} 秒前的掃描結果（該次刪除 {deleted} 則）")
+            else:
+                lines.append(f"頻道 <#{channel_id}>：加入 {age:.0f} 秒前開始的掃描（該次刪除 {deleted} 則）")
+        return "\n".join(lines)
+
+class DedupeMemoryTrace:
+    # DEDUPE_TRACE_MEMORY 的 tracemalloc 量測；tracemalloc 是全域的，而兩個 Bot 可能同時掃描：
+    # - 參考計數啟停：最後一個結束的掃描才 stop（且只停自己啟動的），不會中途停掉別人的量測
+    # - 只有開始時沒有其他掃描在跑的那一次會 reset_peak 並回報峰值；量測期間有其他掃描加入時標記 overlapped
+    def __init__(self):
+        self.active = 0
+        self.owned = False
+        self.overlapped = False
+
+    def begin(self) -> bool:
+        # 回傳本次掃描是否負責量測
+        measuring = self.active == 0
+        if measuring:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.owned = True
+            tracemalloc.reset_peak()
+            self.overlapped = False
+        else:
+            self.overlapped = True
+        self.active += 1
+        return measuring
+
+    def end(self, measuring: bool) -> tuple[int | None, bool]:
+        # 回傳 (峰值 KB 或 None, 是否與其他掃描重疊)
+        peak_kb = tracemalloc.get_traced_memory()[1] // 1024 if measuring else None
+        overlapped = self.overlapped
+        self.active -= 1
+        if self.active == 0 and self.owned:
+            tracemalloc.stop()
+            self.owned = False
+        return peak_kb, overlapped
+
+DEDUPE_MEMORY_TRACE = DedupeMemoryTrace()
+
+_DEDUPE_INDEX: DedupeIndex | None = None
+_DEDUPE_WINDOW: DedupeWindow | None = None
+_DEDUPE_COORDINATOR: DedupeCoordinator | None = None
+
+BULK_DELETE_MAX = 100                                  # Discord 批次刪除單次上限
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14)      # 超過 14 天的訊息不能批次刪除
+
+def dedupe_index() -> DedupeIndex:
+    # 兩個 Bot 共用同一個索引；延遲建立
+    global _DEDUPE_INDEX
+    if _DEDUPE_INDEX is None:
+        _DEDUPE_INDEX = DedupeIndex(DEDUPE_DB)
+    return _DEDUPE_INDEX
+
+def dedupe_window() -> DedupeWindow:
+    # 兩個 Bot 共用同一個視窗（刪除事件由任一 Bot 收到都會更新）；延遲建立
+    global _DEDUPE_WINDOW
+    if _DEDUPE_WINDOW is None:
+        _DEDUPE_WINDOW = DedupeWindow(DEDUPE_WINDOW_SIZE)
+    return _DEDUPE_WINDOW
+
+def dedupe_coordinator() -> DedupeCoordinator:
+    # 兩個 Bot 共用同一個協調器；延遲建立（需在事件迴圈內使用）
+    global _DEDUPE_COORDINATOR
+    if _DEDUPE_COORDINATOR is None:
+        _DEDUPE_COORDINATOR = DedupeCoordinator(DEDUPE_FRESH_SEC)
+    return _DEDUPE_COORDINATOR
+
+def forget_dedupe_message(channel_id: int, message_id: int):
+    # 訊息被刪除：從持久化索引與即時視窗移除（若它是某內容的保留者）
+    dedupe_index().forget_message(channel_id, message_id)
+    if _DEDUPE_WINDOW is not None:
+        _DEDUPE_WINDOW.forget(channel_id, message_id)
+
+async def dedupe_keeper_exists(channel, keeper_id: int) -> bool | None:
+    # 確認索引中的保留者仍存在（可能在 Bot 離線期間被刪除，沒收到刪除事件）：
+    # - 存在回傳 True；已不存在（NotFound）時從索引與視窗移除並回傳 False
+    # - 其他錯誤回傳 None（無法確認，本次不據以刪除）
+    try:
+        await channel.fetch_message(keeper_id)
+    except discord.NotFound:
+        forget_dedupe_message(channel.id, keeper_id)
+        return False
+    except discord.HTTPException:
+        return None
+    return True
+
+async def suppress_duplicate_message(client: discord.Client, message: discord.Message, source: str) -> bool:
+    # 即時去重：去重頻道的新訊息若與視窗內較早的訊息內容完全相同，立即刪除並回傳 True
+    # 刪除失敗時只記錄，留給週期掃描處理
+    if not DEDUPE_REALTIME or message.channel.id not in REALTIME_DEDUPE_CHANNELS:
+        return False
+    key = message_dedupe_key(message)
+    if key is None:
+        return False
+    ch_id = message.channel.id
+    window = dedupe_window()
+    keeper = window.check(ch_id, message.id, key)
+    if keeper is None:
+        return False
+    if not window.is_verified(ch_id, keeper):
+        exists = await dedupe_keeper_exists(message.channel, keeper)
+        if not exists:
+            # 保留者已不存在（或無法確認）：不刪除；已不存在時本則成為新的保留者
+            if exists is False:
+                window.check(ch_id, message.id, key)
+            return False
+        window.mark_verified(ch_id, keeper)
+    try:
+        await client.send_queue.run(ch_id, message.delete, SEND_PRIORITY_MODERATION, "dedupe_realtime")
+    except discord.HTTPException as e:
+        event = "dedupe_msg_delete_forbidden" if isinstance(e, discord.Forbidden) else "dedupe_msg_delete_http_error"
+        write_dedupe_log(event, source, error=str(e), channel=str(ch_id), method="realtime", msg_ids=[str(message.id)], keeper=str(keeper))
+        return False
+    print(f"[DEDUPE] realtime channel={ch_id} deleted={message.id} keeper={keeper}")
+    DEDUPE_DELETED.inc(ch_id, "realtime")
+    write_dedupe_log("dedupe_msg_deleted", source, channel=str(ch_id), method="realtime", size=1, deleted=1,
+                     msg_ids=[str(message.id)], keeper=str(keeper))
+    return True
+
+async def delete_messages_in_batches(client: discord.Client, channel, messages: list, source: str,
+                                     *, verbose: bool = True, id_cap: int = 200) -> int:
+    # 刪除 messages，回傳成功刪除的數量；每批結果寫入去重日誌（verbose 時附上訊息 ID，最多 id_cap 個）：
+    # - 14 天內的訊息以 channel.delete_messages 每次最多 100 則（單則時 discord.py 自動改用單刪）
+    # - 超過 14 天、頻道不支援批次刪除、或批次失敗（非權限問題）時改為逐則刪除
+    # - 皆經由發送佇列以最低優先權執行
+    ch_id = channel.id
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - BULK_DELETE_MAX_AGE + datetime.timedelta(minutes=5)
+    can_bulk = hasattr(channel, "delete_messages")
+    recent = [m for m in messages if can_bulk and getattr(m, "created_at", None) and m.created_at > cutoff]
+    recent_ids = {m.id for m in recent}
+    singles = [m for m in messages if m.id not in recent_ids]
+    deleted = 0
+
+    def id_list(items) -> dict:
+        # verbose 時附上訊息 ID（字串列表，最多 id_cap 個；超過時 msg_ids_truncated=True）
+        if not verbose:
+            return {}
+        ids = [str(getattr(m, "id", m)) for m in items]
+        return {"msg_ids": ids[:id_cap], "msg_ids_truncated": len(ids) > id_cap or None}
+
+    for i in range(0, len(recent), BULK_DELETE_MAX):
+        batch = recent[i:i + BULK_DELETE_MAX]
+        batch_no = i // BULK_DELETE_MAX + 1
+        try:
+            await client.send_queue.run(ch_id, lambda batch=batch: channel.delete_messages(batch), SEND_PRIORITY_BULK, "dedupe_bulk")
+            deleted += len(batch)
+            write_dedupe_log("dedupe_msg_deleted", source, channel=str(ch_id), method="bulk", batch=batch_no,
+                             size=len(batch), deleted=len(batch), **id_list(batch))
+        except discord.Forbidden:
+            # 權限不足：整批（與之後的批次）都刪不了
+            write_dedupe_log("dedupe_msg_delete_forbidden", source, channel=str(ch_id), method="bulk", batch=batch_no,
+                             size=len(batch), **id_list(batch))
+            return deleted
+        except discord.HTTPException as he:
+            # 批次失敗（例如部分訊息已不存在）：記錄後改為逐則刪除
+            write_dedupe_log(
+                "dedupe_msg_delete_http_error", source, error=str(he),
+                channel=str(ch_id), method="bulk", batch=batch_no, size=len(batch), fallback="single",
+            )
+            singles.extend(batch)
+
+    failed: list[str] = []
+    forbidden = False
+    for m in singles:
+        if forbidden:
+            failed.append(str(m.id))
+            continue
+        try:
+            await client.send_queue.run(ch_id, m.delete, SEND_PRIORITY_BULK, "dedupe")
+            deleted += 1
+        except discord.Forbidden:
+            forbidden = True
+            failed.append(str(m.id))
+        except discord.HTTPException:
+            failed.append(str(m.id))
+    if singles:
+        ok = len(singles) - len(failed)
+        write_dedupe_log("dedupe_msg_deleted", source, channel=str(ch_id), method="single", size=len(singles), deleted=ok)
+        if failed:
+            event = "dedupe_msg_delete_forbidden" if forbidden else "dedupe_msg_delete_http_error"
+            write_dedupe_log(event, source, channel=str(ch_id), method="single", size=len(singles), failed=len(failed), **id_list(failed))
+    return deleted
+
 # ===== 共同工具：刪除重複訊息（跨 Bot 可用，含日誌）=====
 async def delete_duplicate_messages(
     client: discord.Client,
@@ -293,42 +1394,48 @@ async def delete_duplicate_messages(
     limit: int = DUPLICATE_SCAN_LIMIT,
     source: str = "auto.Asabox",
     *,
-    verbose: bool = True,                 # 是否輸出逐則訊息的詳細 LOG（True 會更詳細）
-    verbose_cap_per_channel: int = 200    # 每個頻道最多記錄多少筆逐則 LOG（避免檔案爆量）
+    full: bool = False,                   # True：忽略檢查點，完整掃描最近 limit 則並重建索引
+    verbose: bool = True,                 # 刪除 LOG 是否列出訊息 ID（True 會更詳細）
+    verbose_cap_per_channel: int = 200    # 每批最多列出多少個訊息 ID（避免檔案爆量）
 ):
     """
-    掃描指定頻道最近 limit 則訊息，刪除文字內容完全相同的重複訊息。
+    刪除指定頻道中文字內容完全相同的重複訊息（保留最早的一則）。
+    - 增量模式：只掃描上次檢查點之後的新訊息，與持久化索引比對（每次最多 limit 則）
+    - 完整模式（full=True、尚無檢查點、或 DEDUPE_INCREMENTAL=false）：掃描最近 limit 則並重建索引
     - 僅對「一般訊息」（discord.MessageType.default）進行去重
     - 空內容（只有附件或嵌入）不去重
-    - 以訊息「完整文字內容」作為去重 key（完全一致才算重複）
+    - 以訊息正規化內容的 16 bytes BLAKE2b 摘要作為去重 key（內容完全一致才算重複）
+    - 經由 dedupe_coordinator()：同一頻道已在掃描時加入該次掃描，DEDUPE_FRESH_SEC 內剛掃過則沿用結果
+    - 回傳 DedupeSummary：刪除數只算本次實際掃描的頻道，加入或沿用的頻道另列於 shared
     LOG 分層：
     - dedupe_start/dedupe_done：整體開始與結束
     - dedupe_channel_begin/dedupe_channel_end：每個頻道的掃描起訖與耗時
-    - dedupe_msg_*：逐則結果（受 verbose 與 cap 控制）
+    - dedupe_channel_joined/dedupe_channel_fresh：加入進行中的掃描 / 沿用剛完成的結果
+    - dedupe_msg_*：每批刪除結果（批次刪除每 100 則一批，逐則刪除合併為一筆）
     - dedupe_error：任何例外
     """
 
     # 記錄整體作業開始時間（epoch 秒），用於耗時計算與 LOG 統一時間標記
     started_at = time.time()
 
+    # 記憶體量測（DEDUPE_TRACE_MEMORY=true）：本次掃描期間 tracemalloc 的峰值（與其他掃描共用 tracer，見 DedupeMemoryTrace）
+    measuring = DEDUPE_MEMORY_TRACE.begin() if DEDUPE_TRACE_MEMORY else False
+
     # 開始 LOG：列出來源、頻道清單、limit 上限與 verbose 狀態
     write_dedupe_log(
         "dedupe_start",                        # 事件標籤：全域開始
         source,                                # 來源標記（例如 auto.Asabox / manual.Asabot）
-        detail=f"channels={','.join(str(cid) for cid in channel_ids if cid)} limit={limit} verbose={verbose}",
-        ts=started_at                          # 使用統一時間戳，方便串接
+        ts=started_at,                         # 使用統一時間戳，方便串接
+        channels=[str(cid) for cid in channel_ids if cid], limit=limit, full=full, verbose=verbose,
     )
 
-    # 全域統計：累加刪除數與掃描數
-    total_deleted = 0
-    total_scanned = 0
-    print(f'channel_ids={channel_ids}')
-    # 逐一處理每個頻道 ID
-    for ch_id in channel_ids:
-        # 若 ch_id 無效（None 或 0），略過
-        if not ch_id:
-            continue
+    index = dedupe_index()
+
+    # 多個頻道同時掃描（兩個 Bot 合計最多 DEDUPE_CONCURRENCY 個）；Discord 限速以頻道為單位，總耗時接近最慢的單一頻道
+    coordinator = dedupe_coordinator()
 
+    async def dedupe_channel(ch_id: int) -> tuple[int, int]:
+        # 單一頻道的掃描與刪除，回傳 (scanned, deleted)
         # 記錄單一頻道的作業開始時間，用於 per-channel 耗時統計
         ch_begin = time.time()
 
@@ -337,120 +1444,137 @@ async def delete_duplicate_messages(
             channel = client.get_channel(ch_id) or await client.fetch_channel(ch_id)
         except Exception as e:
             # 若頻道取得失敗，印出錯誤並寫入 LOG，跳過此頻道
-            msg = f"fetch_channel_failed channel={ch_id} err=" + " ".join(str(e).splitlines())
-            print(f"[DEDUPE] {msg}")
-            write_dedupe_log("dedupe_error", source, detail=msg)
-            continue
+            print(f"[DEDUPE] fetch_channel_failed channel={ch_id} err={e}")
+            write_dedupe_log("dedupe_error", source, "fetch_channel_failed", error=str(e), channel=str(ch_id))
+            return 0, 0
+
+        # 決定掃描模式：有檢查點且未要求完整掃描時，只讀檢查點之後的訊息
+        checkpoint = None if (full or not DEDUPE_INCREMENTAL) else index.checkpoint(ch_id)
+        mode = "incremental" if checkpoint is not None else "full"
 
-        # 每頻道開始 LOG：標記此頻道即將開始掃描，附帶 limit
-        write_dedupe_log("dedupe_channel_begin", source, detail=f"channel={ch_id} limit={limit}")
+        # 每頻道開始 LOG：標記此頻道即將開始掃描，附帶 limit 與模式
+        write_dedupe_log("dedupe_channel_begin", source, channel=str(ch_id), limit=limit, mode=mode)
 
-        # 用 set 記錄已見過的「完整文字內容」，第一個出現者保留，其後相同者刪除
-        seen = set()
+        # 內容雜湊 -> 保留者（最早一則）的 message_id；增量模式由索引載入
+        # 由索引載入的保留者可能已在離線期間被刪除：據以刪除前先確認仍存在（每個保留者只確認一次）
+        seen: dict[bytes, int] = index.load(ch_id) if checkpoint is not None else {}
+        new_keys: dict[bytes, int] = {}
+        keeper_ok: dict[int, bool | None] = {}
+        duplicates: list = []
+        last_message_id = checkpoint
 
         # 此頻道的統計：刪除數與掃描數
         deleted = 0
         scanned = 0
 
-        # 計數器：本頻道已輸出的逐則 LOG 數量，用於控制在 verbose_cap_per_channel 以內
-        per_msg_logged = 0
-
         try:
-            # 非同步迭代：抓取此頻道最近 limit 則訊息
-            async for msg in channel.history(limit=limit):
-                # 每抓到一則訊息，先增加掃描數
-                scanned += 1
-
-                # 在 verbose 模式下，記錄基礎掃描狀態（訊息類型、是否有文字內容）
-                if verbose and per_msg_logged < verbose_cap_per_channel:
-                    per_msg_logged += 1
-
-                # 抽取並標準化文字內容：去除前後空白，None 轉空字串
-                content = (msg.content or "").strip()
+            # 讀取時每則只留下 (message_id, 去重鍵)，不保留整個訊息物件與內容字串
+            # 由舊到新處理，第一次出現的內容為保留者：
+            # - 增量：history(after=檢查點, oldest_first=True)
+            # - 完整：取最近 limit 則後反轉
+            with perf_span("history"):
+                if checkpoint is not None:
+                    history = channel.history(limit=limit, after=discord.Object(id=checkpoint), oldest_first=True)
+                    rows = [(m.id, message_dedupe_key(m)) async for m in history]
+                else:
+                    rows = [(m.id, message_dedupe_key(m)) async for m in channel.history(limit=limit)]
+                    rows.reverse()
 
-                # 若沒有文字內容（例如只有附件或嵌入），不納入去重，直接略過
-                if not content:
-                    if verbose and per_msg_logged < verbose_cap_per_channel:
-                        per_msg_logged += 1
-                    continue
+            for message_id, key in rows:
+                # 每則訊息先增加掃描數並推進檢查點
+                scanned += 1
+                last_message_id = max(last_message_id or 0, message_id)
 
-                # 只處理「一般訊息」；系統訊息、pin、thread 事件等型別一律略過
-                if msg.type != discord.MessageType.default:
-                    if verbose and per_msg_logged < verbose_cap_per_channel:
-                        per_msg_logged += 1
+                # 非一般訊息或沒有文字內容（例如只有附件或嵌入），不納入去重
+                if key is None:
                     continue
 
-                # 使用完整文字內容作為去重鍵（完全一致才算重複）
-                key = content
+                # 保留者來自索引（非本次掃描讀到）時先確認仍存在；已刪除時本則改為保留者，無法確認時本次不刪
+                keeper = seen.get(key)
+                if keeper is not None and keeper != message_id and key not in new_keys:
+                    if keeper not in keeper_ok:
+                        keeper_ok[keeper] = await dedupe_keeper_exists(channel, keeper)
+                    if keeper_ok[keeper] is None:
+                        continue
+                    if keeper_ok[keeper] is False:
+                        keeper = None
 
-                # 若此內容已經出現過，代表這則是重複者，嘗試刪除
-                if key in seen:
-                    try:
-                        # 刪除訊息（需要頻道刪除權限）
-                        await msg.delete()
-                        # 刪除成功，增加刪除統計
-                        deleted += 1
-                        # 詳細 LOG：刪除成功
-                        if verbose and per_msg_logged < verbose_cap_per_channel:
-                            write_dedupe_log(
-                                "dedupe_msg_deleted",
-                                source,
-                                detail=f"channel={ch_id} msg_id={msg.id}"
-                            )
-                            per_msg_logged += 1
-                    except discord.Forbidden:
-                        # 權限不足：無法刪除訊息
-                        if verbose and per_msg_logged < verbose_cap_per_channel:
-                            write_dedupe_log(
-                                "dedupe_msg_delete_forbidden",
-                                source,
-                                detail=f"channel={ch_id} msg_id={msg.id}"
-                            )
-                            per_msg_logged += 1
-                    except discord.HTTPException as he:
-                        # HTTP 相關失敗（例如速率限制、API 錯誤）
-                        if verbose and per_msg_logged < verbose_cap_per_channel:
-                            write_dedupe_log(
-                                "dedupe_msg_delete_http_error",
-                                source,
-                                detail=f"channel={ch_id} msg_id={msg.id} err=" + " ".join(str(he).splitlines())
-                            )
-                            per_msg_logged += 1
+                # 若此內容已經出現過，代表這則是重複者，先收集起來，掃描完再批次刪除
+                if keeper is not None and keeper != message_id:
+                    duplicates.append(channel.get_partial_message(message_id))
                 else:
-                    # 第一次看到此內容：加入 seen，視為保留的原始訊息
-                    seen.add(key)
-                    if verbose and per_msg_logged < verbose_cap_per_channel:
-                        per_msg_logged += 1
+                    # 第一次看到此內容：記為保留的原始訊息
+                    seen[key] = message_id
+                    new_keys[key] = message_id
+
+            # 批次刪除重複訊息（14 天內每 100 則一次，較舊的逐則刪除）
+            with perf_span("delete"):
+                deleted = await delete_messages_in_batches(
+                    client, channel, duplicates, source, verbose=verbose, id_cap=verbose_cap_per_channel
+                )
 
-            # 每頻道掃描完成：印出控制台摘要
-            print(f"[DEDUPE] channel={ch_id} scanned={scanned} deleted={deleted}")
+            # 寫回索引與檢查點（完整掃描時整個頻道重建）
+            index.save(ch_id, new_keys, last_message_id, limit, replace=(mode == "full"))
+
+            # 每頻道掃描完成：印出控制台摘要並累計指標
+            print(f"[DEDUPE] channel={ch_id} mode={mode} scanned={scanned} deleted={deleted}")
+            DEDUPE_SCANNED.inc(ch_id, amount=scanned)
+            DEDUPE_DELETED.inc(ch_id, mode, amount=deleted)
+            DEDUPE_SWEEP_SECONDS.observe(ch_id, value=time.time() - ch_begin)
 
             # 每頻道結束 LOG：包含掃描數、刪除數與耗時
             write_dedupe_log(
-                "dedupe_channel_end",
-                source,
-                detail=f"channel={ch_id} scanned={scanned} deleted={deleted} elapsed={round(time.time()-ch_begin,2)}s"
+                "dedupe_channel_end", source,
+                channel=str(ch_id), mode=mode, scanned=scanned, deleted=deleted, elapsed_ms=round((time.time() - ch_begin) * 1000),
             )
 
-            # 更新全域統計
-            total_deleted += deleted
-            total_scanned += scanned
+            return scanned, deleted
 
         except Exception as e:
-            # 掃描迴圈中任何未預期例外：記錄並繼續下一個頻道
-            msg = f"scan_failed channel={ch_id} err=" + " ".join(str(e).splitlines())
-            print(f"[DEDUPE] {msg}")
-            write_dedupe_log("dedupe_error", source, detail=msg)
-
-    # 全域結束 LOG：輸出總掃描數、總刪除數與總耗時
+            # 掃描迴圈中任何未預期例外：記錄後只影響此頻道
+            print(f"[DEDUPE] scan_failed channel={ch_id} err={e}")
+            write_dedupe_log("dedupe_error", source, "scan_failed", error=str(e), channel=str(ch_id), scanned=scanned, deleted=deleted)
+            return scanned, deleted
+
+    # 全域統計：合併各頻道的掃描數與刪除數（無效的 ch_id 如 None 或 0 略過）
+    # 只有實際掃描的頻道占用併發名額；加入他人掃描或沿用結果的頻道不占
+    async def bounded(ch_id: int) -> tuple[tuple[int, int], str, float]:
+        async def sweep() -> tuple[int, int]:
+            async with coordinator.sem:
+                return await dedupe_channel(ch_id)
+        return await coordinator.run(ch_id, full, sweep, source)
+
+    targets = [ch_id for ch_id in dict.fromkeys(channel_ids) if ch_id]
+    peak_mem_kb, mem_overlapped = None, None
+    try:
+        results = await asyncio.gather(*(bounded(ch_id) for ch_id in targets))
+    finally:
+        if DEDUPE_TRACE_MEMORY:
+            peak_mem_kb, mem_overlapped = DEDUPE_MEMORY_TRACE.end(measuring)
+
+    # 只把本次實際掃描的頻道算進總數；加入或沿用的頻道另記，避免把別人的刪除算成本次的
+    summary = DedupeSummary()
+    for ch_id, ((scanned, deleted), state, age) in zip(targets, results):
+        if state == "swept":
+            summary.scanned += scanned
+            summary.deleted += deleted
+        else:
+            summary.shared.append((ch_id, state, age, deleted))
+    states = [state for _, state, _ in results]
+
+    # 全域結束 LOG：輸出本次的總掃描數、總刪除數、各頻道來源（掃描/加入/沿用）與總耗時
+    # （shared_deleted 為加入或沿用的頻道在該次掃描的刪除數，不含在 total_deleted 內；
+    #   有量測時附上記憶體峰值；peak_mem_overlapped=true 表示峰值含同時進行的其他掃描）
     write_dedupe_log(
-        "dedupe_done",
-        source,
-        detail=f"total_scanned={total_scanned} total_deleted={total_deleted} elapsed={round(time.time()-started_at,2)}s"
+        "dedupe_done", source,
+        total_scanned=summary.scanned, total_deleted=summary.deleted, shared_deleted=sum(d for *_, d in summary.shared),
+        swept=states.count("swept"), joined=states.count("joined"), fresh=states.count("fresh"),
+        elapsed_ms=round((time.time() - started_at) * 1000),
+        peak_mem_kb=peak_mem_kb, peak_mem_overlapped=mem_overlapped if peak_mem_kb is not None else None,
     )
 
-    # 回傳總刪除數，供呼叫端顯示或後續決策使用
-    return total_deleted
+    # 回傳 DedupeSummary，供呼叫端顯示或後續決策使用
+    return summary
 
 # --- 共用：兩個 Bot 啟動與重試 ---
 async def run_bot_with_retry(client, token: str, name: str, retry_delay: int = 30):
@@ -502,9 +1626,25 @@ def _yt_build_service():
         raise RuntimeError(f"Missing Youtube_API_KEY in .env at {ENV_PATH}")
     return build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
 
+def _yt_execute(request, method: str) -> dict:
+    # 執行 YouTube API 請求並累計指標（次數依結果分 ok / quota_exceeded / error，以及延遲）
+    started = time.monotonic()
+    try:
+        resp = request.execute()
+    except HttpError as e:
+        YT_API_CALLS.inc(method, "quota_exceeded" if "quotaExceeded" in str(e) else "error")
+        raise
+    except Exception:
+        YT_API_CALLS.inc(method, "error")
+        raise
+    finally:
+        YT_API_SECONDS.observe(method, value=time.monotonic() - started)
+    YT_API_CALLS.inc(method, "ok")
+    return resp
+
 def _yt_get_channel_uploads_playlist_id(youtube, channel_id: str) -> str | None:
     # 用 channel_id 取回該頻道的「uploads」播放清單 ID（頻道所有上傳影片）
-    resp = youtube.channels().list(part="contentDetails", id=channel_id).execute()
+    resp = _yt_execute(youtube.channels().list(part="contentDetails", id=channel_id), "channels.list")
     items = resp.get('items') or []
     if items:
         return items[0]['contentDetails']['relatedPlaylists']['uploads']  # 取第一筆的 uploads 欄位
@@ -512,11 +1652,11 @@ def _yt_get_channel_uploads_playlist_id(youtube, channel_id: str) -> str | None:
 
 def _yt_get_latest_videos_from_playlist(youtube, playlist_id: str, max_results: int = 10) -> list[dict]:
     # 以播放清單 ID 抓取最新影片（回傳字典列表：id/title/publishedAt/url）
-    resp = youtube.playlistItems().list(
+    resp = _yt_execute(youtube.playlistItems().list(
         part="snippet,contentDetails",
         playlistId=playlist_id,
         maxResults=max_results
-    ).execute()
+    ), "playlistItems.list")
     videos = []
     for item in resp.get('items', []):
         vid = item['contentDetails']['videoId']
@@ -584,7 +1724,7 @@ def _sort_by_published(items: list[dict]) -> list[dict]:
 async def youtube_monitor_loop():
     # 啟動監控：印出啟動訊息與紀錄 LOG，方便在系統啟動時追蹤
     print("[YT] monitor starting...")
-    yt_log("YT_MONITOR_START", f"channel={YOUTUBE_CHANNEL_ID}")
+    yt_log("YT_MONITOR_START", "start", channel=YOUTUBE_CHANNEL_ID)
 
     # 1) 基本設定檢查：若缺少 YOUTUBE_CHANNEL_ID，直接結束函式
     if not YOUTUBE_CHANNEL_ID:
@@ -609,14 +1749,13 @@ async def youtube_monitor_loop():
     uploads_playlist_id = _yt_get_channel_uploads_playlist_id(youtube, YOUTUBE_CHANNEL_ID)
     if not uploads_playlist_id:
         # 若取不到播放清單，表示頻道或 API 權限有問題，直接返回
-        msg = f"channel={YOUTUBE_CHANNEL_ID}"
-        print(f"[YT] uploads playlist not found for {msg}, return")
-        yt_log("YT_PLAYLIST_NOT_FOUND", msg, level="ERROR")
+        print(f"[YT] uploads playlist not found for channel={YOUTUBE_CHANNEL_ID}, return")
+        yt_log("YT_PLAYLIST_NOT_FOUND", "uploads playlist not found", level="ERROR", channel=YOUTUBE_CHANNEL_ID)
         return
 
     # 成功取得播放清單：印出與記錄 OK
     print(f"[YT] monitoring uploads playlist: {uploads_playlist_id}")
-    yt_log("YT_PLAYLIST_OK", uploads_playlist_id)
+    yt_log("YT_PLAYLIST_OK", "ok", playlist_id=uploads_playlist_id)
 
     # 新增：重建旗標
     need_rebuild = False
@@ -625,7 +1764,7 @@ async def youtube_monitor_loop():
     while True:
         # 每輪開始，印出輪詢起點並紀錄時間戳，方便觀測輪詢節奏
         print("[YT] poll begin")
-        yt_log("YT_POLL_BEGIN", _now_ts_str(), dedupe_key="YT_POLL_BEGIN", dedupe_ttl_sec=5)
+        yt_log("YT_POLL_BEGIN", _now_ts_str(), level="DEBUG", dedupe_key="YT_POLL_BEGIN", dedupe_ttl_sec=5)
 
         # 若上次遇到 quotaExceeded，睡醒後先重建再繼續
         # 說明：
@@ -680,10 +1819,9 @@ async def youtube_monitor_loop():
         try:
             # 4.1) 從播放清單抓取最新的 10 部影片資料（標題、ID、URL 等）
             items = _yt_get_latest_videos_from_playlist(youtube, uploads_playlist_id, max_results=10)
-            count_msg = f"count={len(items)}"
             print(f"[YT] fetched={len(items)}")
             # 紀錄抓取數量，便於觀察 API 回傳是否異常
-            yt_log("YT_FETCHED", count_msg, dedupe_key="YT_FETCHED", dedupe_ttl_sec=10)
+            yt_log("YT_FETCHED", "fetched", dedupe_key="YT_FETCHED", dedupe_ttl_sec=10, count=len(items))
 
             # 4.2) 載入上次檢查時保存的影片資料（本地快取或資料檔）
             last = _yt_load_last_checked()
@@ -695,7 +1833,7 @@ async def youtube_monitor_loop():
             # 4.4) 若沒有新影片：
             if not new_items:
                 # 記錄「沒有新影片」的 LOG，含時間戳，方便觀測空轉情形
-                yt_log("YT_NO_NEW", f"ts={_now_ts_str()}", dedupe_key="YT_NO_NEW", dedupe_ttl_sec=30)
+                yt_log("YT_NO_NEW", "no new videos", dedupe_key="YT_NO_NEW", dedupe_ttl_sec=30)
                 # 仍保存目前抓到的 10 部，保持快取新鮮度（避免舊資料殘留）
                 _yt_save_last_checked(items)
                 # 設定常規睡眠間隔（例如每 N 秒再檢查一次）
@@ -714,11 +1852,11 @@ async def youtube_monitor_loop():
                 # 發送通知到 Discord（或你指定的通知管道）
                 _yt_send_discord_message(title, url)
                 # 記錄每一部新影片的通知成功 LOG，並用影片 ID 做去重 key（避免重覆）
-                yt_log("YT_NOTIFY_OK", f"{vid} {title}", dedupe_key=f"YT_NOTIFY_OK_{vid}", dedupe_ttl_sec=300)
+                yt_log("YT_NOTIFY_OK", title, dedupe_key=f"YT_NOTIFY_OK_{vid}", dedupe_ttl_sec=300, video_id=vid, url=url)
 
             # 4.6) 通知完成後，覆蓋保存本次抓到的 10 部，作為下次輪詢的比較基準
             _yt_save_last_checked(items)
-            yt_log("YT_SAVED", f"count={len(items)}", dedupe_key="YT_SAVED", dedupe_ttl_sec=30)
+            yt_log("YT_SAVED", "saved", dedupe_key="YT_SAVED", dedupe_ttl_sec=30, count=len(items))
 
             # 4.7) 設定常規睡眠間隔，交由 finally 統一執行
             sleep_seconds = YT_CHECK_INTERVAL_SECONDS
@@ -739,7 +1877,9 @@ async def youtube_monitor_loop():
                 wake_str = wake_dt.strftime('%Y-%m-%d %H:%M:%S')
                 print(f"[YT] quotaExceeded -> sleep {sec}s until {wake_str}")
                 # 記錄暫停與預計醒來時間，便於監控
-                yt_log("YT_PAUSE_UNTIL_15_05", f"sleep={sec}s wake={wake_str}")
+                yt_log("YT_PAUSE_UNTIL_15_05", "quota exceeded", sleep_sec=sec, wake=wake_str)
+                YT_QUOTA_SLEEPS.inc()
+                YT_QUOTA_SLEEP_SECONDS.inc(amount=sec)
 
                 # 交由 finally 統一睡眠，但先把睡眠秒數設好
                 sleep_seconds = sec
@@ -782,9 +1922,8 @@ async def youtube_monitor_loop():
                 sleep_seconds = YT_CHECK_INTERVAL_SECONDS
 
             # 印出與記錄這次睡眠秒數，便於追蹤輪詢節奏與退避行為
-            sleep_msg = f"{sleep_seconds}s"
-            print(f"[YT] sleep {sleep_msg}")
-            yt_log("YT_SLEEP", sleep_msg, dedupe_key="YT_SLEEP", dedupe_ttl_sec=10)
+            print(f"[YT] sleep {sleep_seconds}s")
+            yt_log("YT_SLEEP", "sleep", dedupe_key="YT_SLEEP", dedupe_ttl_sec=10, sleep_sec=sleep_seconds)
 
             # 真正進入睡眠（非阻塞），讓事件迴圈在這段時間內可處理其他協程
             await asyncio.sleep(sleep_seconds)
@@ -798,16 +1937,21 @@ class AsaBot(discord.Client):
         # 初始化：記錄啟動時間，以便回覆 !ping
         super().__init__(*args, **kwargs)
         self.started_at = time.time()
+        self.send_queue = DiscordSendQueue("AsaBot")  # 出站佇列（限速 + 優先權）
+        self.heartbeat_task: asyncio.Task | None = None
+        self.startup_dedupe_task: asyncio.Task | None = None
 
     async def on_ready(self):
         # Bot 登入成功後：
         # - 印出登入身分
         # - 啟動 heartbeat 背景任務（固定間隔輸出心跳）
         # - 若設定 AUTO_DEDUPE_ON_START，啟動一次去重掃描
+        # on_ready 在每次重新連線後都會再觸發：背景任務只在尚未啟動（或已結束）時建立，啟動去重只做一次
         print(f"[READY] AsaBot logged in as {self.user}")
-        asyncio.create_task(self.heartbeat())
-        if AUTO_DEDUPE_ON_START:
-            asyncio.create_task(self.run_dedupe_once())
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            self.heartbeat_task = asyncio.create_task(self.heartbeat())
+        if AUTO_DEDUPE_ON_START and self.startup_dedupe_task is None:
+            self.startup_dedupe_task = asyncio.create_task(self.run_dedupe_once())
 
     async def heartbeat(self):
         # 心跳背景任務：每 HEARTBEAT_INTERVAL_SEC 秒輸出一次時間戳（健康檢查用途）
@@ -816,43 +1960,55 @@ class AsaBot(discord.Client):
             await asyncio.sleep(HEARTBEAT_INTERVAL_SEC)
 
     async def run_dedupe_once(self):
-        # 啟動時自動掃描去重的頻道集合（可依需求調整）
-        channel_ids = [
-            CHANNEL_SHARING_GIRL, CHANNEL_SHARING_BOY, CHANNEL_INJURIED,
-            CHANNEL_GAME_BOX, CHANNEL_CONTRACT, CHANNEL_INTELLIGENCE_NEWS,
-            CHANNEL_BRAVES, CHANNEL_PILOTS, CHANNEL_TSG, CHANNEL_YKE_ARK
-        ]
-        total = await delete_duplicate_messages(self, channel_ids, DUPLICATE_SCAN_LIMIT, source="auto.Asabot")
-        print(f"[DEDUPE] finished on start. total_deleted={total}")
+        # 啟動時自動掃描去重的頻道集合（AUTO_DEDUPE_CHANNELS）
+        summary = await delete_duplicate_messages(self, AUTO_DEDUPE_CHANNELS, DUPLICATE_SCAN_LIMIT, source="auto.Asabot")
+        print(f"[DEDUPE] finished on start. total_deleted={summary.deleted} shared={len(summary.shared)}")
+
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        # 去重索引中的保留者被刪除時移除其索引
+        forget_dedupe_message(payload.channel_id, payload.message_id)
+
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        for message_id in payload.message_ids:
+            forget_dedupe_message(payload.channel_id, message_id)
 
     async def on_message(self, message: discord.Message):
         # 事件：收到新訊息
         try:
             if message.author.id == self.user.id:
-                return  # 忽略自己發出的訊息，避免自觸發
+                return  # 忽略自己發出的訊息，避免自觸發（自己的回覆也不做即時去重）
 
             content = (message.content or "").strip().lower()
 
+            # 即時去重（只針對其他使用者的非指令訊息；重複的 !ping / !dedupe 仍要執行）：重複者已刪除，不再處理
+            if not content.startswith("!") and await suppress_duplicate_message(self, message, "realtime.Asabot"):
+                return
+
             # 連線檢查指令：!ping -> 回覆延遲、啟動時間、心跳間隔
             if content == "!ping":
                 latency_ms = round(self.latency * 1000) if self.latency is not None else -1
                 started = _ts(self.started_at)  # 將 epoch 轉可讀字串（假設 _ts 已定義）
-                await message.channel.send(f"Pong! 延遲: {latency_ms} ms | 啟動時間: {started} | 心跳: {HEARTBEAT_INTERVAL_SEC}s")
+                await self.send_queue.run(message.channel.id, lambda: message.channel.send(
+                    f"Pong! 延遲: {latency_ms} ms | 啟動時間: {started} | 心跳: {HEARTBEAT_INTERVAL_SEC}s | 發送佇列: {self.send_queue.describe()}"
+                ), SEND_PRIORITY_NORMAL, "ping")
                 return
 
-            # 手動去重：!dedupe（需 Manage Messages 或管理員）
-            if content == "!dedupe":
+            # 手動去重：!dedupe（增量）/ !dedupe full（完整重新掃描）（需 Manage Messages 或管理員）
+            if content in ("!dedupe", "!dedupe full"):
                 perms = message.channel.permissions_for(message.author)
                 if not (perms.manage_messages or perms.administrator):
-                    await message.reply("需要 Manage Messages 權限才能執行去重。")
+                    await self.send_queue.run(message.channel.id, lambda: message.reply("需要 Manage Messages 權限才能執行去重。"))
                     return
-                await message.channel.send("開始去重，請稍候...")
+                await self.send_queue.run(message.channel.id, lambda: message.channel.send("開始去重，請稍候..."))
                 channel_ids = [
                     CHANNEL_SHARING_GIRL, CHANNEL_SHARING_BOY, CHANNEL_INJURIED,
                     CHANNEL_GAME_BOX, CHANNEL_CONTRACT, CHANNEL_INTELLIGENCE_NEWS
                 ]
-                total = await delete_duplicate_messages(self, channel_ids, DUPLICATE_SCAN_LIMIT, source="manual.Asabot")
-                await message.channel.send(f"去重完成，刪除重複訊息共 {total} 則。")
+                summary = await delete_duplicate_messages(
+                    self, channel_ids, DUPLICATE_SCAN_LIMIT, source="manual.Asabot", full=(content == "!dedupe full")
+                )
+                # 加入或沿用其他掃描的頻道分開列出，不算成本次刪除
+                await self.send_queue.run(message.channel.id, lambda: message.channel.send(summary.describe()))
                 return
 
             # IG/X 連結清理（不限制頻道）：偵測原始連結並回覆對應的「乾淨」頁面
@@ -879,7 +2035,9 @@ class AsaBot(discord.Client):
                 if replies:
                     # 使用 dict.fromkeys 去重並保留原順序，再一次性回覆
                     unique_replies = list(dict.fromkeys(replies))
-                    await message.channel.send("\n".join(unique_replies))
+                    await self.send_queue.run(
+                        message.channel.id, lambda: message.channel.send("\n".join(unique_replies)), SEND_PRIORITY_NORMAL, "rewrite"
+                    )
 
             # 媒體限定監控（僅針對特定禁聊頻道）：無媒體則刪文並提示
             if message.channel.id in TARGET_MEDIA_CHANNELS:
@@ -897,15 +2055,15 @@ class AsaBot(discord.Client):
                 if not (has_attachment_media or has_media_url):
                     # 嘗試刪除訊息；若無權限，給出臨時警告訊息
                     try:
-                        await message.delete()
+                        await self.send_queue.run(message.channel.id, message.delete, SEND_PRIORITY_MODERATION, "media_delete")
                     except discord.Forbidden:
                         # 缺刪除權限：發一則 5 秒後自刪的告知訊息
-                        warn = await message.channel.send(
+                        warn = await self.send_queue.run(message.channel.id, lambda: message.channel.send(
                             "此頻道僅允許圖片 / 影片或含內嵌媒體的連結。請重新張貼，謝謝。（缺少刪除訊息權限）"
-                        )
+                        ), SEND_PRIORITY_MODERATION, "media_warn")
                         await asyncio.sleep(5)
                         with contextlib.suppress(Exception):
-                            await warn.delete()
+                            await self.send_queue.run(message.channel.id, warn.delete, SEND_PRIORITY_MODERATION, "media_warn")
                         return
                     except discord.HTTPException as e:
                         print(f"[ERROR] delete failed: {e}")
@@ -913,12 +2071,12 @@ class AsaBot(discord.Client):
 
                     # 刪除成功：再發一則點名的提示，5 秒後自刪
                     try:
-                        tip = await message.channel.send(
+                        tip = await self.send_queue.run(message.channel.id, lambda: message.channel.send(
                             f"{message.author.mention} 此頻道僅允許圖片 / 影片或含內嵌媒體的連結，請重新張貼，謝謝。"
-                        )
+                        ), SEND_PRIORITY_MODERATION, "media_tip")
                         await asyncio.sleep(5)
                         with contextlib.suppress(Exception):
-                            await tip.delete()
+                            await self.send_queue.run(message.channel.id, tip.delete, SEND_PRIORITY_MODERATION, "media_tip")
                     except Exception as e:
                         print(f"[ERROR] tip send/delete failed: {e}")
 
@@ -934,36 +2092,209 @@ class AsaBot(discord.Client):
 # PTT 設定（AsaBox 使用）
 BASE_URL = "https://www.ptt.cc"  # PTT 主站域名（用於拼接相對連結）
 INDEX_URL = os.getenv("NBA_PTT_URL", "https://www.ptt.cc/bbs/NBA/")  # 看板索引頁 URL
-FETCH_INTERVAL = int(os.getenv("PTT_FETCH_INTERVAL_SEC", "900"))  # 抓取週期（秒）
+FETCH_INTERVAL = int(os.getenv("PTT_FETCH_INTERVAL_SEC", "900"))  # 抓取週期（秒；關閉自適應輪詢時的固定週期，也是未開即時去重時的自動去重週期）
+PTT_ADAPTIVE_POLL = os.getenv("PTT_ADAPTIVE_POLL", "true").lower() == "true"  # 依發文速率調整各看板輪詢間隔
+PTT_MIN_INTERVAL_SEC = int(os.getenv("PTT_MIN_INTERVAL_SEC", "120"))    # 自適應輪詢間隔下限（秒）
+PTT_MAX_INTERVAL_SEC = int(os.getenv("PTT_MAX_INTERVAL_SEC", "1800"))   # 自適應輪詢間隔上限（秒）
+PTT_POLL_TARGET_ARTICLES = float(os.getenv("PTT_POLL_TARGET_ARTICLES", "3"))  # 希望每次輪詢平均看到幾篇新文
+PTT_RATE_HALF_LIFE_SEC = int(os.getenv("PTT_RATE_HALF_LIFE_SEC", "1800"))      # 發文速率 EWMA 的半衰期（秒）
+PTT_POLL_JITTER = float(os.getenv("PTT_POLL_JITTER", "0.1"))  # 輪詢間隔隨機抖動比例（±）
 MAX_PAGES = int(os.getenv("PTT_MAX_PAGES", "12"))  # 最大索引頁數回溯
 ONLY_TODAY = os.getenv("PTT_ONLY_TODAY", "true").lower() == "true"  # 僅抓取今日文章
 STOP_AT_FIRST_OLDER = os.getenv("PTT_STOP_AT_FIRST_OLDER", "true").lower() == "true"  # 遇到非今日即停
 TARGET_PREFIXES = [p.strip() for p in os.getenv("PTT_TARGET_PREFIXES", "BOX,情報").split(",") if p.strip()]  # 目標標題前綴
+PTT_CURSOR_FILE = BASE_DIR / (os.getenv("PTT_CURSOR_FILE", "ptt_cursor.json"))  # 各看板抓取游標（最新文章 ID）記錄檔
+PTT_PAGE_CACHE_FILE = BASE_DIR / (os.getenv("PTT_PAGE_CACHE_FILE", "ptt_page_cache.json"))  # 索引頁條件式請求快取檔
+PTT_PAGE_CACHE_SIZE = int(os.getenv("PTT_PAGE_CACHE_SIZE", "64"))  # 快取最多保留幾個索引頁（LRU 淘汰）
+PTT_SENT_DB = BASE_DIR / (os.getenv("PTT_SENT_DB", "asabox.sqlite3"))  # 已推送文章紀錄（SQLite）
+PTT_SENT_RETENTION_DAYS = int(os.getenv("PTT_SENT_RETENTION_DAYS", "14"))  # 已推送紀錄保留天數
+PTT_SEED_HISTORY_LIMIT = int(os.getenv("PTT_SEED_HISTORY_LIMIT", "100"))  # 新頻道首次使用時，從頻道歷史匯入幾則訊息
+PTT_CHANNEL_INDEX_SIZE = int(os.getenv("PTT_CHANNEL_INDEX_SIZE", "500"))  # 每個推送頻道在記憶體中保留最近幾則訊息的 PTT URL
+PTT_SENT_BLOOM_BITS = int(os.getenv("PTT_SENT_BLOOM_BITS", str(1 << 20)))  # 已推送紀錄前置 Bloom filter 位元數（0 = 停用）
+PTT_CRAWL_MODE = os.getenv("PTT_CRAWL_MODE", "prefetch").strip().lower()  # 翻頁模式：prefetch（依頁碼平行預抓）/ serial（逐頁）
+PTT_PREFETCH_PAGES = int(os.getenv("PTT_PREFETCH_PAGES", "11"))  # 平行預抓一次最多幾頁
+PTT_PACK_MESSAGES = os.getenv("PTT_PACK_MESSAGES", "true").lower() == "true"  # 同頻道多篇文章合併成較少的訊息送出
+PTT_MESSAGE_MAX_CHARS = int(os.getenv("PTT_MESSAGE_MAX_CHARS", "1900"))  # 每則訊息字數上限（Discord 上限 2000，預留餘裕）
+PTT_HOST_CONCURRENCY = int(os.getenv("PTT_HOST_CONCURRENCY", "4"))  # 同一主機同時進行的請求上限（禮貌限制）
 KEYWORDS_INJURY = [w.strip() for w in os.getenv("KEYWORDS_INJURY", "").split(",") if w.strip()]  # 傷病關鍵字
 CONTRACT_PATTERNS = [p.strip() for p in os.getenv("KEYWORDS_CONTRACT_PATTERNS", "").split(";") if p.strip()]  # 合約模式（分號分隔）
 NEGATIVE_FOR_CONTRACT_TITLE = [w.strip() for w in os.getenv("NEGATIVE_FOR_CONTRACT_TITLE", "").split(",") if w.strip()]  # 合約負面排除字
 
-PTT_BASE = INDEX_URL
 URL_RE = re.compile(r'https?://\S+')
 
 # --- PTT：網頁抓取工具 ---
 # ===== PTT/NBA 工具（AsaBox 用）=====
-def make_session():
-    # 建立 requests Session，帶入：
+PTT_HTTP_TIMEOUT_SEC = float(os.getenv("PTT_HTTP_TIMEOUT_SEC", "10"))  # 單一請求逾時（秒，含連線與讀取）
+PTT_HTTP_POOL_SIZE = int(os.getenv("PTT_HTTP_POOL_SIZE", "8"))         # 連線池上限（keep-alive 重用）
+
+def make_session() -> aiohttp.ClientSession:
+    # 建立 aiohttp ClientSession（須在事件迴圈內呼叫），帶入：
     # - over18=1 cookie（跳過 PTT 年齡確認）
     # - 自訂 UA（避免被視為爬蟲或取得較穩定結果）
-    s = requests.Session()
-    s.cookies.set('over18', '1', domain='.ptt.cc')
-    s.headers.update({"User-Agent": "Mozilla/5.0 (compatible; PTTFetcher/2.1)"})
-    return s
+    # - TCPConnector 連線池：同主機連線 keep-alive 重用，省去每頁重新握手
+    # - ClientTimeout：每個請求的總逾時，逾時拋 asyncio.TimeoutError
+    connector = aiohttp.TCPConnector(
+        limit=PTT_HTTP_POOL_SIZE, limit_per_host=PTT_HOST_CONCURRENCY, keepalive_timeout=60, ttl_dns_cache=300
+    )
+    timeout = aiohttp.ClientTimeout(total=PTT_HTTP_TIMEOUT_SEC, sock_connect=min(5.0, PTT_HTTP_TIMEOUT_SEC))
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers={"User-Agent": "Mozilla/5.0 (compatible; PTTFetcher/2.1)"},
+        cookies={"over18": "1"},
+    )
+
+class PttPageCache:
+    # 索引頁條件式請求快取（以 URL 為鍵）：
+    # - 記錄 ETag / Last-Modified 驗證器與「已解析」的條目、上頁連結
+    # - 下次請求帶 If-None-Match / If-Modified-Since；回 304 時直接沿用解析結果（省下載也省解析）
+    # - 以 OrderedDict 做 LRU，超過 max_size 淘汰最久未用的頁面
+    # - flush() 寫回磁碟，重啟後仍可沿用驗證器
+    def __init__(self, path: Path, max_size: int = PTT_PAGE_CACHE_SIZE):
+        self.path = path
+        self.max_size = max(1, max_size)
+        self._pages: OrderedDict[str, dict] = OrderedDict()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        try:
+            if self.path.exists():
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                for url, rec in (data or {}).items():
+                    if isinstance(rec, dict) and (rec.get("etag") or rec.get("last_modified")):
+                        self._pages[url] = rec
+                self._evict()
+        except Exception as e:
+            write_ptt_log(time.time(), "PTT_PAGE_CACHE_LOAD_FAILED", str(e))
 
-def fetch_page(session, url):
-    # 以既有 session 取頁面，10 秒逾時；狀態碼非 2xx 時 raise_for_status 拋錯
-    resp = session.get(url, timeout=10)
-    resp.raise_for_status()
-    return resp.text  # 回傳 HTML 文字
+    def flush(self):
+        # 只有內容變動時才寫檔
+        if not self._dirty:
+            return
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._pages, f, ensure_ascii=False)
+            self._dirty = False
+        except Exception as e:
+            write_ptt_log(time.time(), "PTT_PAGE_CACHE_SAVE_FAILED", str(e))
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def _evict(self):
+        while len(self._pages) > self.max_size:
+            self._pages.popitem(last=False)
+            self._dirty = True
+
+    def conditional_headers(self, url: str) -> dict:
+        # 依快取的驗證器組出條件式請求標頭；沒有快取時回空 dict（一般 GET）
+        rec = self._pages.get(url)
+        if not rec:
+            return {}
+        headers = {}
+        if rec.get("etag"):
+            headers["If-None-Match"] = rec["etag"]
+        if rec.get("last_modified"):
+            headers["If-Modified-Since"] = rec["last_modified"]
+        return headers
+
+    def get(self, url: str) -> dict | None:
+        rec = self._pages.get(url)
+        if rec is not None:
+            self._pages.move_to_end(url)
+        return rec
+
+    def put(self, url: str, etag: str | None, last_modified: str | None, entries: list[dict], prev_url: str | None):
+        # 伺服器沒給任何驗證器時不快取（無法發條件式請求）
+        if not etag and not last_modified:
+            self._pages.pop(url, None)
+            return
+        # article_key/full_date 可由 url/ptt_mmdd 重新推得，不寫入快取
+        stored = [{k: v for k, v in e.items() if k not in ("article_key", "full_date")} for e in entries]
+        self._pages[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "entries": stored,
+            "prev_url": prev_url,
+            "cached_at": time.time(),
+        }
+        self._pages.move_to_end(url)
+        self._dirty = True
+        self._evict()
+
+def revive_cached_entries(entries: list[dict], today: datetime.date) -> list[dict]:
+    # 快取條目還原：依今天日期重算 full_date、由 URL 重算 article_key（各回傳新 dict，不改動快取本體）
+    revived = []
+    for e in entries:
+        e = dict(e)
+        e["full_date"] = ptt_date_to_full_date(e.get("ptt_mmdd") or "", today)
+        e["article_key"] = parse_article_id(e.get("url"))
+        revived.append(e)
+    return revived
+
+_HOST_SEMAPHORES: dict[str, asyncio.Semaphore] = {}
+
+def host_semaphore(url: str) -> asyncio.Semaphore:
+    # 每個主機一把 Semaphore：平行預抓與多看板同時抓取時，對同一主機的同時請求不超過 PTT_HOST_CONCURRENCY
+    host = (urlparse(url).netloc or "").lower()
+    sem = _HOST_SEMAPHORES.get(host)
+    if sem is None:
+        sem = _HOST_SEMAPHORES[host] = asyncio.Semaphore(max(1, PTT_HOST_CONCURRENCY))
+    return sem
+
+async def fetch_index_page(session: aiohttp.ClientSession, url: str, today: datetime.date,
+                           base_url: str, cache: PttPageCache | None = None):
+    # 取得並解析一個索引頁，回傳 (entries, prev_url)：
+    # - 全程在事件迴圈上等待網路，可隨任務取消而中斷（不佔用執行緒池）
+    # - 有快取時送條件式請求；304 直接回傳快取的解析結果
+    # - 200 時解析 HTML，並把驗證器與解析結果寫回快取；狀態碼非 2xx 時 raise_for_status 拋錯
+    # - 指標：請求延遲從取得 semaphore 後起算（不含排隊），結果分 ok / not_modified / error
+    headers = cache.conditional_headers(url) if cache is not None else {}
+    board = _board_from_url(url)
+    async with host_semaphore(url), global_semaphore():
+        started = time.monotonic()
+        try:
+            with perf_span("fetch"):
+                async with session.get(url, headers=headers) as resp:
+                    rec = cache.get(url) if resp.status == 304 and cache is not None else None
+                    if rec is None:
+                        resp.raise_for_status()
+                        html = await resp.text()
+                        etag = resp.headers.get("ETag")
+                        last_modified = resp.headers.get("Last-Modified")
+            if rec is not None:
+                cache.hits += 1
+                PTT_PAGE_FETCH_SECONDS.observe(board, value=time.monotonic() - started)
+                PTT_PAGE_FETCHES.inc(board, "not_modified")
+                with perf_span("parse"):
+                    entries = revive_cached_entries(rec.get("entries") or [], today)
+                PTT_ENTRIES_PARSED.inc(board, "cached", amount=len(entries))
+                return entries, rec.get("prev_url")
+        except Exception:
+            PTT_PAGE_FETCHES.inc(board, "error")
+            raise
+        PTT_PAGE_FETCH_SECONDS.observe(board, value=time.monotonic() - started)
+        PTT_PAGE_FETCHES.inc(board, "ok")
+    with perf_span("parse"):
+        entries, prev_url = parse_index_page(html, today, base_url)
+    PTT_ENTRIES_PARSED.inc(board, "fetched", amount=len(entries))
+    if cache is not None:
+        cache.misses += 1
+        cache.put(url, etag, last_modified, entries, prev_url)
+    return entries, prev_url
 
 # --- PTT：解析/分類工具 ---
+PTT_BOARD_URL_RE = re.compile(r'/bbs/([^/]+)/')
+
+def _board_from_url(url: str) -> str:
+    # 從索引頁網址取出看板名稱（指標標籤用）；無法解析時回傳 "unknown"
+    m = PTT_BOARD_URL_RE.search(url or "")
+    return m.group(1) if m else "unknown"
+
 def extract_bracket_prefix(title: str):
     # 解析標題前綴（中括號）：
     # [BOX] XXX -> 回傳 ("BOX", "XXX")
@@ -993,18 +2324,193 @@ def ptt_date_to_full_date(mmdd: str, today: datetime.date):
     except ValueError:
         return None
 
-def parse_entries(html: str, today: datetime.date):
-    # 解析索引頁 HTML，擷取每筆文章資訊：
+# PTT 文章 ID：網址尾段 M.<epoch>.A.<hash>.html（epoch 為發文時間，hash 為 3 碼十六進位）
+PTT_ARTICLE_ID_RE = re.compile(r'M\.(\d+)\.A\.([0-9A-Fa-f]{3})')
+
+def parse_article_id(url: str | None) -> tuple[int, int] | None:
+    # 從文章 URL 解析可排序的文章鍵 (epoch, hash)；無法解析時回傳 None
+    # 同看板內 epoch 越大代表越新，epoch 相同時再以 hash 區分
+    m = PTT_ARTICLE_ID_RE.search(url or "")
+    if not m:
+        return None
+    return int(m.group(1)), int(m.group(2), 16)
+
+def format_article_id(key: tuple[int, int]) -> str:
+    # (epoch, hash) -> "M.<epoch>.A.<HHH>"（與 PTT 網址寫法一致，便於人工檢視記錄檔）
+    return f"M.{key[0]}.A.{key[1]:03X}"
+
+class PttCursorStore:
+    # 各看板的增量抓取游標：記錄上一輪已處理到的最新文章 ID
+    # - get(board)：取得已提交的游標（本輪抓到此 ID 即可停止翻頁）
+    # - stage(board, key)：暫存本輪看到的最新 ID（推送尚未完成前不生效）
+    # - commit(board)：本輪推送成功後才提交並寫檔，失敗的輪次下一輪會重新走一次
+    def __init__(self, path: Path):
+        self.path = path
+        self._committed: dict[str, tuple[int, int]] = {}
+        self._staged: dict[str, tuple[int, int]] = {}
+        self._load()
+
+    def _load(self):
+        # 載入記錄檔（JSON：{board: "M.<epoch>.A.<hash>"}）；不存在或格式錯誤時視為無游標
+        try:
+            if self.path.exists():
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                for board, aid in (data or {}).items():
+                    key = parse_article_id(aid)
+                    if key:
+                        self._committed[board] = key
+        except Exception as e:
+            write_ptt_log(time.time(), "PTT_CURSOR_LOAD_FAILED", str(e))
+
+    def _save(self):
+        try:
+            data = {board: format_article_id(key) for board, key in self._committed.items()}
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+        except Exception as e:
+            write_ptt_log(time.time(), "PTT_CURSOR_SAVE_FAILED", str(e))
+
+    def get(self, board: str) -> tuple[int, int] | None:
+        return self._committed.get(board)
+
+    def stage(self, board: str, key: tuple[int, int] | None):
+        # 只會往前推進：比已提交/已暫存的更新才記錄
+        if not key:
+            return
+        best = max(k for k in (key, self._staged.get(board), self._committed.get(board)) if k)
+        self._staged[board] = best
+
+    def commit(self, board: str):
+        key = self._staged.pop(board, None)
+        if key and key != self._committed.get(board):
+            self._committed[board] = key
+            self._save()
+            write_ptt_log(time.time(), "[PTT_CURSOR]", None, board=board, cursor=format_article_id(key))
+
+def split_page_keys(entries: list[dict]) -> list[tuple[int, int]]:
+    # 取出本頁「非置底」文章的文章鍵（置底公告通常很舊，不能拿來判斷翻頁是否到底）
+    return [e["article_key"] for e in entries if e.get("article_key") and not e.get("pinned")]
+
+def should_stop_paging(entries: list[dict], cursor: tuple[int, int] | None, today_str: str) -> str | None:
+    # 判斷處理完本頁後是否停止往上一頁翻，回傳停止原因（None 表示繼續）：
+    # - cursor：本頁已出現「不比游標新」的文章，代表更舊的頁面上一輪都處理過了
+    # - older：只抓今日且 STOP_AT_FIRST_OLDER 時，本頁已出現非今日文章，更舊的頁面不會有今日文章
+    if cursor and any(k <= cursor for k in split_page_keys(entries)):
+        return "cursor"
+    if ONLY_TODAY and STOP_AT_FIRST_OLDER:
+        if any(e.get("full_date") and e.get("full_date") != today_str for e in entries if not e.get("pinned")):
+            return "older"
+    return None
+
+# ===== PTT 索引頁解析引擎（單次掃描取得條目 + 上頁連結）=====
+# 預設使用專用的正則掃描器（只認 PTT 固定的列表結構，比 BeautifulSoup html.parser 快一個數量級）；
+# 掃描器遇到非預期結構時自動退回 BeautifulSoup（有安裝 lxml 時使用 lxml 後端）。
+# PTT_PARSER=bs4 可強制只用 BeautifulSoup。
+PTT_PARSER = os.getenv("PTT_PARSER", "fast").strip().lower()
+try:
+    import lxml  # noqa: F401  # 選用：BeautifulSoup 的較快後端
+    BS4_FEATURES = "lxml"
+except ImportError:
+    BS4_FEATURES = "html.parser"
+
+_PTT_LIST_CONTAINER_RE = re.compile(r'<div class="r-list-container[^"]*">')
+_PTT_ROW_RE = re.compile(r'<div class="(r-ent|r-list-sep)">')
+_PTT_TITLE_RE = re.compile(r'<div class="title">(.*?)</div>', re.S)
+_PTT_LINK_RE = re.compile(r'<a href="([^"]*)"[^>]*>(.*?)</a>', re.S)
+_PTT_DATE_RE = re.compile(r'<div class="date">(.*?)</div>', re.S)
+_PTT_PAGING_RE = re.compile(r'<div class="btn-group btn-group-paging">(.*?)</div>', re.S)
+_PTT_PAGING_LINK_RE = re.compile(r'<a class="btn wide" href="([^"]+)">(.*?)</a>', re.S)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+class PttParseError(Exception):
+    # 專用掃描器無法辨識頁面結構（交由 BeautifulSoup 後援處理）
+    pass
+
+def _html_text(fragment: str) -> str:
+    # 近似 BeautifulSoup get_text(strip=True)：去標籤、還原實體、去前後空白
+    if "<" in fragment:
+        fragment = _TAG_RE.sub("", fragment)
+    if "&" in fragment:
+        fragment = html_lib.unescape(fragment)
+    return fragment.strip()
+
+def _make_entry(title_text: str, href: str | None, date_text: str, base_url: str,
+                today: datetime.date, pinned: bool) -> dict:
+    # 組合單筆條目（兩種解析後端共用同一份欄位定義）：
     # - title: 原始標題
     # - title_no_prefix: 去除中括號前綴後的標題
     # - prefix: 中括號內前綴（BOX／情報 等）
     # - ptt_mmdd: PTT 列表顯示的 MM/DD
     # - full_date: 轉為 "YYYY/MM/DD"（以 today 年份）
     # - url: 文章完整 URL
-    soup = BeautifulSoup(html, "html.parser")
-    rlist = soup.select("div.r-list-container div.r-ent")  # PTT 列表條目
+    # - article_key: 由 URL 解析的 (epoch, hash)，供增量游標比較
+    # - pinned: 是否位於 r-list-sep 之後（置底文）
+    prefix, remaining_title = extract_bracket_prefix(title_text)
+    full_url = urljoin(base_url, href) if href else None
+    return {
+        "title": title_text,
+        "title_no_prefix": remaining_title,
+        "prefix": prefix,
+        "ptt_mmdd": date_text,
+        "full_date": ptt_date_to_full_date(date_text, today),
+        "url": full_url,
+        "article_key": parse_article_id(full_url),
+        "pinned": pinned,
+    }
+
+def _is_prev_link(text: str, href: str) -> bool:
+    # 「上頁」連結：文字含「上頁」且 href 包含 "index" 且 .html 結尾
+    return "上頁" in text and "index" in href and href.endswith(".html")
+
+def parse_index_page_fast(html: str, today: datetime.date, base_url: str):
+    # 專用掃描器：以 r-ent / r-list-sep 起始標記切段，每段只跑兩個小正則（標題、日期）
+    container = _PTT_LIST_CONTAINER_RE.search(html)
+    if not container:
+        raise PttParseError("r-list-container not found")
+    body = html[container.end():]
+    marks = list(_PTT_ROW_RE.finditer(body))
     results = []
+    pinned = False
+    for i, m in enumerate(marks):
+        if m.group(1) == "r-list-sep":
+            pinned = True
+            continue
+        seg_end = marks[i + 1].start() if i + 1 < len(marks) else len(body)
+        seg = body[m.end():seg_end]
+        title_m = _PTT_TITLE_RE.search(seg)
+        date_m = _PTT_DATE_RE.search(seg)
+        if not title_m or not date_m:
+            continue  # 結構不完整：略過
+        a = _PTT_LINK_RE.search(title_m.group(1))
+        if not a:
+            continue  # 例如已刪文或無連結：略過
+        results.append(_make_entry(
+            _html_text(a.group(2)), html_lib.unescape(a.group(1)) or None,
+            _html_text(date_m.group(1)), base_url, today, pinned,
+        ))
+
+    prev_url = None
+    paging = _PTT_PAGING_RE.search(html)
+    if paging:
+        for href, text in _PTT_PAGING_LINK_RE.findall(paging.group(1)):
+            href = html_lib.unescape(href)
+            if _is_prev_link(_html_text(text), href):
+                prev_url = urljoin(base_url, href)
+                break
+    return results, prev_url
+
+def parse_index_page_bs4(html: str, today: datetime.date, base_url: str):
+    # BeautifulSoup 後援：同一份 soup 同時取出條目與上頁連結（只解析一次）
+    soup = BeautifulSoup(html, BS4_FEATURES)
+    # PTT 列表條目與置底分隔線（select 依文件順序回傳，分隔線之後皆為置底文）
+    rlist = soup.select("div.r-list-container div.r-ent, div.r-list-container div.r-list-sep")
+    results = []
+    pinned = False
     for ent in rlist:
+        if "r-list-sep" in (ent.get("class") or []):
+            pinned = True
+            continue
         title_div = ent.select_one("div.title")
         date_div = ent.select_one("div.meta > div.date")
         if not title_div or not date_div:
@@ -1012,36 +2518,30 @@ def parse_entries(html: str, today: datetime.date):
         a = title_div.find("a")
         if not a:
             continue  # 例如已刪文或無連結：略過
-        title_text = a.get_text(strip=True)
-        prefix, remaining_title = extract_bracket_prefix(title_text)  # 解析前綴
-        href = a.get("href")
-        full_url = urljoin(BASE_URL, href) if href else None
-        date_text = date_div.get_text(strip=True)
-        full_date = ptt_date_to_full_date(date_text, today)
-        results.append({
-            "title": title_text,
-            "title_no_prefix": remaining_title,
-            "prefix": prefix,
-            "ptt_mmdd": date_text,
-            "full_date": full_date,
-            "url": full_url
-        })
-    return results
-    
-def find_prev_page_url(html: str):
-    # 從索引頁 HTML 找到「上頁」連結（上一頁 index.html）：
-    # - 目標選擇器：div.btn-group-paging 內 a.btn.wide[href]
-    # - 文字含「上頁」且 href 包含 "index" 且 .html 結尾
-    soup = BeautifulSoup(html, "html.parser")
+        results.append(_make_entry(
+            a.get_text(strip=True), a.get("href"), date_div.get_text(strip=True), base_url, today, pinned,
+        ))
+
+    prev_url = None
     paging = soup.select_one("div.btn-group-paging")
-    if not paging:
-        return None
-    for a in paging.select("a.btn.wide[href]"):
-        text = a.get_text(strip=True)
-        href = a["href"]
-        if "上頁" in text and "index" in href and href.endswith(".html"):
-            return urljoin(BASE_URL, href)
-    return None  # 找不到則回傳 None
+    if paging:
+        for a in paging.select("a.btn.wide[href]"):
+            if _is_prev_link(a.get_text(strip=True), a["href"]):
+                prev_url = urljoin(base_url, a["href"])
+                break
+    return results, prev_url
+
+def parse_index_page(html: str, today: datetime.date, base_url: str = BASE_URL):
+    # 解析索引頁，回傳 (entries, prev_url)；依 PTT_PARSER 選擇後端，掃描器失敗時退回 BeautifulSoup
+    if PTT_PARSER != "bs4":
+        try:
+            entries, prev_url = parse_index_page_fast(html, today, base_url)
+            # 有列表容器卻一筆都沒掃到且也沒有上頁：多半是結構變動，交給 bs4 再確認一次
+            if entries or prev_url:
+                return entries, prev_url
+        except PttParseError as e:
+            write_ptt_log(time.time(), "PTT_PARSE_FALLBACK", str(e))
+    return parse_index_page_bs4(html, today, base_url)
 
 def filter_by_target_prefix(items, target_prefixes):
     # 依目標前綴過濾項目（空集合時回傳原列表）：
@@ -1096,8 +2596,115 @@ def build_content_info(full_date: str, info_type: str, title_no_prefix: str, url
     label = label_map.get(info_type, "情報")
     return f"{full_date}\n[{label}] {title_no_prefix}\n{url}"
 
+def fit_message(p: str, limit: int = PTT_MESSAGE_MAX_CHARS) -> str:
+    # 單篇內容超過上限時截斷並註明
+    if len(p) > limit:
+        note = "\n(內容過長已截斷)"
+        return p[:max(0, limit - len(note))] + note
+    return p
+
+def pack_messages(payloads: list[str], limit: int = PTT_MESSAGE_MAX_CHARS, sep: str = "\n\n",
+                  max_items: int | None = None) -> list[tuple[str, int]]:
+    # 依原順序把多篇內容合併成盡量少的訊息（順序固定時，裝滿再換下一則即為最少則數）
+    # 回傳 [(訊息文字, 這則訊息包含幾篇)]，呼叫端依篇數對回原始條目
+    packed: list[tuple[str, int]] = []
+    buf, count = "", 0
+    for p in payloads:
+        p = fit_message(p, limit)
+        full = max_items is not None and count >= max_items
+        if buf and (full or len(buf) + len(sep) + len(p) > limit):
+            packed.append((buf, count))
+            buf, count = "", 0
+        buf = f"{buf}{sep}{p}" if buf else p
+        count += 1
+    if buf:
+        packed.append((buf, count))
+    return packed
+
+# --- PTT：索引頁翻頁（逐頁 / 依頁碼平行預抓） ---
+_PTT_INDEX_NUM_RE = re.compile(r'index(\d+)\.html$')
+
+def estimate_pages_to_cover(entries: list[dict], target_epoch: float | None) -> int | None:
+    # 以本頁涵蓋的時間跨度估計「還要往前幾頁」才會碰到 target_epoch（游標或今日 00:00）
+    # 無法估計（條目太少、沒有目標）時回傳 None
+    keys = split_page_keys(entries)
+    if target_epoch is None or len(keys) < 2:
+        return None
+    newest, oldest = max(keys)[0], min(keys)[0]
+    if oldest <= target_epoch:
+        return 0
+    span = max(1, newest - oldest)  # 一頁約涵蓋的秒數
+    return -(-int(oldest - target_epoch) // span)  # 無條件進位
+
+def _prefetch_window(prev_url: str, entries: list[dict], cursor: tuple[int, int] | None,
+                     today: datetime.date, pages_done: int) -> list[int]:
+    # 決定下一批要平行預抓的頁碼（由新到舊）；prev_url 不含頁碼時回傳空列表（改走逐頁）
+    m = _PTT_INDEX_NUM_RE.search(prev_url or "")
+    if not m:
+        return []
+    top = int(m.group(1))
+    if cursor:
+        target = cursor[0]
+    elif ONLY_TODAY:
+        target = datetime.datetime.combine(today, datetime.time()).timestamp()
+    else:
+        target = None
+    est = estimate_pages_to_cover(entries, target)
+    window = PTT_PREFETCH_PAGES if est is None else est + 1  # 多抓 1 頁當作估計誤差的緩衝
+    window = max(1, min(window, PTT_PREFETCH_PAGES, MAX_PAGES - pages_done, top))
+    return [top - i for i in range(window)]
+
+async def iter_index_pages(session: aiohttp.ClientSession, start_url: str, base_url: str,
+                           today: datetime.date, *, board: str, log_tag: str,
+                           cursors: PttCursorStore | None = None,
+                           page_cache: PttPageCache | None = None):
+    # 由新到舊逐頁產出 (page_no, entries)，最多 MAX_PAGES 頁：
+    # - 第一頁最新的文章 ID 暫存為新游標（推送成功後由呼叫端 commit）
+    # - 碰到上一輪的游標或非今日文章（should_stop_paging）即停止
+    # - PTT_CRAWL_MODE=prefetch：第一頁得知頁碼後，依估計需要的頁數一次平行抓下一批，
+    #   仍依頁碼由新到舊依序產出；提早停止時取消尚未用到的請求
+    today_str = today.strftime("%Y/%m/%d")
+    cursor = cursors.get(board) if cursors else None
+    pending: list[asyncio.Task] = []  # 已送出的預抓請求（由新到舊）
+    next_url = start_url
+    page_no = 0
+    try:
+        while next_url and page_no < MAX_PAGES:
+            if pending:
+                entries, prev_url = await pending.pop(0)
+            else:
+                entries, prev_url = await fetch_index_page(session, next_url, today, base_url, page_cache)
+            page_no += 1
+            if page_no == 1 and cursors:
+                cursors.stage(board, max(split_page_keys(entries), default=None))
+
+            yield page_no, entries
+
+            # 已碰到上一輪的游標或非今日文章：更舊的頁面不必再抓
+            stop_reason = should_stop_paging(entries, cursor, today_str)
+            if stop_reason:
+                write_ptt_log(time.time(), f"[{log_tag}][STOP]", None, page=page_no, reason=stop_reason)
+                break
+            next_url = prev_url  # 沒有上一頁或結構變動時為 None：停止
+
+            if next_url and not pending and PTT_CRAWL_MODE == "prefetch":
+                nums = _prefetch_window(next_url, entries, cursor, today, page_no)
+                pending = [
+                    asyncio.create_task(fetch_index_page(
+                        session, urljoin(next_url, f"index{n}.html"), today, base_url, page_cache
+                    ))
+                    for n in nums
+                ]
+                if nums:
+                    write_ptt_log(time.time(), f"[{log_tag}][PREFETCH]", None, level="DEBUG", first_page=nums[0], last_page=nums[-1], count=len(nums))
+    finally:
+        # 提早停止或被取消：收掉尚未用到的預抓請求
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
 # ===== TB（basketballTW）工具 =====
-TB_BASE_URL = "https://www.ptt.cc"
 TB_TARGET_PREFIXES = {"情報", "乳摸", "新聞", "專欄"}  # 僅抓這四種前綴
 
 TEAM_KEYWORDS = {
@@ -1107,52 +2714,6 @@ TEAM_KEYWORDS = {
     "YKE_ARK": ["洋基"],
 }
 
-def is_ptt_tb_url(u: str) -> bool:
-    return isinstance(u, str) and u.startswith(TB_BASE_URL)
-
-def parse_entries_tb(html: str, today: datetime.date):
-    soup = BeautifulSoup(html, "html.parser")
-    rlist = soup.select("div.r-list-container div.r-ent")
-    results = []
-    for ent in rlist:
-        title_div = ent.select_one("div.title")
-        date_div = ent.select_one("div.meta > div.date")
-        if not title_div or not date_div:
-            continue
-        a = title_div.find("a")
-        if not a:
-            continue
-        title_text = a.get_text(strip=True)
-        prefix, remaining_title = extract_bracket_prefix(title_text)
-        href = a.get("href")
-        full_url = urljoin(TB_BASE_URL, href) if href else None
-        date_text = date_div.get_text(strip=True)
-        full_date = ptt_date_to_full_date(date_text, today)
-        results.append({
-            "title": title_text,
-            "title_no_prefix": remaining_title,
-            "prefix": prefix,
-            "ptt_mmdd": date_text,
-            "full_date": full_date,
-            "url": full_url
-        })
-    return results
-
-def find_prev_page_url_tb(html: str):
-    soup = BeautifulSoup(html, "html.parser")
-    paging = soup.select_one("div.btn-group-paging")
-    if not paging:
-        return None
-    for a in paging.select("a.btn.wide[href]"):
-        text = a.get_text(strip=True)
-        href = a["href"]
-        if "上頁" in text and "index" in href and href.endswith(".html"):
-            return urljoin(TB_BASE_URL, href)
-    return None
-
-def filter_by_target_prefix_tb(items):
-    return [it for it in items if (it.get("prefix") or "") in TB_TARGET_PREFIXES]
-
 def match_team_key(title: str) -> str | None:
     t = title or ""
     for key, words in TEAM_KEYWORDS.items():
@@ -1161,93 +2722,316 @@ def match_team_key(title: str) -> str | None:
                 return key
     return None
 
-def collect_today_tb(session):
-    today = datetime.date.today()
-    today_str = today.strftime("%Y/%m/%d")
-    current_url = TB_PTT_URL
-    pages = 0
-    items = []
-
-    while current_url and pages < MAX_PAGES:
-        html = fetch_page(session, current_url)
-        entries = parse_entries_tb(html, today=today)
+# --- PTT：看板註冊表（各看板只差設定：網址、前綴、分類器、分流表、訊息格式） ---
+PTT_GLOBAL_CONCURRENCY = int(os.getenv("PTT_GLOBAL_CONCURRENCY", "8"))  # 所有看板合計同時進行的請求上限
 
-        entries_today = [e for e in entries if e.get("full_date") == today_str]
-        entries_today = filter_by_target_prefix_tb(entries_today)
-
-        for i, e in enumerate(entries_today, start=1):
-            write_ptt_log(time.time(), f"[TB][RAW] page={pages+1} idx={i}, date={e.get('full_date')} mmdd={e.get('ptt_mmdd')}, prefix={e.get('prefix')}, title={e.get('title')}, title_no_prefix={e.get('title_no_prefix')}, url={e.get('url')}", None)
-
-        items.extend(entries_today)
-
-        prev_url = find_prev_page_url_tb(html)
-        if not prev_url:
-            break
-        # 若需要「遇到第一則非今日就停」，可在這裡加入 STOP_AT_FIRST_OLDER 判斷
-        current_url = prev_url
-        pages += 1
+def _channel_id(value) -> int:
+    # 頻道 ID 設定值轉 int（未設定或空字串 -> 0，代表不推送）
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+class PttBoard:
+    # 單一看板的定義（抓取引擎與推送流程對所有看板一視同仁）：
+    # - name: 看板名稱（也作為游標鍵）
+    # - index_url: 最新索引頁 URL
+    # - target_prefixes: 只處理這些標題前綴（空集合代表不過濾）
+    # - classify(entry) -> 分類鍵；回傳 None 或不在 routes 內的鍵視為「未分流」
+    # - routes: 分類鍵 -> Discord 頻道 ID
+    # - format_message(entry, key) -> 推送文字
+    # - log_tag: 日誌標籤（例如 PTT / TB）
+    # - log_unrouted: 是否把未分流的今日文章記為 ptt_unrouted 事件（source=<name>）
+    # - priorities: 分類鍵 -> 發送優先權（未列出者為 SEND_PRIORITY_NORMAL）
+    def __init__(self, name: str, index_url: str, target_prefixes, classify, routes: dict[str, int],
+                 format_message, *, log_tag: str, log_unrouted: bool = False, priorities: dict[str, int] | None = None):
+        self.name = name
+        self.index_url = index_url
+        self.target_prefixes = set(target_prefixes or ())
+        self.classify = classify
+        self.routes = routes
+        self.format_message = format_message
+        self.log_tag = log_tag
+        self.log_unrouted = log_unrouted
+        self.priorities = priorities or {}
+
+        # 由 index_url 推得站台根（組合相對連結）與看板路徑（判斷文章 URL 是否屬於本看板）
+        parsed = urlparse(index_url)
+        self.base_url = f"{parsed.scheme}://{parsed.netloc}"
+        path = parsed.path if parsed.path.endswith("/") else parsed.path.rsplit("/", 1)[0] + "/"
+        self.url_prefix = self.base_url + path
+
+    def owns_url(self, u: str | None) -> bool:
+        return isinstance(u, str) and u.startswith(self.url_prefix)
+
+def classify_nba(e: dict) -> str | None:
+    # NBA：BOX 直接分桶；情報依關鍵字再分為合約/傷病/其他
+    if e.get("prefix") == "BOX":
+        return "BOX"
+    if e.get("prefix") == "情報":
+        return classify_info(e.get("title", ""))
+    return None
 
-    return items
+def format_nba(e: dict, key: str) -> str:
+    # BOX 類（例如比賽資訊）使用 build_content_box；其他 INFO 類使用 build_content_info（含分類 key）
+    if key == "BOX":
+        return build_content_box(e.get("full_date", ""), e.get("title_no_prefix", ""), e.get("url", ""))
+    return build_content_info(e.get("full_date", ""), key, e.get("title_no_prefix", ""), e.get("url", ""))
+
+def classify_tb(e: dict) -> str | None:
+    # TB：依標題中的隊名關鍵字分流；無隊名關鍵字者為未分流
+    return match_team_key(e.get("title_no_prefix") or e.get("title") or "")
+
+def format_tb(e: dict, key: str) -> str:
+    d = e.get("full_date", "")
+    t = e.get("title_no_prefix") or e.get("title") or ""
+    u = e.get("url", "")
+    return f"{d}\n[{e.get('prefix', '')}] {t}\n{u}"
+
+# 看板註冊表：新增看板只需在此加一筆設定
+PTT_BOARDS: list[PttBoard] = [
+    PttBoard(
+        "NBA", INDEX_URL, TARGET_PREFIXES, classify_nba,
+        {
+            "BOX": _channel_id(CHANNEL_GAME_BOX),
+            "INFO_CONTRACT": _channel_id(CHANNEL_CONTRACT),
+            "INFO_INJURIED": _channel_id(CHANNEL_INJURIED),
+            "INFO_OTHER": _channel_id(CHANNEL_INTELLIGENCE_NEWS),
+        },
+        format_nba, log_tag="PTT",
+        priorities={"INFO_CONTRACT": SEND_PRIORITY_URGENT, "INFO_INJURIED": SEND_PRIORITY_URGENT},
+    ),
+    PttBoard(
+        "basketballTW", TB_PTT_URL, TB_TARGET_PREFIXES, classify_tb,
+        {
+            "BRAVES": CHANNEL_BRAVES,
+            "PILOTS": CHANNEL_PILOTS,
+            "TSG": CHANNEL_TSG,
+            "YKE_ARK": CHANNEL_YKE_ARK,
+        },
+        format_tb, log_tag="TB", log_unrouted=True,
+    ),
+]
+
+_GLOBAL_SEMAPHORE: asyncio.Semaphore | None = None
+
+def global_semaphore() -> asyncio.Semaphore:
+    # 全域請求上限（跨看板、跨主機）；延遲建立以綁定執行中的事件迴圈
+    global _GLOBAL_SEMAPHORE
+    if _GLOBAL_SEMAPHORE is None:
+        _GLOBAL_SEMAPHORE = asyncio.Semaphore(max(1, PTT_GLOBAL_CONCURRENCY))
+    return _GLOBAL_SEMAPHORE
+
+# --- PTT：自適應輪詢排程（依各看板發文速率調整間隔） ---
+class BoardRateTracker:
+    # 以文章 ID 內的發文時間估計看板發文速率（篇/秒）：
+    # - 指數衰減計數：每篇新文在其發文時間點貢獻 1/tau，之後以 exp(-Δt/tau) 衰減
+    #   （等同對到達事件做 EWMA，tau = 半衰期 / ln2）
+    # - 只計入比上次看過的最新文章更新的 ID，重複抓到同一頁不會重複計數
+    def __init__(self, half_life_sec: float = PTT_RATE_HALF_LIFE_SEC):
+        self.tau = max(1.0, half_life_sec / math.log(2))
+        self.rate = 0.0                       # 篇/秒（於 rate_at 時刻的值）
+        self.rate_at: float | None = None
+        self.newest: tuple[int, int] | None = None
+
+    def _decay_to(self, t: float):
+        if self.rate_at is None:
+            self.rate_at = t
+            return
+        if t > self.rate_at:
+            self.rate *= math.exp(-(t - self.rate_at) / self.tau)
+            self.rate_at = t
+
+    def observe(self, keys: list[tuple[int, int]], now: float | None = None):
+        now = now or time.time()
+        fresh = sorted(k for k in keys if self.newest is None or k > self.newest)
+        for k in fresh:
+            # 發文時間不會晚於現在；亂序或時鐘誤差時以 rate_at 為下限
+            t = min(float(k[0]), now)
+            if self.rate_at is not None and t < self.rate_at:
+                t = self.rate_at
+            self._decay_to(t)
+            self.rate += 1.0 / self.tau
+        if fresh:
+            self.newest = fresh[-1]
+        self._decay_to(now)
+
+    def current_rate(self, now: float | None = None) -> float:
+        # 衰減到現在的速率（不改動內部狀態）
+        now = now or time.time()
+        if self.rate_at is None:
+            return 0.0
+        return self.rate * math.exp(-max(0.0, now - self.rate_at) / self.tau)
+
+class PttPollScheduler:
+    # 各看板獨立的輪詢時間表（固定頻率 + 抖動）：
+    # - 間隔 = 目標篇數 / 發文速率，夾在 [PTT_MIN_INTERVAL_SEC, PTT_MAX_INTERVAL_SEC]；
+    #   PTT_ADAPTIVE_POLL=false 時固定為 FETCH_INTERVAL
+    # - 下次時間由「本次排定時間」往後推，不受抓取/推送耗時影響，週期不漂移
+    # - 落後超過一個間隔（例如某輪特別慢）時不補跑，直接從現在起算
+    # - AsaBox 的工作排程在每輪抓取結束後（本輪新文已由 observe() 計入速率）呼叫 mark_polled() 取得下次時間
+    def __init__(self, boards: list[PttBoard]):
+        now = time.time()
+        self.trackers = {b.name: BoardRateTracker() for b in boards}
+        self.next_due = {b.name: now for b in boards}          # 啟動時全部立即到期
+        self.intervals = {b.name: float(FETCH_INTERVAL) for b in boards}
+
+    def observe(self, board: str, entries: list[dict]):
+        tracker = self.trackers.get(board)
+        if tracker:
+            tracker.observe(split_page_keys(entries))
+
+    def interval_for(self, board: str, now: float | None = None) -> float:
+        if not PTT_ADAPTIVE_POLL:
+            return float(FETCH_INTERVAL)
+        rate = self.trackers[board].current_rate(now)
+        lo, hi = float(PTT_MIN_INTERVAL_SEC), float(max(PTT_MIN_INTERVAL_SEC, PTT_MAX_INTERVAL_SEC))
+        if rate <= 0:
+            return hi
+        return min(hi, max(lo, PTT_POLL_TARGET_ARTICLES / rate))
+
+    def mark_polled(self, board: str, now: float | None = None) -> float:
+        # 本輪完成後排下一次：以原排定時間 + 間隔（含抖動）為準
+        now = now or time.time()
+        interval = self.interval_for(board, now)
+        self.intervals[board] = interval
+        jitter = 1.0 + random.uniform(-PTT_POLL_JITTER, PTT_POLL_JITTER) if PTT_POLL_JITTER > 0 else 1.0
+        nxt = self.next_due.get(board, now) + interval * jitter
+        self.next_due[board] = nxt if nxt > now else now + min(interval, float(PTT_MIN_INTERVAL_SEC))
+        return self.next_due[board]
+
+    def describe(self) -> str:
+        # !status 用：各看板目前間隔與速率（篇/小時）
+        now = time.time()
+        parts = []
+        for name, tracker in self.trackers.items():
+            parts.append(f"{name}={int(self.intervals.get(name, FETCH_INTERVAL))}s({tracker.current_rate(now) * 3600:.1f}/h)")
+        return " ".join(parts)
 
 # --- PTT：收集今日文章（分類） ---
-def collect_today(session):
-    # 以 PTT 索引頁為起點，回溯最多 MAX_PAGES 頁，收集「今日」且符合目標前綴的文章：
-    # - buckets 以前綴分類（BOX、情報三類）
-    # - STOP_AT_FIRST_OLDER=True 時，遇到第一筆非今日即停止（加速）
+PTT_PIPELINE_BUFFER = int(os.getenv("PTT_PIPELINE_BUFFER", "4"))  # 抓取→分類→推送各階段間最多暫存幾頁（背壓）
+
+async def iter_board_pages(session, board: PttBoard, cursors: PttCursorStore | None = None,
+                           page_cache: PttPageCache | None = None, on_page=None):
+    # 以看板索引頁為起點由新到舊逐頁產出 (page_no, entries)，最多 MAX_PAGES 頁：
+    # - 有游標時，翻到上一輪已處理過的最新文章即停止（安靜的輪次只需抓 1 頁）
+    # - STOP_AT_FIRST_OLDER=True 時，遇到非今日文章的頁面即停止（加速）
+    # - 有 page_cache 時以條件式請求抓頁，未變動（304）的頁面不下載也不解析
+    # - PTT_CRAWL_MODE=prefetch 時，更舊的頁面依頁碼平行預抓，仍依新到舊順序產出
+    # - on_page(board_name, entries)：每頁解析後回呼（供輪詢排程觀察發文速率）
     today = datetime.date.today()
     today_str = today.strftime("%Y/%m/%d")
+    tag = board.log_tag
+    pages = iter_index_pages(
+        session, board.index_url, board.base_url, today,
+        board=board.name, log_tag=tag, cursors=cursors, page_cache=page_cache,
+    )
+    async with contextlib.aclosing(pages):
+        async for page_no, entries in pages:
+            if on_page:
+                on_page(board.name, entries)
+
+            # 日誌（DEBUG）：觀察頁面日期分布（偵測排序異常）；未開 DEBUG 時完全不計算
+            if entries and log_enabled("DEBUG"):
+                seen_mmdd = [e.get("ptt_mmdd") or "" for e in entries]
+                write_ptt_log(
+                    time.time(), f"[{tag}_PAGE_DATE_STATS]", None, level="DEBUG",
+                    page=page_no, today_seen=sum(1 for e in entries if e.get('full_date')==today_str),
+                    total_seen=len(entries), newest=max(seen_mmdd), oldest=min(seen_mmdd),
+                )
 
-    current_url = INDEX_URL  # 起始索引頁
-    pages = 0
-    buckets = {"BOX": [], "INFO_CONTRACT": [], "INFO_INJURIED": [], "INFO_OTHER": []}  # 結果桶
-
-    while current_url and pages < MAX_PAGES:
-        html = fetch_page(session, current_url)  # 取得頁面 HTML（可能拋錯）
-        entries = parse_entries(html, today=today)
-
-        # 日誌：觀察頁面日期分布（偵測排序異常）
-        seen_mmdd = [e.get("ptt_mmdd") or "" for e in entries]
-        if seen_mmdd:
-            try:
-                mmdd_sorted = sorted(seen_mmdd)
-                newest = mmdd_sorted[-1]; oldest = mmdd_sorted[0]
-                write_ptt_log(time.time(), f"[PTT_PAGE_DATE_STATS] page={pages+1} today_seen={sum(1 for e in entries if e.get('full_date')==today_str)} total_seen={len(entries)} newest={newest} oldest={oldest}", None)
-            except Exception as _:
-                write_ptt_log(time.time(), f"[PTT_PAGE_DATE_STATS_ERR] page={pages+1}", None)
-
-        # 僅保留今日條目，再依目標前綴過濾
-        entries_today = [e for e in entries if e.get("full_date") == today_str]
-        entries_today = filter_by_target_prefix(entries_today, TARGET_PREFIXES)
-
-        # [新增] 印出本頁每一筆抓到的原始條目（過濾後）
-        for i, e in enumerate(entries_today, start=1):
-            write_ptt_log(time.time(), f"[PTT][RAW] page={pages+1} idx={i}, date={e.get('full_date')} mmdd={e.get('ptt_mmdd')}, prefix={e.get('prefix')}, title={e.get('title')}, title_no_prefix={e.get('title_no_prefix')}, url={e.get('url')}", None)
-
-        # 分桶：BOX 與 情報（情報需再分類為合約/傷病/其他）
-        for e in entries_today:
-            if e.get("prefix") == "BOX":
-                buckets["BOX"].append(e)
-            elif e.get("prefix") == "情報":
-                k = classify_info(e.get("title", ""))
-                buckets[k].append(e)
-
-        # 繼續往上一頁
-        prev_url = find_prev_page_url(html)
-        if not prev_url:
-            break  # 沒有上一頁或結構變動：停止
-        current_url = prev_url
-        pages += 1
-    write_ptt_log(time.time(), buckets, None)
-
-    return buckets  # 回傳分類後的今日文章集合
-
-# --- PTT：頻道歷史 URL 去重工具（僅限 https://www.ptt.cc/bbs/NBA/ 基底） ---
+            yield page_no, entries
+
+def route_page_entries(board: PttBoard, page_no: int, entries: list[dict], today_str: str):
+    # 單頁分類：只保留今日且符合目標前綴的文章，交由看板分類器分桶，回傳 (buckets, unrouted)：
+    # - buckets：分類鍵 -> 文章列表（鍵與 board.routes 相同）
+    # - unrouted：今日且符合前綴、但分類器無法分流的文章
+    tag = board.log_tag
+    buckets: dict[str, list] = {k: [] for k in board.routes}
+    unrouted: list = []
+
+    # 僅保留今日條目，再依目標前綴過濾
+    entries_today = [e for e in entries if e.get("full_date") == today_str]
+    entries_today = filter_by_target_prefix(entries_today, board.target_prefixes)
+
+    # 印出本頁每一筆抓到的原始條目（過濾後；DEBUG）
+    for i, e in enumerate(entries_today if log_enabled("DEBUG") else (), start=1):
+        write_ptt_log(
+            time.time(), f"[{tag}][RAW]", None, level="DEBUG",
+            page=page_no, idx=i, date=e.get('full_date'), mmdd=e.get('ptt_mmdd'), prefix=e.get('prefix'),
+            title=e.get('title'), title_no_prefix=e.get('title_no_prefix'), url=e.get('url'),
+        )
+
+    # 分桶：交由看板的分類器決定分類鍵
+    for e in entries_today:
+        k = board.classify(e)
+        if k in buckets:
+            buckets[k].append(e)
+        else:
+            unrouted.append(e)
+    for k, v in buckets.items():
+        if v:
+            PTT_ARTICLES_ROUTED.inc(board.name, k, board.routes[k], amount=len(v))
+    if unrouted:
+        PTT_ARTICLES_ROUTED.inc(board.name, "unrouted", "", amount=len(unrouted))
+    return buckets, unrouted
+
+async def stream_board(session, board: PttBoard, dispatch, cursors: PttCursorStore | None = None,
+                       page_cache: PttPageCache | None = None, on_page=None):
+    # 串流管線：抓取 → 分類 → 推送 三個階段同時執行，階段間以有界 asyncio.Queue 傳遞（滿了上游就等，形成背壓）
+    # - 每抓完一頁就分類並交給 dispatch(board, buckets, unrouted)，第一頁的新文不必等整輪翻頁結束
+    # - 任一階段失敗即取消其他階段並往外拋（呼叫端不提交游標，下一輪重新涵蓋）
+    # - 頁面由新到舊處理：跨頁時較舊的文章可能晚於較新的文章送出（同一頁內仍依發文時間）
+    today_str = datetime.date.today().strftime("%Y/%m/%d")
+    pages_q: asyncio.Queue = asyncio.Queue(maxsize=max(1, PTT_PIPELINE_BUFFER))
+    routed_q: asyncio.Queue = asyncio.Queue(maxsize=max(1, PTT_PIPELINE_BUFFER))
+    totals: dict[str, int] = {k: 0 for k in board.routes}
+    unrouted_total = 0
+
+    async def crawl_stage():
+        async for page in iter_board_pages(session, board, cursors, page_cache, on_page):
+            await pages_q.put(page)
+        await pages_q.put(None)
+
+    async def route_stage():
+        nonlocal unrouted_total
+        while (page := await pages_q.get()) is not None:
+            with perf_span("route"):
+                buckets, unrouted = route_page_entries(board, page[0], page[1], today_str)
+            for k, v in buckets.items():
+                totals[k] += len(v)
+            unrouted_total += len(unrouted)
+            if unrouted or any(buckets.values()):
+                await routed_q.put((buckets, unrouted))
+        await routed_q.put(None)
+
+    async def dispatch_stage():
+        while (batch := await routed_q.get()) is not None:
+            await dispatch(board, *batch)
+
+    tasks = [asyncio.create_task(stage()) for stage in (crawl_stage, route_stage, dispatch_stage)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    write_ptt_log(time.time(), f"[{board.log_tag}_BUCKETS]", None, buckets=dict(totals), unrouted=unrouted_total)
+
+def flush_page_cache(page_cache: PttPageCache | None):
+    # 一輪結束後寫回索引頁快取並記錄命中率
+    if page_cache is not None:
+        page_cache.flush()
+        write_ptt_log(time.time(), "[PTT_CACHE]", None, hits=page_cache.hits, misses=page_cache.misses, size=len(page_cache))
+
+# --- PTT：頻道歷史 URL 去重工具（僅限 https://www.ptt.cc 基底） ---
 def normalize_url(u: str) -> str:
     # 去除末尾常見標點/括號
     return u.rstrip(').,;!?>"]\'')
 
-def is_ptt_nba_url(u: str) -> bool:
-    return isinstance(u, str) and u.startswith(PTT_BASE)
+def is_ptt_url(u: str) -> bool:
+    return isinstance(u, str) and u.startswith(BASE_URL)
 
 def extract_urls_from_message(msg) -> set:
     urls = set()
@@ -1257,9 +3041,7 @@ def extract_urls_from_message(msg) -> set:
     if content:
         for m in URL_RE.findall(content):
             u = normalize_url(m)
-            if is_ptt_nba_url(u):
-                urls.add(u)
-            if is_ptt_tb_url(u):
+            if is_ptt_url(u):
                 urls.add(u)
 
     # embeds
@@ -1269,24 +3051,18 @@ def extract_urls_from_message(msg) -> set:
             # 直接 URL 欄位
             if getattr(emb, "url", None):
                 u = normalize_url(emb.url)
-                if is_ptt_nba_url(u):
-                    urls.add(u)
-                if is_ptt_tb_url(u):
+                if is_ptt_url(u):
                     urls.add(u)
             # 圖片/縮圖的 URL
             thumb = getattr(emb, "thumbnail", None)
             if thumb and getattr(thumb, "url", None):
                 u = normalize_url(thumb.url)
-                if is_ptt_nba_url(u):
-                    urls.add(u)
-                if is_ptt_tb_url(u):
+                if is_ptt_url(u):
                     urls.add(u)
             image = getattr(emb, "image", None)
             if image and getattr(image, "url", None):
                 u = normalize_url(image.url)
-                if is_ptt_nba_url(u):
-                    urls.add(u)
-                if is_ptt_tb_url(u):
+                if is_ptt_url(u):
                     urls.add(u)
             # 也可掃 emb.description/fields 文字（視需求再加）
 
@@ -1296,21 +3072,434 @@ def extract_urls_from_message(msg) -> set:
         for att in attachments:
             if getattr(att, "url", None):
                 u = normalize_url(att.url)
-                if is_ptt_nba_url(u):
-                    urls.add(u)
-                if is_ptt_tb_url(u):
+                if is_ptt_url(u):
                     urls.add(u)
 
     return urls
 
-async def collect_seen_ptt_urls_from_channel(channel, limit: int = 20) -> set:
-    seen = set()
-    try:
-        async for msg in channel.history(limit=limit):
-            seen |= extract_urls_from_message(msg)
-    except Exception as e:
-        print(f"[WARN] fetch history failed ch={getattr(channel,'id',None)} err={e}")
-    return seen
+class ChannelUrlIndex:
+    # 各推送頻道「目前頻道裡有哪些 PTT URL」的記憶體索引（取代每輪 channel.history 探測）：
+    # - 每個頻道保留最近 capacity 則訊息（message_id -> URL 集合，OrderedDict 當環形緩衝，超過就丟最舊的）
+    # - 另以 URL -> 出現次數 的計數表做 O(1) 查詢；刪除訊息時扣回
+    # - 啟動時每個頻道讀一次歷史（seed），之後由 on_message / 訊息刪除事件 / 自己的發送維護
+    def __init__(self, capacity: int = PTT_CHANNEL_INDEX_SIZE):
+        self.capacity = max(1, capacity)
+        self._messages: dict[int, OrderedDict[int, frozenset]] = {}
+        self._counts: dict[int, dict[str, int]] = {}
+        self.seeded: set[int] = set()
+
+    def add_message(self, channel_id: int, message_id: int, urls):
+        if not urls:
+            return
+        msgs = self._messages.setdefault(channel_id, OrderedDict())
+        if message_id in msgs:
+            return
+        counts = self._counts.setdefault(channel_id, {})
+        msgs[message_id] = frozenset(urls)
+        for u in msgs[message_id]:
+            counts[u] = counts.get(u, 0) + 1
+        while len(msgs) > self.capacity:
+            old_id = next(iter(msgs))
+            self.remove_message(channel_id, old_id)
+
+    def remove_message(self, channel_id: int, message_id: int):
+        msgs = self._messages.get(channel_id)
+        if not msgs:
+            return
+        urls = msgs.pop(message_id, None)
+        if not urls:
+            return
+        counts = self._counts[channel_id]
+        for u in urls:
+            n = counts.get(u, 0) - 1
+            if n > 0:
+                counts[u] = n
+            else:
+                counts.pop(u, None)
+
+    def contains(self, channel_id: int, url: str) -> bool:
+        counts = self._counts.get(channel_id)
+        return bool(counts) and url in counts
+
+    def urls(self, channel_id: int) -> set:
+        return set(self._counts.get(channel_id, ()))
+
+    async def seed(self, channel, limit: int) -> bool:
+        # 讀頻道歷史建立索引（新到舊讀取，倒序加入以維持「最舊在前」的淘汰順序）；成功回傳 True
+        ch_id = channel.id
+        if ch_id in self.seeded:
+            return True
+        try:
+            history = [msg async for msg in channel.history(limit=limit)]
+        except Exception as e:
+            print(f"[WARN] fetch history failed ch={ch_id} err={e}")
+            return False
+        for msg in reversed(history):
+            self.add_message(ch_id, msg.id, extract_urls_from_message(msg))
+        self.seeded.add(ch_id)
+        return True
+
+# --- PTT：已推送文章紀錄（SQLite） ---
+def article_id_for(url: str) -> str:
+    # 文章在紀錄中的鍵：能解析出 M.<epoch>.A.<hash> 時用文章 ID，否則退回完整 URL
+    key = parse_article_id(url)
+    return format_article_id(key) if key else url
+
+def pack_article_key(key: tuple[int, int]) -> int:
+    # (epoch, hash) 壓成單一整數：epoch 左移 12 位 + 3 碼十六進位 hash；大小順序與發文時間一致
+    return (key[0] << 12) | (key[1] & 0xFFF)
+
+class RecentSentIndex:
+    # 近期已推送文章的記憶體索引（SQLite 前的熱快取）：
+    # - 每個頻道一個 set[int]（pack_article_key），查詢不需複製集合
+    # - heap 依文章鍵（即發文時間）排序，發文時間早於 horizon 的項目逐一淘汰，記憶體不隨運行時間成長
+    # - 只要文章發文時間 >= horizon，本索引即為權威答案（不在索引中 = 未推送）
+    def __init__(self):
+        self._by_channel: dict[int, set[int]] = {}
+        self._heap: list[tuple[int, int]] = []
+        self.horizon = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def add(self, channel_id: int, packed: int):
+        if (packed >> 12) < self.horizon:
+            return
+        keys = self._by_channel.setdefault(channel_id, set())
+        if packed not in keys:
+            keys.add(packed)
+            heapq.heappush(self._heap, (packed, channel_id))
+
+    def contains(self, channel_id: int, packed: int) -> bool:
+        keys = self._by_channel.get(channel_id)
+        return bool(keys) and packed in keys
+
+    def advance(self, horizon: int):
+        # 將 horizon 往前推並淘汰過期項目（horizon 只增不減）
+        if horizon <= self.horizon:
+            return
+        self.horizon = horizon
+        limit = horizon << 12
+        while self._heap and self._heap[0][0] < limit:
+            packed, channel_id = heapq.heappop(self._heap)
+            keys = self._by_channel.get(channel_id)
+            if keys is not None:
+                keys.discard(packed)
+                if not keys:
+                    del self._by_channel[channel_id]
+
+class BloomFilter:
+    # 簡單 Bloom filter（bytearray + 雙重雜湊）：might_contain() 為 False 時保證不在集合內
+    def __init__(self, bits: int, hashes: int = 4):
+        self.bits = max(8, bits)
+        self.hashes = hashes
+        self._buf = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._buf[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, item: str) -> bool:
+        return all(self._buf[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def clear(self):
+        self._buf = bytearray(len(self._buf))
+
+class PttSentStore:
+    # 以 SQLite（WAL 模式）記錄「哪篇文章已推送到哪個頻道」：
+    # - sent_articles：(channel_id, article_id) 為主鍵，判斷是否為新文只需一次索引查詢
+    # - seeded_channels：已從頻道歷史匯入過的頻道（每個頻道只在第一次使用時讀一次歷史）
+    # - prune()：依 sent_at 刪除超過保留天數的紀錄（sent_at 有索引）
+    # - 前置兩層記憶體結構，大部分查詢不碰 SQLite：
+    #   recent：近期（ONLY_TODAY 時為今天，否則為保留天數內）已推送文章的壓縮索引，範圍內即為權威答案
+    #   bloom ：範圍外或無法解析 ID 的 URL，Bloom filter 判定「一定沒推過」時直接略過 SQLite
+    # 只在事件迴圈執行緒內使用；單筆查詢/寫入為毫秒級，不需丟到執行緒池
+    def __init__(self, path: Path, retention_days: int = PTT_SENT_RETENTION_DAYS,
+                 bloom_bits: int = PTT_SENT_BLOOM_BITS):
+        self.path = path
+        self.retention_days = retention_days
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sent_articles ("
+                " channel_id INTEGER NOT NULL,"
+                " article_id TEXT NOT NULL,"
+                " board TEXT,"
+                " url TEXT,"
+                " sent_at REAL NOT NULL,"
+                " PRIMARY KEY (channel_id, article_id)"
+                ") WITHOUT ROWID"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sent_articles_sent_at ON sent_articles(sent_at)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS seeded_channels (channel_id INTEGER PRIMARY KEY, seeded_at REAL NOT NULL)"
+            )
+        self._last_prune = 0.0
+        self.recent = RecentSentIndex()
+        self.bloom = BloomFilter(bloom_bits) if bloom_bits > 0 else None
+        self.recent.advance(self._horizon())
+        self._warm_up()
+
+    def _horizon(self, now: float | None = None) -> int:
+        # 記憶體索引涵蓋的最早發文時間（epoch 秒）
+        now = now or time.time()
+        if ONLY_TODAY:
+            midnight = datetime.datetime.combine(datetime.date.fromtimestamp(now), datetime.time())
+            return int(midnight.timestamp())
+        return int(now - self.retention_days * 86400)
+
+    def _bloom_item(self, channel_id: int, article_id: str) -> str:
+        return f"{channel_id}:{article_id}"
+
+    def _warm_up(self):
+        # 啟動時由資料庫重建記憶體索引與 Bloom filter
+        # （horizon 之後發的文，推送時間必定也在 horizon 之後，因此只需載入 sent_at >= horizon 的列）
+        if self.bloom is not None:
+            self.bloom.clear()
+            for channel_id, article_id in self.conn.execute("SELECT channel_id, article_id FROM sent_articles"):
+                self.bloom.add(self._bloom_item(channel_id, article_id))
+        rows = self.conn.execute(
+            "SELECT channel_id, article_id FROM sent_articles WHERE sent_at >= ?", (self.recent.horizon,)
+        )
+        for channel_id, article_id in rows:
+            key = parse_article_id(article_id)
+            if key:
+                self.recent.add(channel_id, pack_article_key(key))
+
+    def sent_ids(self, channel_id: int, article_ids: list[str]) -> set[str]:
+        # 回傳 article_ids 中已推送到 channel_id 的子集合（分批 IN 查詢，避免超過 SQLite 參數上限）
+        found: set[str] = set()
+        ids = list(dict.fromkeys(article_ids))
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT article_id FROM sent_articles WHERE channel_id=? AND article_id IN ({marks})",
+                [channel_id, *chunk],
+            )
+            found.update(r[0] for r in rows)
+        return found
+
+    def filter_unsent(self, channel_id: int, items: list[dict]) -> list[dict]:
+        # 保留尚未推送到此頻道的條目（順序不變）
+        # 依序查：記憶體索引（範圍內為權威答案）→ Bloom filter（否定為權威答案）→ SQLite
+        self.recent.advance(self._horizon())
+        sent_flags: list[bool | None] = []
+        need_db: list[str] = []
+        for it in items:
+            url = it.get("url") or ""
+            key = parse_article_id(url)
+            if key and key[0] >= self.recent.horizon:
+                sent_flags.append(self.recent.contains(channel_id, pack_article_key(key)))
+                continue
+            aid = format_article_id(key) if key else url
+            if self.bloom is not None and not self.bloom.might_contain(self._bloom_item(channel_id, aid)):
+                sent_flags.append(False)
+                continue
+            sent_flags.append(None)
+            need_db.append(aid)
+        sent = self.sent_ids(channel_id, need_db) if need_db else set()
+        out = []
+        for it, flag in zip(items, sent_flags):
+            if flag is None:
+                flag = article_id_for(it.get("url") or "") in sent
+            if not flag:
+                out.append(it)
+        return out
+
+    def mark_sent(self, channel_id: int, urls, board: str | None = None, sent_at: float | None = None):
+        sent_at = sent_at or time.time()
+        rows = [(channel_id, article_id_for(u), board, u, sent_at) for u in urls if u]
+        if not rows:
+            return
+        for _, aid, _, _, _ in rows:
+            key = parse_article_id(aid)
+            if key:
+                self.recent.add(channel_id, pack_article_key(key))
+            if self.bloom is not None:
+                self.bloom.add(self._bloom_item(channel_id, aid))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO sent_articles (channel_id, article_id, board, url, sent_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def is_seeded(self, channel_id: int) -> bool:
+        row = self.conn.execute("SELECT 1 FROM seeded_channels WHERE channel_id=?", (channel_id,)).fetchone()
+        return row is not None
+
+    def mark_seeded(self, channel_id: int):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO seeded_channels (channel_id, seeded_at) VALUES (?, ?)",
+                (channel_id, time.time()),
+            )
+
+    def prune(self, now: float | None = None, min_gap_sec: int = 3600) -> int:
+        # 刪除超過保留天數的紀錄；每小時最多做一次
+        now = now or time.time()
+        if now - self._last_prune < min_gap_sec:
+            return 0
+        self._last_prune = now
+        cutoff = now - self.retention_days * 86400
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM sent_articles WHERE sent_at < ?", (cutoff,))
+        self.recent.advance(self._horizon(now))
+        if cur.rowcount:
+            # Bloom filter 無法刪除單筆，清除過期紀錄後由資料庫重建
+            if self.bloom is not None:
+                self._warm_up()
+            write_ptt_log(now, "[PTT_SENT_PRUNE]", None, removed=cur.rowcount, retention_days=self.retention_days, recent=len(self.recent))
+        return cur.rowcount
+
+    def close(self):
+        with contextlib.suppress(Exception):
+            self.conn.close()
+
+# --- PTT：AsaBox 週期工作排程（各看板抓取、自動去重、紀錄清理各自獨立） ---
+PTT_JOB_TIMEOUT_SEC = int(os.getenv("PTT_JOB_TIMEOUT_SEC", "600"))        # 單一看板抓取+推送的逾時（秒）
+DEDUPE_JOB_TIMEOUT_SEC = int(os.getenv("DEDUPE_JOB_TIMEOUT_SEC", "1800"))  # 自動去重的逾時（秒）
+DEDUPE_RECONCILE_INTERVAL_SEC = int(os.getenv("DEDUPE_RECONCILE_INTERVAL_SEC", "3600"))  # 即時去重開啟時，補漏掃描的週期（秒）
+
+class PeriodicJob:
+    # 一個週期工作：
+    # - run()：無參數 coroutine 函式
+    # - next_due(job, now) -> 下次執行時間；未指定時為固定頻率（上次排定時間 + interval）
+    # - timeout：單次執行上限，逾時即取消並記為失敗
+    # - reschedule_after_run：執行結束後才排下一次（下次時間需要本次結果時，例如看板依本輪觀察到的發文速率調整間隔）
+    def __init__(self, name: str, run, interval: float, *, timeout: float | None = None,
+                 next_due=None, first_run_at: float | None = None, reschedule_after_run: bool = False):
+        self.name = name
+        self.run = run
+        self.interval = float(interval)
+        self.timeout = timeout
+        self._next_due_fn = next_due
+        self.reschedule_after_run = reschedule_after_run
+        self.due_at = first_run_at if first_run_at is not None else time.time()
+        self.task: asyncio.Task | None = None
+        # 統計
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_started_at: float | None = None
+        self.last_finished_at: float | None = None
+        self.last_duration: float | None = None
+        self.last_error: str | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def reschedule(self, now: float):
+        if self._next_due_fn:
+            self.due_at = self._next_due_fn(self, now)
+            return
+        # 固定頻率：由原排定時間往後推，不受執行耗時影響；落後太多時從現在起算
+        self.due_at += self.interval
+        if self.due_at <= now:
+            self.due_at = now + self.interval
+
+class JobScheduler:
+    # AsaBox 內的小型排程器：
+    # - 到期的工作各自以獨立 task 執行，一個工作失敗/逾時不影響其他工作
+    # - 防重疊：上一次還在跑時，本次到期直接略過（記 skipped）並排下一次
+    # - 下次時間在「開始執行時」就排定，執行多久都不會讓週期漂移；
+    #   reschedule_after_run 的工作改在結束時排定（next_due 仍以原排定時間起算，週期同樣不漂移）
+    def __init__(self, name: str):
+        self.name = name
+        self.jobs: list[PeriodicJob] = []
+        self.wakeup = asyncio.Event()  # 工作結束時喚醒排程迴圈（結束後才排定的下次時間可能早於原本的睡眠時間）
+
+    def add(self, job: PeriodicJob) -> PeriodicJob:
+        self.jobs.append(job)
+        return job
+
+    async def _run_job(self, job: PeriodicJob):
+        job.last_started_at = time.time()
+        try:
+            if job.timeout:
+                await asyncio.wait_for(job.run(), timeout=job.timeout)
+            else:
+                await job.run()
+            job.last_error = None
+        except asyncio.TimeoutError:
+            job.failures += 1
+            job.last_error = f"timeout after {job.timeout}s"
+            print(f"[JOB-{self.name}] {job.name} timeout after {job.timeout}s")
+            write_ptt_log(time.time(), "[JOB] timeout", job.last_error, job=job.name)
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            print(f"[JOB-{self.name}] {job.name} failed: {e}")
+            write_ptt_log(time.time(), "[JOB] failed", str(e), job=job.name)
+        finally:
+            job.runs += 1
+            job.last_finished_at = time.time()
+            job.last_duration = job.last_finished_at - job.last_started_at
+            if job.reschedule_after_run:
+                job.reschedule(job.last_finished_at)
+                self.wakeup.set()
+
+    def tick(self, now: float | None = None):
+        # 啟動所有已到期的工作
+        now = now or time.time()
+        for job in self.jobs:
+            if job.due_at > now:
+                continue
+            if job.running:
+                job.skipped += 1
+                write_ptt_log(now, "[JOB] still running, skip this slot", None, job=job.name)
+            else:
+                job.task = asyncio.create_task(self._run_job(job))
+                if job.reschedule_after_run:
+                    job.due_at = math.inf  # 結束時由 _run_job 排定
+                    continue
+            job.reschedule(now)
+
+    async def run_forever(self):
+        try:
+            while True:
+                self.tick()
+                now = time.time()
+                wake = min((job.due_at for job in self.jobs), default=now + 60)
+                self.wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=min(60.0, max(0.5, wake - now)))
+        finally:
+            # 排程本身被取消：一併取消執行中的工作
+            running = [job.task for job in self.jobs if job.running]
+            for t in running:
+                t.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    def describe(self) -> str:
+        # 例："NBA[ok 3.2s next 118s] dedupe[running] ..."
+        now = time.time()
+        parts = []
+        for job in self.jobs:
+            if job.running:
+                state = "running"
+            elif job.last_error:
+                state = "error"
+            elif job.runs:
+                state = f"ok {job.last_duration:.1f}s"
+            else:
+                state = "pending"
+            extra = f" fail={job.failures}" if job.failures else ""
+            extra += f" skip={job.skipped}" if job.skipped else ""
+            nxt = "after run" if math.isinf(job.due_at) else f"{max(0, int(job.due_at - now))}s"
+            parts.append(f"{job.name}[{state} next {nxt}{extra}]")
+        return " ".join(parts)
 
 # --- PTT：AsaBox（抓取/推送/心跳/去重與日誌） ---
 
@@ -1319,7 +3508,7 @@ async def collect_seen_ptt_urls_from_channel(channel, limit: int = 20) -> set:
 # - 啟動後載入錨點（避免重覆推送）
 # - 週期性心跳（可觀測是否存活）
 # - 週期性抓取 PTT 資料並分發到指定頻道
-# - 支援 "!status" 指令查詢目前抓取狀態
+# - 支援 "!status" 指令查詢目前抓取狀態、"!perf" 指令查詢各階段耗時
 # - 完成後自動去重刪除重覆訊息
 class AsaBox(discord.Client):
     def __init__(self, *args, **kwargs):
@@ -1336,14 +3525,49 @@ class AsaBox(discord.Client):
         # 記錄上次抓取輪次「完成」的時間，None 表示尚未有任何輪次
         self.last_round_completed_at: float | None = None
 
-        # 旗標：目前是否正在抓取（True 抓取中；False 待機中）
-        self.is_fetching: bool = False
+        # 目前正在抓取的看板數（各看板為獨立工作，可能同時進行）
+        self.fetching_count: int = 0
+
+        # 週期工作排程（於 ptt_loop 內建立各工作）
+        self.jobs = JobScheduler("AsaBox")
 
-        self.sent_urls = set()
+        # 出站佇列（限速 + 優先權；單一頻道被限速不影響其他頻道）
+        self.send_queue = DiscordSendQueue("AsaBox")
+
+        # 已推送文章紀錄（SQLite，重啟後沿用；取代記憶體 set 與每輪讀頻道歷史）
+        self.sent_store = PttSentStore(PTT_SENT_DB)
+
+        # 各推送頻道目前已有的 PTT URL（啟動時讀一次歷史，之後由 gateway 事件維護）
+        self.channel_urls = ChannelUrlIndex(PTT_CHANNEL_INDEX_SIZE)
+        self.watched_channels = {ch_id for b in PTT_BOARDS for ch_id in b.routes.values() if ch_id}
+
+        # 各看板增量抓取游標（持久化於 PTT_CURSOR_FILE，重啟後沿用）
+        self.ptt_cursors = PttCursorStore(PTT_CURSOR_FILE)
+
+        # 各看板自適應輪詢排程（依發文速率調整間隔）
+        self.poll_scheduler = PttPollScheduler(PTT_BOARDS)
+        METRICS.on_collect(self.collect_metrics)
+
+        # 索引頁條件式請求快取（ETag / Last-Modified + 解析結果，持久化於 PTT_PAGE_CACHE_FILE）
+        self.ptt_page_cache = PttPageCache(PTT_PAGE_CACHE_FILE)
+
+        # 背景任務（on_ready 會在每次重新連線時觸發，以任務參考避免重複啟動）
+        self.heartbeat_task: asyncio.Task | None = None
+        self.ptt_task: asyncio.Task | None = None
 
         # 啟動日誌：便於在系統層面追蹤 AsaBox 啟動事件
         write_ptt_log(self.started_at, "[PTT-AsaBox] start", None)
 
+    @property
+    def is_fetching(self) -> bool:
+        # 是否有任何看板正在抓取
+        return self.fetching_count > 0
+
+    def collect_metrics(self):
+        # /metrics 輸出前更新各看板目前的輪詢間隔（與 ptt_round_last_seconds 對照即可看出是否來不及）
+        for name, interval in list(self.poll_scheduler.intervals.items()):
+            PTT_POLL_INTERVAL_SECONDS.set(name, value=interval)
+
     async def on_ready(self):
 
         # 控制台輸出目前登入帳號，
@@ -1356,11 +3580,15 @@ class AsaBox(discord.Client):
 
         # 啟動心跳協程，
         # 定期輸出心跳以觀察服務存活
-        asyncio.create_task(self.heartbeat())
+        # （重新連線再次觸發 on_ready 時沿用執行中的任務，不另開一份）
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            self.heartbeat_task = asyncio.create_task(self.heartbeat())
 
         # 啟動 PTT 抓取主迴圈，
         # 週期性抓取並推送到各頻道
-        asyncio.create_task(self.ptt_loop())
+        # （同一時間只有一個排程器與 HTTP session；迴圈異常結束時才於下次 on_ready 重新啟動）
+        if self.ptt_task is None or self.ptt_task.done():
+            self.ptt_task = asyncio.create_task(self.ptt_loop())
 
     async def heartbeat(self):
 
@@ -1372,7 +3600,10 @@ class AsaBox(discord.Client):
 
             # 寫入心跳到日誌，
             # 便於後端檢索與排錯
-            write_ptt_log(self.started_at, f"[HEARTBEAT-AsaBox] {time.strftime('%Y-%m-%d %H:%M:%S')}", None)
+            write_ptt_log(
+                self.started_at, "[HEARTBEAT-AsaBox]", None,
+                send_queue=self.send_queue.stats(), log_writer=LOG_WRITER.stats(), log_suppressor=LOG_SUPPRESSOR.stats(),
+            )
 
             # 非阻塞睡眠，
             # 保持事件迴圈流暢
@@ -1380,6 +3611,10 @@ class AsaBox(discord.Client):
 
     async def on_message(self, message: discord.Message):
 
+        # 推送頻道的新訊息（含機器人與自己發的）先更新 PTT URL 索引
+        if message.channel.id in self.watched_channels:
+            self.channel_urls.add_message(message.channel.id, message.id, extract_urls_from_message(message))
+
         # 忽略機器人與自身訊息，
         # 避免自動回覆造成訊息迴圈
         if message.author.bot or (self.user and message.author.id == self.user.id):
@@ -1408,267 +3643,260 @@ class AsaBox(discord.Client):
             state = "抓取中" if self.is_fetching else "待機中"
 
             # 傳送狀態訊息到目前頻道
-            await message.channel.send(
-                f"AsaBox 狀態: {state} | 啟動: {started} | 上次起始: {last_start} | 上次完成: {last_done} | 週期: {FETCH_INTERVAL}s"
-            )
-
-    async def ptt_loop(self):
+            await self.send_queue.run(message.channel.id, lambda: message.channel.send(
+                f"AsaBox 狀態: {state} | 啟動: {started} | 上次起始: {last_start} | 上次完成: {last_done} | 週期: {self.poll_scheduler.describe()}"
+                f" | 工作: {self.jobs.describe()}"
+                f" | 發送佇列: {self.send_queue.describe()}"
+            ), SEND_PRIORITY_NORMAL, "status")
+
+        # 使用者輸入 "!perf" 時，
+        # 回覆最近各輪的階段耗時 p50/p95 與最慢一輪的分段
+        elif content == "!perf":
+            report = PERF.report()
+            await self.send_queue.run(message.channel.id, lambda: message.channel.send(
+                f"```\n{report[:1900]}\n```"
+            ), SEND_PRIORITY_NORMAL, "perf")
+
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        # 訊息被刪除（不論是否在快取中）時，從索引移除其 URL
+        self.channel_urls.remove_message(payload.channel_id, payload.message_id)
+        forget_dedupe_message(payload.channel_id, payload.message_id)
+
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        for message_id in payload.message_ids:
+            self.channel_urls.remove_message(payload.channel_id, message_id)
+            forget_dedupe_message(payload.channel_id, message_id)
+
+    async def seed_channel_urls(self):
+        # 啟動時每個推送頻道讀一次歷史，建立 PTT URL 索引（失敗的頻道於推送前再試）
+        for ch_id in sorted(self.watched_channels):
+            channel = await self.resolve_channel(ch_id, "PTT")
+            if channel:
+                await self.channel_urls.seed(channel, PTT_SEED_HISTORY_LIMIT)
+        write_ptt_log(time.time(), "[PTT_CHANNEL_INDEX]", None, seeded=len(self.channel_urls.seeded), watched=len(self.watched_channels))
+
+    async def resolve_channel(self, ch_id: int, tag: str):
+        # 先從快取取得頻道；快取沒有（或不在同 guild）再以 API 拉取，失敗時記錄並回傳 None
+        channel = self.get_channel(ch_id)
+        if channel:
+            return channel
+        try:
+            return await self.fetch_channel(ch_id)
+        except Exception as e:
+            print(f"[WARN] {tag} Channel not accessible: {ch_id} err={e}")
+            write_ptt_log(self.started_at, f"[{tag}_CHANNEL_UNAVAILABLE]", str(e), level="WARN", channel=str(ch_id))
+            return None
+
+    async def seed_sent_store(self, channel, ch_id: int, board: PttBoard):
+        # 每個頻道只做一次：把頻道索引中的 PTT URL 記為已推送
+        # （升級或換資料庫檔時避免把頻道裡已有的文章再推一次）
+        if self.sent_store.is_seeded(ch_id):
+            return
+        if not await self.channel_urls.seed(channel, PTT_SEED_HISTORY_LIMIT):
+            return
+        urls = self.channel_urls.urls(ch_id)
+        self.sent_store.mark_sent(ch_id, urls, board.name)
+        self.sent_store.mark_seeded(ch_id)
+        write_ptt_log(time.time(), f"[{board.log_tag}_SEED]", None, channel=str(ch_id), urls=len(urls))
+
+    async def dispatch_board(self, board: PttBoard, buckets: dict[str, list], unrouted: list):
+        # 將單一看板的分類結果推送到 routes 指定的頻道（依 SQLite 已推送紀錄去重）
+        tag = board.log_tag
+
+        # 將無法分流的項目記為 ptt_unrouted 事件（依看板設定；背景寫入）
+        if unrouted and board.log_unrouted:
+            for e in unrouted:
+                log_record(
+                    "ptt_unrouted", board.name,
+                    date=e.get("full_date",""), title=e.get("title_no_prefix") or e.get("title") or "", url=e.get("url",""),
+                )
+            print(f"[{tag}] others logged: {len(unrouted)} -> {LOG_FILE}")
+
+        # 各分類（頻道）同時推送：訊息經發送佇列按頻道排隊，單一頻道被限速不會拖住其他頻道
+        routes = [(key, ch_id) for key, ch_id in board.routes.items() if ch_id and buckets.get(key)]
+        results = await asyncio.gather(
+            *(self.dispatch_route(board, key, ch_id, buckets.get(key, [])) for key, ch_id in routes),
+            return_exceptions=True,
+        )
+        # 任一分類失敗時往外拋（呼叫端不提交游標，下一輪重新涵蓋）
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def dispatch_route(self, board: PttBoard, key: str, ch_id: int, todays_items: list):
+        # 推送單一分類到其頻道
+        tag = board.log_tag
+        with perf_span("probe"):
+            channel = await self.resolve_channel(ch_id, tag)
+            if not channel:
+                # 頻道暫時無法取得（權限、API 錯誤）：視為推送失敗，不提交游標，下一輪重試
+                raise RuntimeError(f"{tag} channel unavailable: {ch_id}")
+
+            print(f"[{tag}] category={key} ch_id={ch_id} buckets_count={len(todays_items)}")
+
+            # 頻道索引尚未建立（啟動時讀取失敗）時補讀；資料庫第一次見到此頻道時匯入索引中的 URL
+            await self.channel_urls.seed(channel, PTT_SEED_HISTORY_LIMIT)
+            await self.seed_sent_store(channel, ch_id, board)
+
+            # 過濾：只保留本看板基底的 URL，不在頻道中（含他人貼的），且尚未推送到此頻道（皆為本機查詢）
+            candidates = [
+                it for it in todays_items
+                if it.get("url") and board.owns_url(it.get("url")) and not self.channel_urls.contains(ch_id, it.get("url"))
+            ]
+            to_send = self.sent_store.filter_unsent(ch_id, candidates)
+
+        print(f"[{tag}] to_send count for {key}: {len(to_send)}")
+
+        # 記錄本分類即將發送的清單
+        if to_send:
+            sample = [
+                {"date": e.get("full_date",""), "title": e.get("title_no_prefix") or e.get("title") or "", "url": e.get("url","")}
+                for e in to_send[:20]  # 最多記 20 筆，避免 log 過長
+            ]
+            write_ptt_log(time.time(), f"[{tag}_TO_SEND]", None, category=key, count=len(to_send), channel=str(ch_id), sample=sample)
+        else:
+            write_ptt_log(time.time(), f"[{tag}_TO_SEND]", None, category=key, count=0, channel=str(ch_id))
+            return
 
-        # 建立 HTTP session，
-        # 減少重覆建立連線成本（可含重試策略）
-        session = make_session()
+        # 依發文時間由舊到新，合併成盡量少的訊息（PTT_PACK_MESSAGES=false 時一篇一則）
+        to_send.sort(key=lambda e: parse_article_id(e.get("url")) or (0, 0))
+        payloads = [board.format_message(e, key) for e in to_send]
+        packed = pack_messages(payloads, max_items=None if PTT_PACK_MESSAGES else 1)
 
-        # 指定需要進行去重掃描的頻道清單，
-        # 用於刪除重覆訊息
-        target_channels_for_dedupe = [
-            CHANNEL_SHARING_GIRL, CHANNEL_SHARING_BOY, CHANNEL_INJURIED,
-            CHANNEL_GAME_BOX, CHANNEL_CONTRACT, CHANNEL_INTELLIGENCE_NEWS,
-            CHANNEL_BRAVES, CHANNEL_PILOTS, CHANNEL_TSG, CHANNEL_YKE_ARK
+        # 一次排入發送佇列（同頻道依序送出），再依序等待結果；已送出的先記錄，失敗的留給下一輪
+        priority = board.priorities.get(key, SEND_PRIORITY_NORMAL)
+        futures = [
+            self.send_queue.submit(ch_id, lambda text=text: channel.send(text), priority, f"{board.name}:{key}")
+            for text, _ in packed
         ]
-        # 主抓取迴圈，
-        # 以固定週期執行一輪抓取與推送
-        while True:
-            # 記錄本輪開始時間（UNIX timestamp）
-            round_start = time.time()
-
-            # 更新「上次起始時間」
-            self.last_round_started_at = round_start
-
-            # 標記狀態為「抓取中」
-            self.is_fetching = True
-
-            try:
-                # 以執行緒跑 collect_today(session)，
-                # 避免阻塞事件迴圈（I/O 或 CPU 操作）
-                buckets = await asyncio.to_thread(collect_today, session)
-                # 分類到頻道的映射，
-                # 將不同內容分類對應到不同頻道
-                mapping = {
-                    "BOX": CHANNEL_GAME_BOX,
-                    "INFO_CONTRACT": CHANNEL_CONTRACT,
-                    "INFO_INJURIED": CHANNEL_INJURIED,
-                    "INFO_OTHER": CHANNEL_INTELLIGENCE_NEWS
-                }
-
-                # 逐分類處理推送
-                for key, ch_id in mapping.items():
-
-                    # 若頻道 ID 未設定（None 或 0），
-                    # 直接跳過該分類
-                    if not ch_id:
-                        continue
-
-                    # 嘗試從快取取得頻道
-                    channel = self.get_channel(ch_id)
-
-                    # 若快取沒有（或不在同 guild），
-                    # 以 API 拉取頻道物件
-                    if not channel:
-                        try:
-                            channel = await self.fetch_channel(ch_id)
-                        except Exception as e:
-                            # 頻道不可存取或拉取失敗，
-                            # 輸出警告並記錄日誌，然後跳過
-                            print(f"[WARN] Channel not accessible: {ch_id} err={e}")
-                            write_ptt_log(self.started_at, f"[WARN] Channel not accessible: {ch_id} err={e}", None)
-                            continue
-
-                    print(f"[PTT] category={key} ch_id={ch_id} buckets_count={len(buckets.get(key, []))}")
-
-                    # 從 buckets 取得該分類的今日項目，
-                    # 若不存在則為空清單
-                    todays_items = buckets.get(key, [])
-
-                    # 拉取該頻道近 20 則訊息，抽取 PTT NBA 基底的 URL
-                    seen_urls = await collect_seen_ptt_urls_from_channel(channel, limit=20)
-
-                    # 同輪保險：若你已有 self.sent_urls 作為去重集合，加入避免同輪重覆
-                    if hasattr(self, "sent_urls") and isinstance(self.sent_urls, set):
-                        seen_urls |= {u for u in self.sent_urls if is_ptt_nba_url(u)}
-
-                    # 過濾：只保留 PTT NBA 基底的 URL，且不在 seen_urls 中
-                    to_send = []
-                    for it in todays_items:
-                        u = it.get("url")
-                        if not u:
-                            continue
-                        if not is_ptt_nba_url(u):
-                            # 非目標基底，略過（避免搜尋過多/跨站）
-                            continue
-                        if u in seen_urls:
-                            continue
-                        to_send.append(it)
-
-                    print(f"[PTT] to_send count for {key}: {len(to_send)}")
-
-                    # 新增：記錄本分類即將發送的清單
-                    if to_send:
-                        lines = []
-                        for e in to_send[:20]:  # 最多記 20 筆，避免 log 過長
-                            d = e.get("full_date","")
-                            t = e.get("title_no_prefix") or e.get("title") or ""
-                            u = e.get("url","")
-                            lines.append(f"{d} | {t} | {u}")
-                        write_ptt_log(time.time(), f"[PTT_TO_SEND] cat={key} count={len(to_send)} sample<=20:\t" + " || ".join(lines), None)
-                    else:
-                        write_ptt_log(time.time(), f"[PTT_TO_SEND] cat={key} count=0", None)
+        pos = 0
+        error = None
+        with perf_span("send"):
+            for fut, (_, n) in zip(futures, packed):
+                batch = to_send[pos:pos + n]
+                pos += n
+                try:
+                    sent_msg = await fut
+                except Exception as e:
+                    error = error or e
+                    continue
+                self.sent_store.mark_sent(ch_id, [e.get("url") for e in batch], board.name)
+                PTT_ARTICLES_SENT.inc(board.name, key, ch_id, amount=len(batch))
+                self.channel_urls.add_message(ch_id, sent_msg.id, extract_urls_from_message(sent_msg))
+        write_ptt_log(
+            time.time(), f"[{tag}_SENT]", None,
+            category=key, channel=str(ch_id), articles=len(to_send), messages=len(packed), send_queue=self.send_queue.stats(),
+        )
+        if error:
+            raise error
 
-                    # 若沒有需要推送的新項目，
-                    # 跳過該分類
-                    if not to_send:
-                        continue
+    async def ptt_loop(self):
 
-                    # 準備訊息 payload（文字）列表，
-                    # 依分類使用不同格式建構
-                    payloads = []
-                    for e in to_send:
-                        # BOX 類（例如比賽資訊），使用 build_content_box
-                        if key == "BOX":
-                            payloads.append(
-                                build_content_box(
-                                    e.get("full_date",""),
-                                    e.get("title_no_prefix",""),
-                                    e.get("url",""),
-                                )
-                            )
-                        else:
-                            # 其他 INFO 類，使用 build_content_info（含分類 key）
-                            payloads.append(
-                                build_content_info(
-                                    e.get("full_date",""),
-                                    key,
-                                    e.get("title_no_prefix",""),
-                                    e.get("url",""),
-                                )
-                            )
-
-                    # 發文一個連結發一次：逐條送出，不再合併 buffer
-                    for p in payloads:
-                        # Discord 每則訊息長度限制約 2000 字，單條足夠；保險檢查
-                        if len(p) > 1900:
-                            # 如超長，可適度截斷標題或僅保留 URL
-                            trimmed = p[:1900] + "\n(內容過長已截斷)"
-                            await channel.send(trimmed)
-                        else:
-                            await channel.send(p)
-
-                # 一輪抓取與推送完成，
-                # 控制台提示與日誌記錄
-                print("[PTT-AsaBox] one round done (anchor-aware)")
-                write_ptt_log(round_start, "[PTT-AsaBox] completed", None)
-
-                # 更新「上次完成時間」
-                self.last_round_completed_at = time.time()
-                print(f"target_channels_for_dedupe={target_channels_for_dedupe}")
-                
-                # ========== TB 看板（basketballTW）抓取與推送 ==========
-                tb_items = await asyncio.to_thread(collect_today_tb, session)
-
-                team_channel_map = {
-                    "BRAVES": CHANNEL_BRAVES,
-                    "PILOTS": CHANNEL_PILOTS,
-                    "TSG": CHANNEL_TSG,
-                    "YKE_ARK": CHANNEL_YKE_ARK,
-                }
-
-                team_buckets: dict[str, list] = {k: [] for k in team_channel_map.keys()}
-                others: list = []
-
-                for e in tb_items:
-                    team_key = match_team_key(e.get("title_no_prefix") or e.get("title") or "")
-                    if team_key and team_key in team_buckets:
-                        team_buckets[team_key].append(e)
-                    else:
-                        others.append(e)
+        # 建立 aiohttp session（連線池 + keep-alive），
+        # 迴圈結束或任務被取消時由 async with 關閉連線
+        async with make_session() as session:
+            await self.seed_channel_urls()
+            self.setup_jobs(session)
+            await self.jobs.run_forever()
+
+    def setup_jobs(self, session: aiohttp.ClientSession):
+        # 各看板抓取、自動去重、已推送紀錄清理為彼此獨立的週期工作：
+        # - 看板：間隔依發文速率（PttPollScheduler），啟動時立即執行
+        # - 自動去重：固定每 FETCH_INTERVAL 一次（即時去重開啟時改為每 DEDUPE_RECONCILE_INTERVAL_SEC 補漏一次），
+        #   耗時多久都不影響看板抓取的節奏
+        # - 清理：每小時一次
+        now = time.time()
+        self.jobs = JobScheduler("AsaBox")
+        for board in PTT_BOARDS:
+            self.jobs.add(PeriodicJob(
+                board.name,
+                lambda board=board: self.run_ptt_round(session, [board]),
+                FETCH_INTERVAL,
+                timeout=PTT_JOB_TIMEOUT_SEC,
+                next_due=lambda job, t, board=board: self.poll_scheduler.mark_polled(board.name, t),
+                first_run_at=now,
+                reschedule_after_run=True,
+            ))
+        dedupe_interval = DEDUPE_RECONCILE_INTERVAL_SEC if DEDUPE_REALTIME else FETCH_INTERVAL
+        self.jobs.add(PeriodicJob("dedupe", self.run_auto_dedupe, dedupe_interval,
+                                  timeout=DEDUPE_JOB_TIMEOUT_SEC, first_run_at=now + dedupe_interval))
+        self.jobs.add(PeriodicJob("sent_prune", self.prune_sent_store, 3600, first_run_at=now + 3600))
+
+    async def run_auto_dedupe(self):
+        # 自動去重（即時去重開啟時為補漏掃描），
+        # 掃描指定頻道刪除重覆訊息（依 source tag）
+        with PERF.round("dedupe"):
+            summary = await delete_duplicate_messages(
+                self,
+                AUTO_DEDUPE_CHANNELS,
+                DUPLICATE_SCAN_LIMIT,
+                source="auto.Asabox",
+            )
+        # 控制台輸出去重結果（只算本次實際掃描的頻道）
+        print(f"[PTT-AsaBox] auto dedupe done. total_deleted={summary.deleted} shared={len(summary.shared)}")
 
-                # 將無隊名關鍵字項目寫入每日檔案
-                if others:
-                    day_str = datetime.date.today().strftime("%Y-%m-%d")
-                    out_path = LOG_DIR / f"basketballTW_log_{day_str}.log"
-                    try:
-                        with open(out_path, "a", encoding="utf-8") as f:
-                            for e in others:
-                                d = e.get("full_date","")
-                                t = e.get("title_no_prefix") or e.get("title") or ""
-                                u = e.get("url","")
-                                f.write(f"{d}\t{t}\t{u}\n")
-                        print(f"[TB] others logged: {len(others)} -> {out_path}")
-                    except Exception as e:
-                        print(f"[TB] write others log failed: {e}")
+    async def prune_sent_store(self):
+        # 清掉超過保留天數的已推送紀錄
+        self.sent_store.prune()
 
-                # 逐隊推送（含歷史 URL 去重 + 同輪保險）
-                for team_key, ch_id in team_channel_map.items():
-                    if not ch_id:
-                        continue
+    async def run_ptt_round(self, session: aiohttp.ClientSession, boards: list[PttBoard]):
+        # 一輪抓取與推送（只含本次到期的看板）
 
-                    channel = self.get_channel(ch_id)
-                    if not channel:
-                        try:
-                            channel = await self.fetch_channel(ch_id)
-                        except Exception as e:
-                            print(f"[WARN] TB Channel not accessible: {ch_id} err={e}")
-                            write_ptt_log(self.started_at, f"[WARN] TB Channel not accessible: {ch_id} err={e}", None)
-                            continue
+        # 記錄本輪開始時間（UNIX timestamp）
+        round_start = time.time()
 
-                    seen_urls = await collect_seen_ptt_urls_from_channel(channel, limit=20)
+        # 更新「上次起始時間」
+        self.last_round_started_at = round_start
 
-                    if hasattr(self, "sent_urls") and isinstance(self.sent_urls, set):
-                        # 只保留 TB 基底的同輪 URL
-                        seen_urls |= {u for u in self.sent_urls if is_ptt_tb_url(u)}
+        # 標記狀態為「抓取中」
+        self.fetching_count += 1
 
-                    to_send = []
-                    for e in team_buckets.get(team_key, []):
-                        u = e.get("url")
-                        if not u or not is_ptt_tb_url(u):
-                            continue
-                        if u in seen_urls:
-                            continue
-                        to_send.append(e)
-
-                    print(f"[TB] team={team_key} ch_id={ch_id} to_send={len(to_send)}")
-
-                    for e in to_send:
-                        d = e.get("full_date","")
-                        t = e.get("title_no_prefix") or e.get("title") or ""
-                        u = e.get("url","")
-                        msg = f"{d}\n[{e.get('prefix','')}] {t}\n{u}"
-                        if len(msg) > 1900:
-                            msg = msg[:1900] + "\n(內容過長已截斷)"
-                        await channel.send(msg)
-
-                        if hasattr(self, "sent_urls") and isinstance(self.sent_urls, set) and u:
-                            self.sent_urls.add(u)
-                            
-                # 自動去重，
-                # 掃描指定頻道刪除重覆訊息（依 source tag）
-                total_deleted = await delete_duplicate_messages(
-                    self,
-                    target_channels_for_dedupe,
-                    DUPLICATE_SCAN_LIMIT,
-                    source="auto.Asabox",
-                )
+        async def timed(board: PttBoard):
+            # 每看板各自計時（成功或失敗都記錄本輪耗時；各階段分段記入 PERF 供 !perf 查詢）
+            started = time.monotonic()
+            try:
+                with PERF.round(board.name):
+                    return await stream_board(
+                        session, board, self.dispatch_board, self.ptt_cursors, self.ptt_page_cache,
+                        on_page=self.poll_scheduler.observe,
+                    )
+            finally:
+                elapsed = time.monotonic() - started
+                PTT_ROUND_SECONDS.observe(board.name, value=elapsed)
+                PTT_ROUND_LAST_SECONDS.set(board.name, value=elapsed)
 
-                # 控制台輸出去重結果
-                print(f"[PTT-AsaBox] auto dedupe done. total_deleted={total_deleted}")
+        try:
+            # 到期看板同時執行串流管線（抓一頁、分類一頁、推送一頁；aiohttp 不經執行緒池，可隨任務取消中斷）
+            results = await asyncio.gather(*(timed(board) for board in boards), return_exceptions=True)
+            flush_page_cache(self.ptt_page_cache)
+
+            # 單一看板抓取或推送失敗只影響該看板
+            for board, result in zip(boards, results):
+                if isinstance(result, BaseException):
+                    print(f"[ERROR-AsaBox] board={board.name}: {result}")
+                    write_ptt_log(round_start, f"[{board.log_tag}] pipeline error", str(result), board=board.name)
+                    continue
+                # 該看板推送全部完成後才提交游標（中途失敗時下一輪會重新涵蓋）
+                self.ptt_cursors.commit(board.name)
 
-            except Exception as e:
-                # 抓取迴圈內未預期錯誤，
-                # 在控制台與日誌中記錄
-                print(f"[ERROR-AsaBox] ptt_loop: {e}")
-                write_ptt_log(round_start, "error", str(e))
+            # 一輪抓取與推送完成，
+            # 控制台提示與日誌記錄
+            print(f"[PTT-AsaBox] one round done boards={','.join(b.name for b in boards)}")
+            write_ptt_log(round_start, "[PTT-AsaBox] completed", None)
 
-            finally:
-                # 無論成功或失敗，
-                # 都將狀態設為「非抓取中」
-                self.is_fetching = False
+            # 更新「上次完成時間」
+            self.last_round_completed_at = time.time()
 
-                # 記錄「完成並進入睡眠」的日誌，
-                # 便於追蹤週期
-                write_ptt_log(round_start, "[PTT-AsaBox] completed, sleep", None)
+        except Exception as e:
+            # 抓取迴圈內未預期錯誤，
+            # 在控制台與日誌中記錄
+            print(f"[ERROR-AsaBox] ptt_loop: {e}")
+            write_ptt_log(round_start, "error", str(e))
 
-                # 進入固定抓取週期的睡眠，
-                # 下一輪再由事件迴圈喚醒
-                await asyncio.sleep(FETCH_INTERVAL)
+        finally:
+            # 無論成功或失敗，
+            # 都將本看板標記為「非抓取中」（下次輪詢時間由工作排程依發文速率排定）
+            self.fetching_count -= 1
 
 # =========================
 # 主程式入口（同時跑兩個 Bot + YT 背景）
@@ -1693,10 +3921,23 @@ async def main():
     # - 重要的是它不會把例外泡到最外層導致主程式退出
     yt_task = asyncio.create_task(youtube_monitor_loop())
 
+    # 監控指標端點（METRICS_PORT > 0 時開啟；埠被占用等錯誤只記錄，不影響 Bot 運作；結束時關閉）
+    metrics_runner: web.AppRunner | None = None
+    if METRICS_PORT > 0:
+        try:
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            print(f"[METRICS] failed to listen on {METRICS_HOST}:{METRICS_PORT}: {e}")
+            write_ptt_log(time.time(), "[METRICS] listen failed", str(e), host=METRICS_HOST, port=METRICS_PORT)
+
     # 等待所有主要任務；使用 return_exceptions=True：
     # - 即使其中一個任務拋出例外，也不會使 gather 直接 raise，而是將例外物件作為結果返回
     # - 這樣可以在下方統一記錄錯誤並繼續存活（若任務本來是無限迴圈則通常不會返回）
-    results = await asyncio.gather(bot_task, box_task, yt_task, return_exceptions=True)
+    try:
+        results = await asyncio.gather(bot_task, box_task, yt_task, return_exceptions=True)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
     # 收斂與記錄例外：
     # - 理論上 run_bot_with_retry 這兩個任務應該是常駐不返回，除非遇到不可回復錯誤
@@ -0,0 +1,13 @@
+# 測試共用設定：main_combined 匯入時會檢查 Token 並開啟資料庫，先給佔位 Token 與暫存路徑
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_TMP = Path(tempfile.mkdtemp(prefix="dc_bot_test_"))
+
+os.environ.setdefault("TOKEN_ASA_BOT", "test")
+os.environ.setdefault("TOKEN_ASA_BOX", "test")
+os.environ.setdefault("DEDUPE_DB", str(_TMP / "asabox.sqlite3"))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,166 @@
+import asyncio
+import itertools
+
+import discord
+import pytest
+
+import main_combined as mc
+
+_ids = itertools.count(1000)
+
+
+class FakeResponse:
+    status = 404
+    reason = "Not Found"
+
+
+class FakeMessage:
+    def __init__(self, channel, content: str):
+        self.channel = channel
+        self.id = next(_ids)
+        self.content = content
+        self.type = discord.MessageType.default
+        self.created_at = None
+
+    async def delete(self):
+        self.channel.messages.remove(self)
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.messages: list[FakeMessage] = []
+
+    def post(self, content: str) -> FakeMessage:
+        msg = FakeMessage(self, content)
+        self.messages.append(msg)
+        return msg
+
+    def contents(self) -> list[str]:
+        return [m.content for m in self.messages]
+
+    def history(self, limit=100, after=None, oldest_first=None):
+        msgs = [m for m in self.messages if after is None or m.id > after.id]
+        msgs = msgs[:limit] if after is not None else list(reversed(msgs))[:limit]
+
+        async def gen():
+            for m in msgs:
+                yield m
+        return gen()
+
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return next(m for m in self.messages if m.id == message_id)
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        for m in self.messages:
+            if m.id == message_id:
+                return m
+        raise discord.NotFound(FakeResponse(), "Unknown Message")
+
+
+class FakeClient:
+    def __init__(self, channel: FakeChannel):
+        self.channel = channel
+        self.send_queue = mc.DiscordSendQueue("test", channel_rate=1000, global_rate=1000)
+
+    def get_channel(self, channel_id: int):
+        return self.channel if channel_id == self.channel.id else None
+
+
+@pytest.fixture(autouse=True)
+def fresh_dedupe_state(tmp_path, monkeypatch):
+    # 每個測試各用一個索引檔，並重建視窗與協調器（協調器綁定事件迴圈；關閉新鮮度沿用）
+    monkeypatch.setattr(mc, "_DEDUPE_INDEX", mc.DedupeIndex(tmp_path / "dedupe.sqlite3"))
+    monkeypatch.setattr(mc, "_DEDUPE_WINDOW", None)
+    monkeypatch.setattr(mc, "_DEDUPE_COORDINATOR", mc.DedupeCoordinator(fresh_sec=0))
+    monkeypatch.setattr(mc, "DEDUPE_REALTIME", True)
+    monkeypatch.setattr(mc, "REALTIME_DEDUPE_CHANNELS", {1})
+
+
+def sweep(client) -> int:
+    return asyncio.run(mc.delete_duplicate_messages(client, [1], 100, "test", verbose=False)).deleted
+
+
+def test_incremental_sweep_keeps_copy_of_keeper_deleted_while_offline():
+    channel = FakeChannel(1)
+    client = FakeClient(channel)
+    keeper = channel.post("a")
+    channel.post("b")
+    assert sweep(client) == 0
+
+    # 保留者在 Bot 離線時被刪除（沒有收到刪除事件，索引仍指向它）
+    channel.messages.remove(keeper)
+    channel.post("a")
+    assert sweep(client) == 0
+    assert channel.contents() == ["b", "a"]
+
+    # 新的保留者生效：之後的重複仍會被刪除
+    channel.post("a")
+    assert sweep(client) == 1
+    assert channel.contents() == ["b", "a"]
+
+
+def test_realtime_keeps_copy_of_keeper_deleted_while_offline():
+    channel = FakeChannel(1)
+    client = FakeClient(channel)
+    keeper = channel.post("a")
+    assert sweep(client) == 0
+    channel.messages.remove(keeper)
+
+    async def post(content: str) -> bool:
+        return await mc.suppress_duplicate_message(client, channel.post(content), "test")
+
+    assert asyncio.run(post("a")) is False
+    assert channel.contents() == ["a"]
+    assert asyncio.run(post("a")) is True
+    assert channel.contents() == ["a"]
+
+
+def test_reused_sweep_is_reported_separately(monkeypatch):
+    monkeypatch.setattr(mc, "_DEDUPE_COORDINATOR", mc.DedupeCoordinator(fresh_sec=600))
+    channel = FakeChannel(1)
+    client = FakeClient(channel)
+    for content in ["a", "b", "a"]:
+        channel.post(content)
+
+    async def scenario():
+        first = await mc.delete_duplicate_messages(client, [1], 100, "test", verbose=False)
+        second = await mc.delete_duplicate_messages(client, [1], 100, "test", verbose=False)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert (first.deleted, first.shared) == (1, [])
+    # 第二次沿用剛完成的結果：不算成本次刪除，回覆標明是沿用
+    assert second.deleted == 0
+    assert [(ch, state, d) for ch, state, _, d in second.shared] == [(1, "fresh", 1)]
+    assert "沿用" in second.describe()
+
+
+def test_repeated_dedupe_command_still_runs(monkeypatch):
+    channel = FakeChannel(1)
+    channel.permissions_for = lambda member: discord.Permissions(manage_messages=True)
+    user = type("User", (), {"id": 1})()
+    other = type("User", (), {"id": 2, "bot": False})()
+    bot = type("Bot", (), {"user": user, "send_queue": FakeClient(channel).send_queue})()
+    runs = []
+
+    async def fake_sweep(client, channel_ids, limit, source, full=False):
+        runs.append(source)
+        return mc.DedupeSummary()
+
+    monkeypatch.setattr(mc, "delete_duplicate_messages", fake_sweep)
+    channel.send = lambda content: asyncio.sleep(0, channel.post(content))
+
+    async def command():
+        message = channel.post("!dedupe")
+        message.author = other
+        await mc.AsaBot.on_message(bot, message)
+
+    async def scenario():
+        await command()
+        await command()
+
+    asyncio.run(scenario())
+    # 兩次指令都執行，也都沒有被即時去重刪掉
+    assert runs == ["manual.Asabot", "manual.Asabot"]
+    assert channel.contents().count("!dedupe") == 2
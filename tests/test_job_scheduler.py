@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import main_combined as mc
+
+
+class FakeBoard:
+    def __init__(self, name: str):
+        self.name = name
+
+
+def burst_entries(now: float, count: int) -> list[dict]:
+    # 最近 10 分鐘內的 count 篇新文
+    return [{"article_key": (int(now) - i * 30, i)} for i in range(count)]
+
+
+def test_burst_round_shortens_the_very_next_interval():
+    async def scenario():
+        polls = mc.PttPollScheduler([FakeBoard("NBA")])
+        started = time.time()
+
+        async def round_with_burst():
+            polls.observe("NBA", burst_entries(time.time(), 20))
+
+        jobs = mc.JobScheduler("test")
+        job = jobs.add(mc.PeriodicJob(
+            "NBA", round_with_burst, mc.FETCH_INTERVAL,
+            next_due=lambda job, t: polls.mark_polled("NBA", t),
+            first_run_at=started, reschedule_after_run=True,
+        ))
+        jobs.tick(started)
+        assert job.due_at == float("inf")  # 執行中不排定
+        await job.task
+        return polls, job, started
+
+    polls, job, started = asyncio.run(scenario())
+    interval = polls.intervals["NBA"]
+    assert interval < mc.PTT_MAX_INTERVAL_SEC
+    assert job.due_at - started <= interval * (1 + mc.PTT_POLL_JITTER) + 1
+
+
+def test_fixed_rate_job_is_rescheduled_when_started():
+    async def scenario():
+        jobs = mc.JobScheduler("test")
+        gate = asyncio.Event()
+        job = jobs.add(mc.PeriodicJob("dedupe", gate.wait, 100, first_run_at=1000.0))
+        jobs.tick(1000.0)
+        due = job.due_at
+        gate.set()
+        await job.task
+        return due
+
+    assert asyncio.run(scenario()) == 1100.0
@@ -0,0 +1,84 @@
+import datetime
+import gzip
+import json
+import os
+import time
+
+import main_combined as mc
+
+
+def wait_for(cond, timeout: float = 3.0) -> bool:
+    # 壓縮與清理在背景執行緒進行，輪詢到完成為止
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return cond()
+
+
+def read_lines(path) -> list[dict]:
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_rotates_by_bytes(tmp_path):
+    writer = mc.BackgroundLogWriter(batch_size=1, flush_sec=0, rotate_bytes=400, retention_days=0, compress=False)
+    path = tmp_path / "events.jsonl"
+    try:
+        for i in range(20):
+            writer.write(path, {"event": "ptt_sent", "i": i, "title": "[情報] 中文標題佔三個位元組"})
+        assert writer.flush()
+    finally:
+        writer.close()
+
+    today = datetime.date.today().isoformat()
+    segments = sorted(tmp_path.glob(f"events.{today}.*.jsonl"), key=lambda p: int(p.name.split(".")[-2]))
+    assert writer.rotated == len(segments) > 1
+    # 以位元組計：每段（含目前這段）都不超過 rotate_bytes，且紀錄依序完整保留
+    files = segments + [path]
+    assert all(os.path.getsize(f) <= 400 for f in files)
+    assert [r["i"] for f in files for r in read_lines(f)] == list(range(20))
+
+
+def test_rotates_previous_day_file_and_compresses(tmp_path):
+    path = tmp_path / "events.jsonl"
+    path.write_text(json.dumps({"event": "old"}) + "\n", encoding="utf-8")
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    stamp = time.mktime(yesterday.timetuple()) + 3600
+    os.utime(path, (stamp, stamp))
+
+    writer = mc.BackgroundLogWriter(batch_size=1, flush_sec=0, rotate_bytes=0, retention_days=0, compress=True)
+    try:
+        writer.write(path, {"event": "new"})
+        assert writer.flush()
+    finally:
+        writer.close()
+
+    # 前一天留下的檔案以它的日期命名並壓縮；今天的紀錄寫在新檔
+    segment = tmp_path / f"events.{yesterday.isoformat()}.1.jsonl.gz"
+    assert wait_for(segment.exists)
+    assert read_lines(segment) == [{"event": "old"}]
+    assert read_lines(path) == [{"event": "new"}]
+
+
+def test_retention_removes_old_segments(tmp_path):
+    today = datetime.date.today()
+    old = tmp_path / f"events.{(today - datetime.timedelta(days=10)).isoformat()}.1.jsonl.gz"
+    kept = tmp_path / f"events.{(today - datetime.timedelta(days=2)).isoformat()}.1.jsonl.gz"
+    unrelated = tmp_path / "other.2000-01-01.1.jsonl.gz"
+    for f in (old, kept, unrelated):
+        f.write_bytes(gzip.compress(b"{}\n"))
+
+    writer = mc.BackgroundLogWriter(batch_size=1, flush_sec=0, rotate_bytes=0, retention_days=7, compress=True)
+    try:
+        writer.write(tmp_path / "events.jsonl", {"event": "x"})
+        assert writer.flush()
+    finally:
+        writer.close()
+
+    # 第一次寫入該檔時清理：超過保留天數的舊段刪除，其他檔案不動
+    assert wait_for(lambda: not old.exists())
+    assert kept.exists()
+    assert unrelated.exists()
@@ -0,0 +1,36 @@
+import main_combined as mc
+
+
+def test_packs_in_order_under_limit():
+    payloads = [f"[情報] 第{i}篇\nhttps://www.ptt.cc/bbs/NBA/M.{1700000000 + i}.A.001.html" for i in range(100)]
+    packed = mc.pack_messages(payloads)
+
+    # 每則都在 1900 字內，篇數總和與原順序不變，且合併成遠少於 100 則
+    assert mc.PTT_MESSAGE_MAX_CHARS == 1900
+    assert all(len(text) <= 1900 for text, _ in packed)
+    assert sum(n for _, n in packed) == len(payloads)
+    assert "\n\n".join(text for text, _ in packed) == "\n\n".join(payloads)
+    assert len(packed) < 10
+
+
+def test_fills_each_message_before_starting_the_next():
+    payloads = ["a" * 900, "b" * 900, "c" * 900]
+    # 900 + 2 + 900 = 1802 可放一則；再加第三篇就超過 1900
+    assert mc.pack_messages(payloads) == [("a" * 900 + "\n\n" + "b" * 900, 2), ("c" * 900, 1)]
+    # 剛好等於上限仍可合併
+    assert mc.pack_messages(["a" * 949, "b" * 949]) == [("a" * 949 + "\n\n" + "b" * 949, 2)]
+
+
+def test_oversize_payload_is_truncated_alone():
+    packed = mc.pack_messages(["short", "x" * 5000, "tail"])
+    assert [n for _, n in packed] == [1, 1, 1]
+    text = packed[1][0]
+    assert len(text) == 1900
+    assert text.endswith("\n(內容過長已截斷)")
+    assert text.startswith("x" * 100)
+
+
+def test_max_items_one_message_per_article():
+    assert mc.pack_messages(["a", "b", "c"], max_items=1) == [("a", 1), ("b", 1), ("c", 1)]
+    assert mc.pack_messages(["a", "b", "c"], max_items=2) == [("a\n\nb", 2), ("c", 1)]
+    assert mc.pack_messages([]) == []
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+import main_combined as mc
+
+
+def test_cursor_commit_only_after_stage(tmp_path):
+    path = tmp_path / "ptt_cursor.json"
+    cursors = mc.PttCursorStore(path)
+    cursors.stage("NBA", (1700000100, 0xA))
+
+    # 暫存的游標在提交前不生效，也不寫檔
+    assert cursors.get("NBA") is None
+    assert not path.exists()
+
+    cursors.commit("NBA")
+    assert cursors.get("NBA") == (1700000100, 0xA)
+    assert json.loads(path.read_text(encoding="utf-8")) == {"NBA": mc.format_article_id((1700000100, 0xA))}
+    assert mc.PttCursorStore(path).get("NBA") == (1700000100, 0xA)
+
+
+def test_cursor_only_moves_forward(tmp_path):
+    cursors = mc.PttCursorStore(tmp_path / "ptt_cursor.json")
+    cursors.stage("NBA", (1700000200, 0x1))
+    cursors.commit("NBA")
+
+    # 較舊的 ID 不會讓游標倒退；沒有暫存時提交不變
+    cursors.stage("NBA", (1700000100, 0x1))
+    cursors.commit("NBA")
+    cursors.commit("NBA")
+    assert cursors.get("NBA") == (1700000200, 0x1)
+
+    # 同一輪多次暫存取最新者；未提交的暫存不影響其他看板
+    cursors.stage("NBA", (1700000300, 0x1))
+    cursors.stage("NBA", (1700000250, 0x1))
+    cursors.stage("Lakers", (1700000400, 0x1))
+    cursors.commit("NBA")
+    assert cursors.get("NBA") == (1700000300, 0x1)
+    assert cursors.get("Lakers") is None
+
+
+class FakeBox:
+    dispatch_board = mc.AsaBox.dispatch_board
+    dispatch_route = mc.AsaBox.dispatch_route
+
+    async def resolve_channel(self, ch_id, tag):
+        return None
+
+
+def test_unavailable_channel_fails_the_board():
+    board = types.SimpleNamespace(name="NBA", log_tag="NBA", log_unrouted=False, routes={"news": 10})
+    items = [{"url": "https://www.ptt.cc/bbs/NBA/M.1700000100.A.00A.html", "title": "[新聞] test"}]
+
+    # 頻道取不到時整個看板視為失敗（呼叫端不提交游標，下一輪重試）
+    with pytest.raises(RuntimeError, match="channel unavailable"):
+        asyncio.run(FakeBox().dispatch_board(board, {"news": items}, []))
@@ -0,0 +1,46 @@
+import datetime
+from pathlib import Path
+
+import pytest
+
+import main_combined as mc
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "ptt"
+TODAY = datetime.date(2026, 10, 17)
+
+
+def load(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("name", sorted(p.name for p in FIXTURES.glob("*.html")))
+def test_fast_parser_matches_bs4(name):
+    html = load(name)
+    assert mc.parse_index_page_fast(html, TODAY, mc.BASE_URL) == mc.parse_index_page_bs4(html, TODAY, mc.BASE_URL)
+
+
+def test_latest_page_rows_pinned_and_paging():
+    entries, prev_url = mc.parse_index_page_fast(load("nba_index_latest.html"), TODAY, mc.BASE_URL)
+
+    # 已刪文（沒有連結）略過；分隔線之後的置底公告標記 pinned
+    assert len(entries) == 13
+    assert not any("刪除" in e["title"] for e in entries)
+    assert [e["pinned"] for e in entries].count(True) == 3
+    assert all(e["pinned"] for e in entries[-3:])
+
+    first = entries[0]
+    assert first["prefix"] == "情報"
+    assert first["full_date"] == "2026/10/17"
+    assert first["url"] == "https://www.ptt.cc/bbs/NBA/M.1729101601.A.0C3.html"
+    assert first["article_key"] == mc.parse_article_id(first["url"])
+    assert entries[2]["title"] == "[討論] 今年的MVP&聯盟第一隊預測"
+
+    # 最新頁的「下頁」是停用按鈕，上頁連結仍要取到
+    assert prev_url == "https://www.ptt.cc/bbs/NBA/index6517.html"
+
+
+def test_older_page_prev_link():
+    entries, prev_url = mc.parse_index_page_fast(load("nba_index_older.html"), TODAY, mc.BASE_URL)
+    assert prev_url == "https://www.ptt.cc/bbs/NBA/index6385.html"
+    assert not any(e["pinned"] for e in entries)
+    assert entries[0]["full_date"] == "2026/09/27"
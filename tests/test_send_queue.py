@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import discord
+import pytest
+
+import main_combined as mc
+
+
+class FakeResponse:
+    def __init__(self, status: int, headers: dict):
+        self.status = status
+        self.reason = "Too Many Requests"
+        self.headers = headers
+
+
+def rate_limited(retry_after: str, is_global: bool = False) -> discord.HTTPException:
+    headers = {"Retry-After": retry_after}
+    if is_global:
+        headers["X-RateLimit-Global"] = "true"
+    return discord.HTTPException(FakeResponse(429, headers), "You are being rate limited.")
+
+
+def test_token_bucket_delay():
+    bucket = mc.TokenBucket(2, 1.0)
+    now = bucket.updated
+    assert bucket.delay(now) == 0
+    bucket.take(now)
+    bucket.take(now)
+    # 權杖用完：每 0.5 秒補一個
+    assert bucket.delay(now) == pytest.approx(0.5)
+    assert bucket.delay(now + 0.25) == pytest.approx(0.25)
+    assert bucket.delay(now + 0.5) == 0
+
+
+def test_priority_order_within_channel():
+    order = []
+
+    def action(name):
+        async def run():
+            order.append(name)
+            return name
+        return run
+
+    async def scenario():
+        queue = mc.DiscordSendQueue("test", channel_rate=1000, global_rate=1000)
+        # 同一個事件迴圈回合內排入：worker 開始後依優先權（同優先權依先後）執行
+        futures = [
+            queue.submit(1, action("bulk"), mc.SEND_PRIORITY_BULK),
+            queue.submit(1, action("normal-1"), mc.SEND_PRIORITY_NORMAL),
+            queue.submit(1, action("moderation"), mc.SEND_PRIORITY_MODERATION),
+            queue.submit(1, action("normal-2"), mc.SEND_PRIORITY_NORMAL),
+            queue.submit(1, action("urgent"), mc.SEND_PRIORITY_URGENT),
+        ]
+        results = await asyncio.gather(*futures)
+        return results, queue
+
+    results, queue = asyncio.run(scenario())
+    assert order == ["moderation", "urgent", "normal-1", "normal-2", "bulk"]
+    assert results == ["bulk", "normal-1", "moderation", "normal-2", "urgent"]
+    assert queue.completed == 5 and queue.depth() == 0
+
+
+def test_channel_rate_limits_sends():
+    stamps = []
+
+    async def send():
+        stamps.append(time.monotonic())
+
+    async def scenario():
+        # 每 0.2 秒 2 次：第 3、4 次要等權杖補回
+        queue = mc.DiscordSendQueue("test", channel_rate=2, channel_per=0.2, global_rate=1000)
+        await asyncio.gather(*(queue.run(1, send) for _ in range(4)))
+
+    asyncio.run(scenario())
+    assert stamps[1] - stamps[0] < 0.05
+    assert stamps[2] - stamps[0] >= 0.09
+    assert stamps[3] - stamps[0] >= 0.19
+
+
+def test_429_waits_retry_after_then_retries():
+    calls = []
+
+    async def send():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise rate_limited("0.3")
+        return "ok"
+
+    async def scenario():
+        queue = mc.DiscordSendQueue("test", channel_rate=1000, global_rate=1000)
+        return await queue.run(1, send), queue
+
+    result, queue = asyncio.run(scenario())
+    assert result == "ok"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.29
+    assert queue.rate_limited == 1
+
+
+def test_global_429_blocks_other_channels():
+    calls = []
+
+    async def limited():
+        calls.append(("a", time.monotonic()))
+        if len(calls) == 1:
+            raise rate_limited("0.3", is_global=True)
+
+    async def other():
+        calls.append(("b", time.monotonic()))
+
+    async def scenario():
+        queue = mc.DiscordSendQueue("test", channel_rate=1000, global_rate=1000)
+        first = asyncio.ensure_future(queue.run(1, limited))
+        await asyncio.sleep(0.05)
+        await asyncio.gather(first, queue.run(2, other))
+
+    asyncio.run(scenario())
+    started = calls[0][1]
+    # 全域限速期間其他頻道也要等
+    assert all(t - started >= 0.29 for _, t in calls[1:])
+
+
+def test_429_gives_up_after_retries():
+    calls = []
+
+    async def send():
+        calls.append(1)
+        raise rate_limited("0")
+
+    async def scenario():
+        queue = mc.DiscordSendQueue("test", channel_rate=1000, global_rate=1000, retries=2)
+        await queue.run(1, send)
+
+    with pytest.raises(discord.HTTPException):
+        asyncio.run(scenario())
+    assert len(calls) == 3